@@ -10,31 +10,34 @@ import datetime
 import traceback # For detailed error logging
 from path_util import find_ffmpeg, resource_path
 
-from youtube_uploader import get_authenticated_service, upload_video
-from ffmpeg_processor import (
-    process_video_hebrew_only,
-    process_video_with_translation,
-    parse_segments_string
-)
-
-def create_custom_output_filename(meeting_type, lang_suffix, output_dir="output_videos", language_code=None):
-    # Use current local time as per user system (2025-06-09T07:33:03+03:00)
-    now = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M")
-    mt = meeting_type.replace(" ", "_").lower() # file-safe
-    if language_code is None:
-        language_code = lang_suffix
-    filename = f"{now}-{mt}--{language_code}.mp4"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    return os.path.join(output_dir, filename)
+from youtube_uploader import get_authenticated_service, DEFAULT_CHUNK_SIZE, OAUTH_TIMEOUT_SECONDS, TOKEN_FILE
+from upload_manager import UploadManager, DEFAULT_CONCURRENT_UPLOADS
+import upload_journal
+import app_log
+import metrics
+import output_manifest
+import service_journal
+from ffmpeg_processor import DUCKING_FADE_SECONDS, ENCODER_PROFILES, DEFAULT_ENCODER_PROFILE, available_audio_encoders, available_encoder_profiles
+from job_scheduler import default_worker_count
+from render_cache import DEFAULT_MAX_CACHE_BYTES
+from service_templates import DEFAULT_TEMPLATES, format_with_placeholders
+from service_pipeline import (process_service, resolve_audio_offset, resolve_segments, AUTO_OFFSET, AUTO_SEGMENTS,
+                              MULTI_TRACK, UPLOAD_AUDIO_LANGUAGES)
+from audio_analysis import detect_audio_offset
+from segments import SegmentSet, parse_time, format_time
+from media_probe import probe_media, describe, validate_inputs
 
 CLIENT_SECRETS_FILE = resource_path("client_secret.json")
+LOG_POLL_MS = 100
+LOG_BATCH_MAX_MESSAGES = 2000 # Per widget update; a bigger backlog is drained over several updates
+LOG_WIDGET_MAX_LINES = 5000   # Older lines leave the Logs tab (the log file keeps everything)
+CONNECT_GRACE_SECONDS = 60 # Extra time after the browser login timeout before a connection attempt is abandoned
 
 class VideoProcessorApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Sermon Video Processor & Uploader")
-        self.root.geometry("850x800") # Increased height for new buttons
+        self.root.geometry("850x880") # Increased height for new buttons and progress bars
 
         # --- Initialize instance variables FIRST ---
         self.file_paths = {
@@ -44,8 +47,14 @@ class VideoProcessorApp:
             "audio_en": tk.StringVar()
         }
         self.youtube_service = None
+        self.connect_attempt = 0 # Results of older (cancelled or timed out) connection attempts are ignored
+        self.connect_cancel_event = None # Set while connecting
+        self.upload_manager = None # Exists while an operation uploads; its bandwidth limit follows Settings live
         self.output_dir = "output_videos"
         self.log_queue = queue.Queue()
+        # Everything logged (and printed by the processing modules) also goes to a rotating file
+        self.log_file = app_log.setup_file_log()
+        app_log.capture_prints(self.log_queue.put)
         self.title_vars = {}
         self.desc_texts = {}
         self.segments_data = []
@@ -106,6 +115,43 @@ class VideoProcessorApp:
         self.connect_yt_button.pack(side=tk.LEFT, padx=5)
         self.yt_status_label = tk.Label(yt_frame, text="Not Connected", fg="red")
         self.yt_status_label.pack(side=tk.LEFT, padx=5)
+        tk.Label(yt_frame, text="Upload chunk size (MB):").pack(side=tk.LEFT, padx=(20, 5))
+        self.chunk_size_mb_var = tk.IntVar(value=DEFAULT_CHUNK_SIZE // (1024 * 1024))
+        tk.Spinbox(yt_frame, from_=1, to=256, width=5, textvariable=self.chunk_size_mb_var).pack(side=tk.LEFT, padx=5)
+        tk.Label(yt_frame, text="Parallel uploads:").pack(side=tk.LEFT, padx=(20, 5))
+        self.max_uploads_var = tk.IntVar(value=DEFAULT_CONCURRENT_UPLOADS)
+        tk.Spinbox(yt_frame, from_=1, to=8, width=3, textvariable=self.max_uploads_var).pack(side=tk.LEFT, padx=5)
+        tk.Label(yt_frame, text="Upload limit (Mbit/s, 0 = none):").pack(side=tk.LEFT, padx=(20, 5))
+        self.upload_limit_var = tk.DoubleVar(value=0)
+        tk.Spinbox(yt_frame, from_=0, to=10000, increment=1, width=6, textvariable=self.upload_limit_var).pack(side=tk.LEFT, padx=5)
+        self.upload_limit_var.trace_add("write", self._on_upload_limit_change)
+        processing_frame = tk.LabelFrame(settings_tab, text="Processing", padx=10, pady=10)
+        processing_frame.pack(padx=10, pady=10, fill="x")
+        tk.Label(processing_frame, text="Parallel renders:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+        self.max_workers_var = tk.IntVar(value=default_worker_count())
+        tk.Spinbox(processing_frame, from_=1, to=os.cpu_count() or 1, width=5, textvariable=self.max_workers_var).grid(row=0, column=1, sticky="w", padx=5, pady=2)
+        self.single_pass_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(processing_frame, text="Single-pass render (read the source video once for all languages)", variable=self.single_pass_var).grid(row=1, column=0, columnspan=2, sticky="w", pady=2)
+        self.use_render_cache_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(processing_frame, text="Reuse earlier renders when inputs and settings are unchanged", variable=self.use_render_cache_var).grid(row=2, column=0, columnspan=2, sticky="w", pady=2)
+        tk.Label(processing_frame, text="Ducking fade (seconds):").grid(row=4, column=0, sticky="w", padx=5, pady=2)
+        self.fade_var = tk.DoubleVar(value=DUCKING_FADE_SECONDS)
+        tk.Spinbox(processing_frame, from_=0.0, to=5.0, increment=0.1, width=7, textvariable=self.fade_var).grid(row=4, column=1, sticky="w", padx=5, pady=2)
+        tk.Label(processing_frame, text="Render cache size (GB):").grid(row=3, column=0, sticky="w", padx=5, pady=2)
+        self.render_cache_gb_var = tk.IntVar(value=DEFAULT_MAX_CACHE_BYTES // 1024 ** 3)
+        tk.Spinbox(processing_frame, from_=1, to=10000, width=7, textvariable=self.render_cache_gb_var).grid(row=3, column=1, sticky="w", padx=5, pady=2)
+        self.copy_audio_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(processing_frame, text="Copy Hebrew audio without re-encoding when it is already AAC", variable=self.copy_audio_var).grid(row=5, column=0, columnspan=2, sticky="w", pady=2)
+        # Only profiles whose encoder the installed ffmpeg has are offered
+        tk.Label(processing_frame, text="Audio encoder:").grid(row=6, column=0, sticky="w", padx=5, pady=2)
+        self.encoder_profile_names = {profile["label"]: name for name, profile in available_encoder_profiles().items()}
+        self.encoder_profile_var = tk.StringVar(value=ENCODER_PROFILES[DEFAULT_ENCODER_PROFILE]["label"])
+        ttk.Combobox(processing_frame, textvariable=self.encoder_profile_var, state="readonly", width=45,
+                     values=list(self.encoder_profile_names) or [self.encoder_profile_var.get()]).grid(row=6, column=1, sticky="w", padx=5, pady=2)
+        self.multi_track_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(processing_frame, text="One video with all languages as separate audio tracks (archive copy)", variable=self.multi_track_var, command=self.check_input_files_present).grid(row=7, column=0, columnspan=2, sticky="w", pady=2)
+        self.resume_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(processing_frame, text="Resume from journal (skip renders and uploads an earlier run of this service finished)", variable=self.resume_var).grid(row=8, column=0, columnspan=2, sticky="w", pady=2)
 
 
         # --- Input Files ---
@@ -115,6 +161,15 @@ class VideoProcessorApp:
         self._create_file_entry(file_frame, "Hebrew Audio:", "audio_he", 1)
         self._create_file_entry(file_frame, "Russian Audio:", "audio_ru", 2)
         self._create_file_entry(file_frame, "English Audio:", "audio_en", 3)
+        # Audio offset: seconds, or "auto" to detect it from the camera audio when processing
+        tk.Label(file_frame, text="Audio Offset (s):").grid(row=4, column=0, sticky="w", padx=5, pady=2)
+        offset_frame = tk.Frame(file_frame)
+        offset_frame.grid(row=4, column=1, sticky="w", padx=5, pady=2)
+        self.audio_offset_var = tk.StringVar(value="0")
+        tk.Entry(offset_frame, textvariable=self.audio_offset_var, width=10).pack(side=tk.LEFT)
+        tk.Label(offset_frame, text='(+ delays the audio, - cuts its start; "auto" detects it when processing)').pack(side=tk.LEFT, padx=5)
+        self.detect_offset_button = tk.Button(file_frame, text="Detect", command=self.start_detect_offset_thread)
+        self.detect_offset_button.grid(row=4, column=2, padx=5, pady=2)
 
 
         # --- Output Configuration (Placeholders, Segments, Titles/Descriptions) ---
@@ -148,27 +203,13 @@ class VideoProcessorApp:
         segments_btn_frame.pack(side=tk.LEFT, padx=5, pady=5)
         tk.Button(segments_btn_frame, text="Add", command=self.add_segment).pack(pady=2, fill="x")
         tk.Button(segments_btn_frame, text="Remove", command=self.remove_segment).pack(pady=2, fill="x")
+        self.detect_segments_button = tk.Button(segments_btn_frame, text="Auto-detect", command=self.start_detect_segments_thread)
+        self.detect_segments_button.pack(pady=2, fill="x")
         # Language Specific Configs
         he_config_frame = tk.LabelFrame(config_frame, text="Hebrew Output", padx=5, pady=5)
         he_config_frame.pack(fill="x", padx=5, pady=5)
         # Default templates for each meeting type and language
-        self.default_templates = {
-            "Sermon": {
-                "HE": ("שיעור - {date}", "הקלטת השיעור מתאריך {date} ב{location}.\nצפייה מהנה!"),
-                "RU": ("Проповедь ({date}) - Перевод на русский", "Запись проповеди от {date}, место: {location}.\nПеревод на русский язык."),
-                "EN": ("Sermon ({date}) - English Translation", "Sermon recording from {date} at {location}.\nEnglish translation.")
-            },
-            "Worship meeting": {
-                "HE": ("אסיפת הלל - {date}", "הקלטת אסיפת הלל מתאריך {date} ב{location}.\nצפייה מהנה!"),
-                "RU": ("Прославление ({date}) - Перевод на русский", "Запись прославления от {date}, место: {location}.\nПеревод на русский язык."),
-                "EN": ("Worship Meeting ({date}) - English Translation", "Worship meeting recording from {date} at {location}.\nEnglish translation.")
-            },
-            "Prayer meeting": {
-                "HE": ("אסיפת תפילה - {date}", "הקלטת אסיפת תפילה מתאריך {date} ב{location}.\nצפייה מהנה!"),
-                "RU": ("Молитвенное собрание ({date}) - Перевод на русский", "Запись молитвенного собрания от {date}, место: {location}.\nПеревод на русский язык."),
-                "EN": ("Prayer Meeting ({date}) - English Translation", "Prayer meeting recording from {date} at {location}.\nEnglish translation.")
-            }
-        }
+        self.default_templates = DEFAULT_TEMPLATES
         self._create_title_desc_entries(he_config_frame, "HE", *self.default_templates[self.meeting_type_var.get()]["HE"])
         ru_config_frame = tk.LabelFrame(config_frame, text="Russian Output", padx=5, pady=5)
         ru_config_frame.pack(fill="x", padx=5, pady=5)
@@ -177,6 +218,21 @@ class VideoProcessorApp:
         en_config_frame.pack(fill="x", padx=5, pady=5)
         self._create_title_desc_entries(en_config_frame, "EN", *self.default_templates[self.meeting_type_var.get()]["EN"])
 
+        # --- Render Progress (Fixed at the bottom, above the action buttons) ---
+        progress_frame = tk.LabelFrame(root, text="Render Progress", padx=10, pady=5)
+        progress_frame.pack(fill="x", padx=10)
+        self.progress_bars = {}
+        self.progress_labels = {}
+        for row, lang_key in enumerate(["HE", "RU", "EN"]):
+            tk.Label(progress_frame, text=f"{lang_key}:").grid(row=row, column=0, sticky="w", padx=5)
+            self.progress_bars[lang_key] = ttk.Progressbar(progress_frame, orient="horizontal", mode="determinate", maximum=100)
+            self.progress_bars[lang_key].grid(row=row, column=1, sticky="ew", padx=5, pady=1)
+            self.progress_labels[lang_key] = tk.Label(progress_frame, text="", width=36, anchor="w")
+            self.progress_labels[lang_key].grid(row=row, column=2, sticky="w", padx=5)
+        self.upload_rate_label = tk.Label(progress_frame, text="", anchor="w")
+        self.upload_rate_label.grid(row=3, column=0, columnspan=3, sticky="w", padx=5)
+        progress_frame.columnconfigure(1, weight=1)
+
         # --- Action Buttons (Fixed at the bottom) ---
         action_button_frame = Frame(root) # This frame is outside the scrollable area
         action_button_frame.pack(fill="x", pady=10, padx=10)
@@ -197,10 +253,23 @@ class VideoProcessorApp:
 
 
         # --- Log Area now handled in logs_tab above ---
-        self.root.after(100, self.process_log_queue)
+        self.root.after(LOG_POLL_MS, self.process_log_queue)
+        self.root.after(1000, self._refresh_upload_rate)
+        if os.path.exists(TOKEN_FILE): # Saved login: connect right away, without a click
+            self._start_connect(interactive=False)
+        if self.log_file:
+            self.log_message(f"Log file: {self.log_file}")
+        self._log_encoder_support()
         self._update_button_states() # Initial button state
         self.check_input_files_present() # Initial check for enabling process buttons
 
+    def _log_encoder_support(self):
+        aac_encoders = sorted(encoder for encoder in available_audio_encoders() if "aac" in encoder)
+        self.log_message(f"FFmpeg AAC encoders: {', '.join(aac_encoders) or 'none found'}")
+        missing = [name for name in ENCODER_PROFILES if name not in self.encoder_profile_names.values()]
+        if missing:
+            self.log_message(f"Encoder profiles not available with this FFmpeg: {', '.join(missing)}")
+
     def _on_meeting_type_change(self, event=None):
         mt = self.meeting_type_var.get()
         for lang in ["HE", "RU", "EN"]:
@@ -208,6 +277,7 @@ class VideoProcessorApp:
             self.title_vars[lang].set(t)
             self.desc_texts[lang].delete("1.0", tk.END)
             self.desc_texts[lang].insert(tk.END, d)
+        self.check_input_files_present() # Processed files are tracked per meeting type
 
     def _on_mousewheel(self, event):
         if event.num == 4 or event.delta < 0: self.canvas.yview_scroll(1, "units")
@@ -240,6 +310,25 @@ class VideoProcessorApp:
             self.file_paths[key].set(filename)
             self.log_message(f"Selected {key}: {filename}")
             self.check_input_files_present()
+            # Probing is instant for files seen before, but a first probe can take a moment on slow drives
+            # Tk variables may only be read on this thread, so the worker gets plain paths
+            audio_paths = {lang_key: self.file_paths[f"audio_{lang_key.lower()}"].get() for lang_key in ("HE", "RU", "EN")}
+            threading.Thread(target=self._check_selected_inputs, daemon=True,
+                             args=(key, filename, self.file_paths["video"].get(), audio_paths)).start()
+
+    def _check_selected_inputs(self, key, path, video_path, audio_paths):
+        """Worker: probes path and checks the inputs chosen so far; the findings are logged on the Tk thread."""
+        info = probe_media(path)
+        if info is None:
+            messages = [f"Could not read media information for {key} (is ffprobe installed?)."]
+        else:
+            messages = [f"  {describe(info)}"]
+            messages += [f"{level}: {message}" for level, message in validate_inputs(video_path, audio_paths)]
+        self.root.after(0, self._show_input_check, messages)
+
+    def _show_input_check(self, messages):
+        for message in messages:
+            self.log_message(message)
 
     def check_input_files_present(self):
         """Enable/disable buttons based on file selection and YouTube connection."""
@@ -264,10 +353,21 @@ class VideoProcessorApp:
             self.process_and_upload_button.config(state=tk.DISABLED)
 
         # Upload Existing: needs video, YouTube connection, and at least one processed file present
+        # (the multi-track video or the per-language ones, as the multi-track setting selects)
+        output_keys = (MULTI_TRACK,) if self.multi_track_var.get() else ("HE", "RU", "EN")
         ready_file_exists = any(
-            path and os.path.isfile(path)
-            for path in self.processed_video_paths.values()
+            self.processed_video_paths.get(lang_key) and os.path.isfile(self.processed_video_paths[lang_key])
+            for lang_key in output_keys
         )
+        if video_selected and not ready_file_exists:
+            video_path, meeting_type = self.file_paths["video"].get(), self.meeting_type_var.get()
+            try: # Renders recorded in the output manifest, or interrupted uploads, of this video from an earlier run
+                ready_file_exists = any(
+                    output_manifest.find_output(video_path, meeting_type, lang_key)
+                    or upload_journal.pending_uploads(output_manifest.output_key(video_path, meeting_type, lang_key))
+                    for lang_key in output_keys
+                )
+            except OSError: pass # Video path not readable
         if video_selected and yt_connected and ready_file_exists:
             self.upload_existing_button.config(state=tk.NORMAL)
         else:
@@ -278,22 +378,74 @@ class VideoProcessorApp:
 
 
     def connect_youtube(self):
-        self.log_message("Connecting to YouTube...")
-        try:
-            self.youtube_service = get_authenticated_service()
+        """Connect button: starts connecting in the background, or cancels a connection in progress."""
+        if self.connect_cancel_event:
+            self.connect_cancel_event.set()
+            self._connect_finished(self.connect_attempt, None, InterruptedError("YouTube login cancelled."))
+            return
+        self._start_connect(interactive=True)
+
+    def _start_connect(self, interactive):
+        """
+        Connects on a background thread so the window stays responsive during the browser
+        login or a token refresh. Non-interactive attempts only use a saved login (at startup).
+        """
+        self.connect_attempt += 1
+        attempt = self.connect_attempt
+        self.connect_cancel_event = cancel_event = threading.Event()
+        if interactive:
+            self.log_message("Connecting to YouTube...")
+            self.yt_status_label.config(text="Connecting... (finish the login in your browser)", fg="orange")
+        else:
+            self.yt_status_label.config(text="Loading saved login...", fg="orange")
+        self.connect_yt_button.config(text="Cancel Connecting")
+
+        def worker():
+            try:
+                service, error = get_authenticated_service(interactive, OAUTH_TIMEOUT_SECONDS, cancel_event), None
+            except Exception as e:
+                service, error = None, e
+            self.root.after(0, self._connect_finished, attempt, service, error)
+
+        threading.Thread(target=worker, daemon=True).start()
+        # Backstop in case the login or refresh hangs past the browser timeout
+        self.root.after((OAUTH_TIMEOUT_SECONDS + CONNECT_GRACE_SECONDS) * 1000, self._connect_timed_out, attempt)
+
+    def _connect_timed_out(self, attempt):
+        if attempt == self.connect_attempt and self.connect_cancel_event:
+            self.connect_cancel_event.set()
+            self._connect_finished(attempt, None, TimeoutError("Connecting to YouTube timed out."))
+
+    def _connect_finished(self, attempt, service, error):
+        """Runs on the Tk thread with the outcome of connection attempt number `attempt`."""
+        if attempt != self.connect_attempt or self.connect_cancel_event is None:
+            return # Superseded, cancelled or timed out already
+        self.connect_cancel_event = None
+        self.connect_yt_button.config(text="Connect to YouTube")
+        if service:
+            self.youtube_service = service
             self.yt_status_label.config(text="Connected", fg="green")
             self.log_message("Successfully connected to YouTube.")
-        except FileNotFoundError as e:
-            self.log_message(f"ERROR: {e}")
-            messagebox.showerror("YouTube Error", str(e))
+        elif error is None: # Startup check found no saved login
+            self.yt_status_label.config(text="Not Connected", fg="red")
+        elif isinstance(error, InterruptedError):
+            self.log_message("YouTube connection cancelled.")
+            self.yt_status_label.config(text="Not Connected", fg="red")
+        elif isinstance(error, FileNotFoundError):
+            self.log_message(f"ERROR: {error}")
+            messagebox.showerror("YouTube Error", str(error))
             self.yt_status_label.config(text="Connection Failed (client_secret.json missing)", fg="red")
-        except Exception as e:
-            self.log_message(f"YouTube connection failed: {e}")
-            messagebox.showerror("YouTube Error", f"Failed to connect: {e}")
+        elif isinstance(error, TimeoutError):
+            self.log_message(f"YouTube connection failed: {error}")
+            self.yt_status_label.config(text="Connection Timed Out", fg="red")
+        elif isinstance(error, ConnectionError): # Offline; the saved login is kept for the next attempt
+            self.log_message(f"{error}. Connect again once the network is available.")
+            self.yt_status_label.config(text="Not Connected", fg="red")
+        else:
+            self.log_message(f"YouTube connection failed: {error}")
+            messagebox.showerror("YouTube Error", f"Failed to connect: {error}")
             self.yt_status_label.config(text="Connection Failed", fg="red")
-        # Ensure UI state is updated on the main thread
-        self.root.after(0, self.check_input_files_present)
-
+        self.check_input_files_present()
 
     def _update_button_states(self):
         """Enable/disable buttons based on current operation state."""
@@ -302,28 +454,43 @@ class VideoProcessorApp:
             self.process_and_upload_button.config(state=tk.DISABLED)
             self.upload_existing_button.config(state=tk.DISABLED)
             self.connect_yt_button.config(state=tk.DISABLED)
+            self.detect_offset_button.config(state=tk.DISABLED)
+            self.detect_segments_button.config(state=tk.DISABLED)
             self.cancel_button.config(state=tk.NORMAL)
             self.process_and_upload_tooltip.show_if_disabled()
             self.upload_existing_tooltip.show_if_disabled()
         else:
             self.connect_yt_button.config(state=tk.NORMAL)
+            self.detect_offset_button.config(state=tk.NORMAL)
+            self.detect_segments_button.config(state=tk.NORMAL)
             self.cancel_button.config(state=tk.DISABLED)
             self.check_input_files_present() # This will correctly set process/upload buttons
             self.process_and_upload_tooltip.show_if_disabled()
             self.upload_existing_tooltip.show_if_disabled()
 
-    def log_message(self, message): self.log_queue.put(message)
+    def log_message(self, message):
+        app_log.logger.getChild("app").info(message)
+        self.log_queue.put(message)
 
     def process_log_queue(self):
-        while not self.log_queue.empty():
-            try:
-                message = self.log_queue.get_nowait()
-                self.log_text.configure(state='normal')
-                self.log_text.insert(tk.END, message + "\n")
+        """Moves queued messages into the Logs tab: one insert per batch, keeping the last LOG_WIDGET_MAX_LINES lines."""
+        messages = []
+        try:
+            while len(messages) < LOG_BATCH_MAX_MESSAGES:
+                messages.append(self.log_queue.get_nowait())
+        except queue.Empty: pass
+        if messages:
+            follow = self.log_text.yview()[1] >= 0.999 # Only auto-scroll if the user is looking at the end
+            self.log_text.configure(state='normal')
+            self.log_text.insert(tk.END, "\n".join(messages) + "\n")
+            excess = int(self.log_text.index('end-1c').split('.')[0]) - 1 - LOG_WIDGET_MAX_LINES
+            if excess > 0:
+                self.log_text.delete('1.0', f'{excess + 1}.0')
+            self.log_text.configure(state='disabled')
+            if follow:
                 self.log_text.see(tk.END)
-                self.log_text.configure(state='disabled')
-            except queue.Empty: pass
-        self.root.after(100, self.process_log_queue)
+        # Come back sooner while a backlog is draining
+        self.root.after(10 if len(messages) == LOG_BATCH_MAX_MESSAGES else LOG_POLL_MS, self.process_log_queue)
 
     def _get_common_data(self):
         """Collects common data for processing/uploading."""
@@ -342,8 +509,44 @@ class VideoProcessorApp:
             "desc_ru_template": self.desc_texts["RU"].get("1.0", tk.END).strip(),
             "title_en_template": self.title_vars["EN"].get(),
             "desc_en_template": self.desc_texts["EN"].get("1.0", tk.END).strip(),
+            "max_workers": self._get_max_workers(),
+            "single_pass": self.single_pass_var.get(),
+            "chunksize": self._get_upload_chunksize(),
+            "use_render_cache": self.use_render_cache_var.get(),
+            "render_cache_bytes": self._get_render_cache_bytes(),
+            "fade_duration": self._get_fade_duration(),
+            "audio_offset": self._get_audio_offset(),
+            "copy_audio": self.copy_audio_var.get(),
+            "multi_track": self.multi_track_var.get(),
+            "resume": self.resume_var.get(),
+            "encoder_profile": self.encoder_profile_names.get(self.encoder_profile_var.get(), DEFAULT_ENCODER_PROFILE),
         }
 
+    def _get_max_workers(self):
+        try: return max(1, int(self.max_workers_var.get()))
+        except (tk.TclError, ValueError): return default_worker_count()
+
+    def _get_upload_chunksize(self):
+        try: return max(1, int(self.chunk_size_mb_var.get())) * 1024 * 1024
+        except (tk.TclError, ValueError): return DEFAULT_CHUNK_SIZE
+
+    def _get_fade_duration(self):
+        try: return max(0.0, float(self.fade_var.get()))
+        except (tk.TclError, ValueError): return DUCKING_FADE_SECONDS
+
+    def _get_audio_offset(self):
+        value = self.audio_offset_var.get().strip()
+        if value.lower() == AUTO_OFFSET:
+            return AUTO_OFFSET
+        try: return float(value or 0)
+        except ValueError:
+            self.log_message(f"Warning: Invalid audio offset '{value}', using 0.")
+            return 0.0
+
+    def _get_render_cache_bytes(self):
+        try: return max(1, int(self.render_cache_gb_var.get())) * 1024 ** 3
+        except (tk.TclError, ValueError): return DEFAULT_MAX_CACHE_BYTES
+
     def _start_operation_thread(self, target_func, *args):
         if self.is_operation_running:
             self.log_message("An operation is already in progress.")
@@ -383,25 +586,78 @@ class VideoProcessorApp:
         if not data["video_path"]: # Base video name is used to find processed files
             messagebox.showerror("Input Error", "Original video file path is needed to identify files to upload.")
             return
+        if not os.path.isfile(data["video_path"]):
+            messagebox.showerror("Input Error", f"Original video file not found: {data['video_path']}")
+            return
         if not self.youtube_service:
             messagebox.showerror("YouTube Error", "Not connected to YouTube. Please connect first.")
             return
         self._start_operation_thread(self._perform_upload_existing, data)
 
+    def start_detect_offset_thread(self):
+        video_path, he_audio_path = self.file_paths["video"].get(), self.file_paths["audio_he"].get()
+        if not video_path or not he_audio_path:
+            messagebox.showerror("Input Error", "Video and Hebrew audio files are required to detect the offset.")
+            return
+        self._start_operation_thread(self._perform_detect_offset, video_path, he_audio_path)
+
+    def _perform_detect_offset(self, video_path, he_audio_path):
+        """Cross-correlates the Hebrew audio with the camera audio and fills in the offset."""
+        try:
+            self.log_message("Detecting audio offset against the camera audio...")
+            result = detect_audio_offset(video_path, he_audio_path, cancel_event=self.cancel_event)
+            if self.cancel_event.is_set(): self.log_message("Offset detection cancelled.")
+            elif result is None: self.log_message("Could not detect the audio offset (see messages above).")
+            elif not result["reliable"]:
+                self.log_message(f"No clear match between camera and Hebrew audio (best guess {result['offset']:+.3f}s, "
+                                 f"confidence {result['confidence']}). Offset left unchanged.")
+            else:
+                self.log_message(f"Detected audio offset: {result['offset']:+.3f}s (confidence {result['confidence']})")
+                self.root.after(0, self.audio_offset_var.set, f"{result['offset']:.3f}")
+        except Exception as e:
+            self.log_message(f"ERROR detecting audio offset: {e}")
+            self.log_message(traceback.format_exc())
+        finally:
+            self._operation_finished()
+
+    def start_detect_segments_thread(self):
+        data = self._get_common_data()
+        if not data["he_audio_path"] or not (data["ru_audio_path"] or data["en_audio_path"]):
+            messagebox.showerror("Input Error", "Hebrew audio and at least one translation audio file are required to detect segments.")
+            return
+        self._start_operation_thread(self._perform_detect_segments, data)
+
+    def _perform_detect_segments(self, data):
+        """Proposes translation-only segments from the audio and puts them in the list for review."""
+        try:
+            audio_offset = resolve_audio_offset(data, self.cancel_event, self.log_message) if data["video_path"] else 0.0
+            segments = resolve_segments(dict(data, segments_data=AUTO_SEGMENTS), audio_offset, self.cancel_event, self.log_message)
+            if self.cancel_event.is_set(): self.log_message("Segment detection cancelled.")
+            elif segments: self.root.after(0, self._set_segments, segments)
+            else: self.log_message("No translation-only segments found; the segment list was left unchanged.")
+        except Exception as e:
+            self.log_message(f"ERROR detecting segments: {e}")
+            self.log_message(traceback.format_exc())
+        finally:
+            self._operation_finished()
+
+    def _set_segments(self, segments):
+        self.segments_data = list(segments)
+        self.segments_list.delete(0, tk.END)
+        for start, end in self.segments_data:
+            self.segments_list.insert(tk.END, f"{format_time(start)} - {format_time(end)}  ({start:g}-{end:g} s)")
+
     def cancel_current_operation(self):
         if self.is_operation_running:
-            self.log_message("Cancellation request received. Will attempt to stop after current step...")
+            self.log_message("Cancellation request received. Stopping running renders and uploads...")
             self.cancel_event.set()
-            # Note: FFmpeg processes won't be killed mid-way with this simple approach.
-            # Uploads will check the event more frequently.
+            # Running ffmpeg processes are stopped (and their partial files deleted) right away;
+            # uploads stop before their next chunk.
         else:
             self.log_message("No operation currently running to cancel.")
 
     def _format_with_placeholders(self, template_string, date_val, location_val):
-        try: return template_string.format(date=date_val, location=location_val)
-        except KeyError as e:
-            self.log_message(f"Warning: Placeholder {e} in '{template_string[:50]}...'")
-            return template_string
+        return format_with_placeholders(template_string, date_val, location_val, log=self.log_message)
 
     def _operation_finished(self):
         """Called when an operation completes or is cancelled."""
@@ -409,75 +665,86 @@ class VideoProcessorApp:
         self.current_operation_thread = None
         self.root.after(0, self._update_button_states) # Ensure UI update is in main thread
 
+    def _get_upload_rate_limit(self):
+        """Bytes per second from the Mbit/s setting, or None for unlimited."""
+        try: return max(0.0, float(self.upload_limit_var.get())) * 1e6 / 8 or None
+        except (tk.TclError, ValueError): return None
+
+    def _on_upload_limit_change(self, *args):
+        if self.upload_manager:
+            self.upload_manager.set_rate_limit(self._get_upload_rate_limit())
+
+    def _new_upload_manager(self):
+        try: max_uploads = max(1, int(self.max_uploads_var.get()))
+        except (tk.TclError, ValueError): max_uploads = DEFAULT_CONCURRENT_UPLOADS
+        self.upload_manager = UploadManager(self.youtube_service, max_uploads, self._get_upload_rate_limit(), log=self.log_message)
+        return self.upload_manager
+
+    def _close_upload_manager(self):
+        if self.upload_manager:
+            self.upload_manager.shutdown()
+            self.upload_manager = None
+
+    def _refresh_upload_rate(self):
+        manager = self.upload_manager
+        self.upload_rate_label.config(text=manager.throughput_report() if manager else "")
+        self.root.after(1000, self._refresh_upload_rate)
+
+    def _make_progress_callback(self, lang_keys):
+        """Returns an ffmpeg progress callback that updates the progress bars of lang_keys."""
+        last_logged_step = [-1]
+        def callback(progress):
+            self.root.after(0, self._update_render_progress, lang_keys, progress)
+            # Log every 10% so the Logs tab shows stalled or slow renders too
+            if progress["percent"] is not None and int(progress["percent"] // 10) > last_logged_step[0]:
+                last_logged_step[0] = int(progress["percent"] // 10)
+                self.log_message(f"[{'/'.join(lang_keys)}] {self._format_progress(progress)}")
+        return callback
+
+    def _format_progress(self, progress):
+        parts = []
+        if progress["percent"] is not None: parts.append(f"{progress['percent']:.0f}%")
+        if progress["speed"]: parts.append(f"{progress['speed']:.1f}x realtime")
+        if progress["eta"] is not None and not progress["done"]:
+            parts.append(f"ETA {int(progress['eta'] // 60)}:{int(progress['eta'] % 60):02d}")
+        if not parts: parts.append(f"{progress['out_time']:.0f}s rendered")
+        return ", ".join(parts)
+
+    def _update_render_progress(self, lang_keys, progress):
+        for lang_key in lang_keys:
+            if lang_key not in self.progress_bars:
+                continue # e.g. the multi-track video, whose progress shows on its languages' bars
+            if progress["percent"] is not None:
+                self.progress_bars[lang_key].config(value=progress["percent"])
+            self.progress_labels[lang_key].config(text=self._format_progress(progress))
+
+    def _reset_render_progress(self):
+        for lang_key in self.progress_bars:
+            self.progress_bars[lang_key].config(value=0)
+            self.progress_labels[lang_key].config(text="")
+
+    def _on_output_ready(self, lang_key, path, cached):
+        """Called from the pipeline threads as soon as a language's video exists."""
+        self.processed_video_paths[lang_key] = path
+        if cached:
+            self.root.after(0, self._update_render_progress, [lang_key],
+                            {"percent": 100.0, "speed": None, "eta": None, "out_time": 0, "total_size": 0, "done": True})
+
     def _perform_processing_and_or_upload(self, data, perform_upload):
         """Main worker method for processing and optionally uploading."""
         try:
-            video_path = data["video_path"]
-            he_audio_path = data["he_audio_path"]
-            ru_audio_path = data["ru_audio_path"]
-            en_audio_path = data["en_audio_path"]
-            date_val, location_val = data["date_val"], data["location_val"]
-            meeting_type = data.get("meeting_type", "Sermon")
-            segments_str = ",".join([f"{s}-{e}" for s, e in data["segments_data"]])
-
             # Reset processed paths for this run
             self.processed_video_paths = {"HE": None, "RU": None, "EN": None}
+            self.root.after(0, self._reset_render_progress)
+
+            upload_manager = self._new_upload_manager() if perform_upload and self.youtube_service else None
+            with metrics.span("service", kind="process_upload" if perform_upload else "process") as measured:
+                process_service(dict(data, output_dir=self.output_dir), perform_upload, self.youtube_service,
+                                self.cancel_event, log=self.log_message,
+                                progress_callback_factory=self._make_progress_callback,
+                                on_output_ready=self._on_output_ready, upload_manager=upload_manager)
+                if self.cancel_event.is_set(): measured.set_status(metrics.CANCELLED)
 
-            # 1. Process Hebrew
-            if self.cancel_event.is_set(): self.log_message("Cancelled before HE processing."); return
-            self.log_message("\n--- Processing Hebrew Video ---")
-            output_he_video = create_custom_output_filename(meeting_type, "he", self.output_dir, language_code="he")
-            if process_video_hebrew_only(video_path, he_audio_path, output_he_video):
-                self.log_message(f"Hebrew video created: {output_he_video}")
-                self.processed_video_paths["HE"] = output_he_video
-                if perform_upload and self.youtube_service:
-                    if self.cancel_event.is_set(): self.log_message("Cancelled before HE upload."); return
-                    title = self._format_with_placeholders(data["title_he_template"], date_val, location_val)
-                    desc = self._format_with_placeholders(data["desc_he_template"], date_val, location_val)
-                    result = upload_video(self.youtube_service, output_he_video, title, desc, cancel_event=self.cancel_event)
-                    if result == "CANCELLED": self.log_message(f"Upload of '{title}' cancelled."); return
-                    elif result: self.log_message(f"Uploaded '{title}' to YouTube.")
-                    else: self.log_message(f"Failed to upload HE video or upload was interrupted.")
-            else: self.log_message(f"Failed to process Hebrew video.")
-
-            # 2. Process Russian
-            if ru_audio_path: # Only if Russian audio is provided
-                if self.cancel_event.is_set(): self.log_message("Cancelled before RU processing."); return
-                self.log_message("\n--- Processing Russian Translation Video ---")
-                output_ru_video = create_custom_output_filename(meeting_type, "ru", self.output_dir, language_code="ru")
-                ru_segments = parse_segments_string(segments_str)
-                if process_video_with_translation(video_path, he_audio_path, ru_audio_path, output_ru_video, ru_segments):
-                    self.log_message(f"Russian mixed video created: {output_ru_video}")
-                    self.processed_video_paths["RU"] = output_ru_video
-                    if perform_upload and self.youtube_service:
-                        if self.cancel_event.is_set(): self.log_message("Cancelled before RU upload."); return
-                        title = self._format_with_placeholders(data["title_ru_template"], date_val, location_val)
-                        desc = self._format_with_placeholders(data["desc_ru_template"], date_val, location_val)
-                        result = upload_video(self.youtube_service, output_ru_video, title, desc, cancel_event=self.cancel_event)
-                        if result == "CANCELLED": self.log_message(f"Upload of '{title}' cancelled."); return
-                        elif result: self.log_message(f"Uploaded '{title}' to YouTube.")
-                        else: self.log_message(f"Failed to upload RU video or upload was interrupted.")
-                else: self.log_message(f"Failed to process Russian mixed video.")
-
-            # 3. Process English
-            if en_audio_path: # Only if English audio is provided
-                if self.cancel_event.is_set(): self.log_message("Cancelled before EN processing."); return
-                self.log_message("\n--- Processing English Translation Video ---")
-                output_en_video = create_custom_output_filename(meeting_type, "en", self.output_dir, language_code="en")
-                en_segments = parse_segments_string(segments_str)
-                if process_video_with_translation(video_path, he_audio_path, en_audio_path, output_en_video, en_segments):
-                    self.log_message(f"English mixed video created: {output_en_video}")
-                    self.processed_video_paths["EN"] = output_en_video
-                    if perform_upload and self.youtube_service:
-                        if self.cancel_event.is_set(): self.log_message("Cancelled before EN upload."); return
-                        title = self._format_with_placeholders(data["title_en_template"], date_val, location_val)
-                        desc = self._format_with_placeholders(data["desc_en_template"], date_val, location_val)
-                        result = upload_video(self.youtube_service, output_en_video, title, desc, cancel_event=self.cancel_event)
-                        if result == "CANCELLED": self.log_message(f"Upload of '{title}' cancelled."); return
-                        elif result: self.log_message(f"Uploaded '{title}' to YouTube.")
-                        else: self.log_message(f"Failed to upload EN video or upload was interrupted.")
-                else: self.log_message(f"Failed to process English mixed video.")
-            
             if self.cancel_event.is_set(): self.log_message("Operation cancelled during processing/upload.")
             else: self.log_message("\n--- All tasks completed for this operation. ---")
 
@@ -485,6 +752,7 @@ class VideoProcessorApp:
             self.log_message(f"FATAL ERROR in operation thread: {e}")
             self.log_message(traceback.format_exc())
         finally:
+            self._close_upload_manager()
             self._operation_finished()
 
     def _perform_upload_existing(self, data):
@@ -493,32 +761,68 @@ class VideoProcessorApp:
             date_val, location_val = data["date_val"], data["location_val"]
             meeting_type = data.get("meeting_type", "Sermon")
             
-            lang_info = {
-                "HE": ("he", "title_he_template", "desc_he_template"),
-                "RU": ("ru", "title_ru_template", "desc_ru_template"),
-                "EN": ("en", "title_en_template", "desc_en_template"),
-            }
-
-            any_uploaded = False
-            for lang_key, (lang_code, title_key, desc_key) in lang_info.items():
+            # Either the multi-track video or the per-language ones, as process_service renders them
+            if data.get("multi_track"):
+                lang_info = {MULTI_TRACK: ("title_he_template", "desc_he_template")} # Uses the Hebrew texts
+            else:
+                lang_info = {
+                    "HE": ("title_he_template", "desc_he_template"),
+                    "RU": ("title_ru_template", "desc_ru_template"),
+                    "EN": ("title_en_template", "desc_en_template"),
+                }
+
+            upload_manager = self._new_upload_manager()
+            uploads = []
+            for lang_key, (title_key, desc_key) in lang_info.items():
                 if self.cancel_event.is_set(): self.log_message("Upload existing cancelled."); break
+                service_job = service_journal.job_id(data["video_path"], meeting_type, data.get("multi_track", False))
+                source_key = output_manifest.output_key(data["video_path"], meeting_type, lang_key)
                 
-                output_video_path = create_custom_output_filename(meeting_type, lang_code, self.output_dir, language_code=lang_code)
-                # Also check self.processed_video_paths as it might have the exact path from a previous "Process Only" run
-                if self.processed_video_paths.get(lang_key) and os.path.exists(self.processed_video_paths[lang_key]):
+                # Look the render up in the output manifest; fall back to this session's renders
+                # and to uploads interrupted in a previous run
+                manifest_entry = output_manifest.find_output(data["video_path"], meeting_type, lang_key)
+                if manifest_entry:
+                    output_video_path = manifest_entry["path"]
+                elif self.processed_video_paths.get(lang_key) and os.path.exists(self.processed_video_paths[lang_key]):
                     output_video_path = self.processed_video_paths[lang_key]
-                elif not os.path.exists(output_video_path):
-                    self.log_message(f"File for {lang_key} not found at {output_video_path}, skipping upload.")
+                else:
+                    interrupted = upload_journal.pending_uploads(source_key) # Only uploads of this video's output
+                    if not interrupted:
+                        self.log_message(f"No processed {lang_key} video found for this video and meeting type, skipping upload.")
+                        continue
+                    output_video_path = max(interrupted, key=os.path.getmtime) # Most recent render
+                    self.log_message(f"Found interrupted {lang_key} upload, resuming: {output_video_path}")
+
+                video_id = data.get("resume", True) and service_journal.completed_upload(service_job, lang_key, output_video_path)
+                if video_id:
+                    self.log_message(f"{lang_key} video was already uploaded (video id {video_id}), skipping upload.")
                     continue
 
                 self.log_message(f"\n--- Uploading existing {lang_key} video: {output_video_path} ---")
                 title = self._format_with_placeholders(data[title_key], date_val, location_val)
                 desc = self._format_with_placeholders(data[desc_key], date_val, location_val)
                 
-                result = upload_video(self.youtube_service, output_video_path, title, desc, cancel_event=self.cancel_event)
-                if result == "CANCELLED": self.log_message(f"Upload of '{title}' cancelled."); break
-                elif result: self.log_message(f"Uploaded '{title}' to YouTube."); any_uploaded = True
-                else: self.log_message(f"Failed to upload '{title}' or upload was interrupted.")
+                service_journal.mark_running(service_job, service_journal.upload_stage(lang_key), path=output_video_path)
+                uploads.append((lang_key, service_job, output_video_path, title,
+                                upload_manager.submit(output_video_path, title, desc, cancel_event=self.cancel_event,
+                                                      chunksize=data.get("chunksize", DEFAULT_CHUNK_SIZE),
+                                                      default_audio_language=UPLOAD_AUDIO_LANGUAGES.get(lang_key),
+                                                      source_key=source_key)))
+
+            any_uploaded = False
+            for lang_key, service_job, output_video_path, title, future in uploads:
+                try: result = future.result()
+                except Exception as e: self.log_message(f"ERROR uploading '{title}': {e}"); result = None
+                stage = service_journal.upload_stage(lang_key)
+                if result == "CANCELLED":
+                    self.log_message(f"Upload of '{title}' cancelled.")
+                    service_journal.mark_failed(service_job, stage, cancelled=True)
+                elif result:
+                    self.log_message(f"Uploaded '{title}' to YouTube."); any_uploaded = True
+                    service_journal.mark_upload_done(service_job, lang_key, output_video_path, result.get("id"))
+                else:
+                    self.log_message(f"Failed to upload '{title}' or upload was interrupted.")
+                    service_journal.mark_failed(service_job, stage)
             
             if not any_uploaded and not self.cancel_event.is_set():
                 self.log_message("No existing processed files found to upload for the selected base video, or all uploads failed.")
@@ -529,6 +833,7 @@ class VideoProcessorApp:
             self.log_message(f"FATAL ERROR in upload existing thread: {e}")
             self.log_message(traceback.format_exc())
         finally:
+            self._close_upload_manager()
             self._operation_finished()
 
     def add_segment(self):
@@ -536,8 +841,8 @@ class VideoProcessorApp:
         if dlg.result:
             start, end = dlg.result
             if start is not None and end is not None:
-                self.segments_data.append((start, end))
-                self.segments_list.insert(tk.END, f"{start}-{end}")
+                # Overlapping or touching segments are merged so the list stays minimal
+                self._set_segments(SegmentSet(self.segments_data + [(start, end)]).as_list())
 
     def remove_segment(self):
         try:
@@ -548,15 +853,15 @@ class VideoProcessorApp:
 
 
 class SegmentDialog(simpledialog.Dialog):
-    def __init__(self, parent, title="Enter Segment Times (seconds)"):
+    def __init__(self, parent, title="Enter Segment Times (seconds or HH:MM:SS.mmm)"):
         self.result = None
         super().__init__(parent, title=title)
 
     def body(self, master):
         tk.Label(master, text="Start Time:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
         tk.Label(master, text="End Time:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
-        self.start_entry = tk.Entry(master, width=10)
-        self.end_entry = tk.Entry(master, width=10)
+        self.start_entry = tk.Entry(master, width=14)
+        self.end_entry = tk.Entry(master, width=14)
         self.start_entry.grid(row=0, column=1, padx=5, pady=2)
         self.end_entry.grid(row=1, column=1, padx=5, pady=2)
         return self.start_entry
@@ -566,14 +871,12 @@ class SegmentDialog(simpledialog.Dialog):
             start_str, end_str = self.start_entry.get(), self.end_entry.get()
             if not start_str or not end_str:
                 messagebox.showerror("Input Error", "Times cannot be empty.", parent=self); self.result = None; return
-            start, end = float(start_str), float(end_str)
-            if start < 0 or end < 0:
-                messagebox.showerror("Input Error", "Times cannot be negative.", parent=self); self.result = None; return
+            start, end = parse_time(start_str), parse_time(end_str) # Rejects negative times too
             if start >= end:
                 messagebox.showerror("Input Error", "Start time must be < end time.", parent=self); self.result = None; return
             self.result = (start, end)
-        except ValueError:
-            messagebox.showerror("Input Error", "Please enter numeric values.", parent=self); self.result = None
+        except ValueError as e:
+            messagebox.showerror("Input Error", str(e), parent=self); self.result = None
 
 
 # --- Tooltip Helper ---
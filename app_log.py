@@ -0,0 +1,98 @@
+# app_log.py
+# The app's log outside the GUI widget: every message, with time, thread and source module,
+# goes to a rotating file on disk, and print() output from the processing modules
+# (ffmpeg_processor, youtube_uploader, ...) is captured so it reaches the Logs tab and the file
+# instead of only a console that a windowed app does not have.
+import os
+import sys
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+from path_util import data_path
+
+LOG_FILE = data_path(os.path.join('logs', 'app.log'))
+LOG_MAX_BYTES = 5 * 1024 * 1024 # Per file; older logs move to app.log.1 ... app.log.N
+LOG_BACKUP_COUNT = 5
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s"
+
+logger = logging.getLogger("uploader")
+
+class _FileHandler(RotatingFileHandler):
+    """RotatingFileHandler whose own errors (locked or full log file) go to the real stderr, never back into the log."""
+    def handleError(self, record):
+        if sys.__stderr__ is None: # Windowed build without a console
+            return
+        saved = sys.stderr
+        sys.stderr = sys.__stderr__
+        try:
+            super().handleError(record)
+        finally:
+            sys.stderr = saved
+
+def setup_file_log(path=LOG_FILE):
+    """Sends the "uploader" loggers to a RotatingFileHandler at path (once). Returns path, or None if it can't be written."""
+    if any(isinstance(handler, RotatingFileHandler) for handler in logger.handlers):
+        return path
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = _FileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    except OSError as e:
+        print(f"Could not open the log file {path}: {e}")
+        return None
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return path
+
+class PrintCapture:
+    """
+    Stand-in for sys.stdout/sys.stderr: passes everything through to the original stream and
+    hands every complete line to sink(line) and to the file log, named after the module that
+    printed it. Lines are assembled per thread, so concurrent prints never interleave.
+    Anything written while a line is being logged (e.g. logging reporting its own failure)
+    goes straight to the real console stream, so a failing log can never recurse.
+    """
+    def __init__(self, stream, sink, level=logging.INFO):
+        self.stream = stream
+        self.sink = sink
+        self.level = level
+        self._partial = threading.local()
+        self._fallback = sys.__stderr__ if level >= logging.WARNING else sys.__stdout__
+
+    def write(self, text):
+        if getattr(self._partial, "logging", False): # Nested call from inside the logging below
+            if self._fallback is not None:
+                try: self._fallback.write(text)
+                except (OSError, ValueError): pass
+            return len(text)
+        if self.stream is not None:
+            try: self.stream.write(text)
+            except (OSError, ValueError): pass # No console (windowed build) or closed
+        buffered = getattr(self._partial, "text", "") + text
+        *lines, self._partial.text = buffered.split("\n")
+        if lines:
+            source = sys._getframe(1).f_globals.get("__name__", "?") # print() itself has no Python frame
+            self._partial.logging = True
+            try:
+                for line in lines:
+                    logger.getChild(source).log(self.level, line)
+                    self.sink(line)
+            finally:
+                self._partial.logging = False
+        return len(text)
+
+    def flush(self):
+        if self.stream is not None:
+            try: self.stream.flush()
+            except (OSError, ValueError): pass
+
+    def isatty(self):
+        return False
+
+def capture_prints(sink):
+    """Routes print() output (stdout and stderr) through PrintCapture to sink. Returns the originals."""
+    originals = sys.stdout, sys.stderr
+    sys.stdout = PrintCapture(sys.stdout, sink)
+    sys.stderr = PrintCapture(sys.stderr, sink, logging.WARNING)
+    return originals
@@ -0,0 +1,233 @@
+# audio_analysis.py
+# Analysis of the source audio before mixing. ffmpeg decodes and downsamples straight to
+# mono 16-bit PCM on a pipe, and only a bounded window is read, so even 2-hour
+# recordings are analysed in seconds without holding them in memory.
+import subprocess
+import threading
+import collections
+import numpy as np
+from ffmpeg_processor import FFMPEG_PATH
+from path_util import subprocess_kwargs
+
+ANALYSIS_SAMPLE_RATE = 8000 # Hz; plenty for speech, keeps FFTs small
+PCM_CHUNK_BYTES = 64 * 1024
+
+# --- Offset detection ---
+ALIGNMENT_WINDOW_SECONDS = 120.0 # How much audio the two recordings must share
+MAX_OFFSET_SECONDS = 60.0        # Largest offset searched for, in either direction
+MIN_ALIGNMENT_CONFIDENCE = 10.0  # Correlation peak vs. background (in standard deviations) to trust a result;
+                                 # unrelated recordings still reach ~7 by chance over a minute of lags
+
+def iter_pcm_blocks(path, start=0.0, duration=None, sample_rate=ANALYSIS_SAMPLE_RATE, cancel_event=None):
+    """
+    Decodes the first audio stream of path to mono 16-bit PCM and yields it as numpy
+    int16 blocks of up to PCM_CHUNK_BYTES / 2 samples, so callers never hold the whole file.
+    Only [start, start + duration) is decoded (-ss before -i seeks without decoding the
+    skipped part). Raises RuntimeError if ffmpeg is missing or fails; stops early (without
+    error) if cancel_event is set, so callers should check it afterwards.
+    """
+    if not FFMPEG_PATH:
+        raise RuntimeError("FFmpeg executable not found. Cannot analyse audio.")
+    command = [FFMPEG_PATH, '-nostdin', '-v', 'error']
+    if start > 0:
+        command += ['-ss', f"{start:.3f}"]
+    command += ['-i', path]
+    if duration is not None:
+        command += ['-t', f"{duration:.3f}"]
+    command += ['-map', '0:a:0', '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', 'pipe:1']
+    try:
+        process = subprocess.Popen(command, **subprocess_kwargs(stdout=subprocess.PIPE, stderr=subprocess.PIPE))
+    except OSError as e:
+        raise RuntimeError(f"Error starting FFmpeg to read audio from {path}: {e}") from e
+
+    # Drain stderr on the side so a chatty ffmpeg can never block on a full pipe
+    stderr_tail = collections.deque(maxlen=20)
+    stderr_thread = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+    stderr_thread.start()
+    pending = b""
+    finished = False
+    try:
+        while not (cancel_event is not None and cancel_event.is_set()):
+            chunk = process.stdout.read(PCM_CHUNK_BYTES)
+            if not chunk:
+                finished = True
+                break
+            pending += chunk
+            usable = len(pending) - len(pending) % 2
+            if usable:
+                yield np.frombuffer(pending[:usable], dtype=np.int16)
+            pending = pending[usable:]
+    finally:
+        if not finished:
+            process.kill() # Cancelled, or the caller stopped reading early
+        return_code = process.wait()
+        stderr_thread.join()
+    if finished and return_code != 0: # Killing it after a cancel is not an error
+        message = b"".join(stderr_tail).decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"Error reading audio from {path}: {message}")
+
+def read_pcm(path, start=0.0, duration=None, sample_rate=ANALYSIS_SAMPLE_RATE, cancel_event=None):
+    """
+    Decodes [start, start + duration) of path to mono float32 samples in [-1, 1].
+    Returns a numpy array (possibly empty), or None if ffmpeg failed or was cancelled.
+    """
+    # Pre-size the buffer when the window is known, so reading never copies what it already has
+    samples = np.empty(int((duration or 600) * sample_rate) + sample_rate, dtype=np.int16)
+    count = 0
+    try:
+        for block in iter_pcm_blocks(path, start, duration, sample_rate, cancel_event):
+            if count + len(block) > len(samples):
+                samples = np.resize(samples, max(len(samples) * 2, count + len(block)))
+            samples[count:count + len(block)] = block
+            count += len(block)
+    except RuntimeError as e:
+        print(e)
+        return None
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    return samples[:count].astype(np.float32) / 32768.0
+
+def _cross_correlation_lag(reference, signal, max_lag):
+    """
+    Lag (in samples) at which signal best lines up with reference, searched in
+    [-max_lag, max_lag], plus how far the peak stands out from the other lags.
+    Uses FFT cross-correlation with PHAT weighting: only phase is compared, so
+    different microphones, gains and room acoustics do not move the peak.
+    A positive lag means signal's content appears that many samples later in reference.
+    """
+    n = 1 << (len(reference) + len(signal) - 1).bit_length()
+    spectrum = np.fft.rfft(reference, n) * np.conj(np.fft.rfft(signal, n))
+    spectrum /= np.abs(spectrum) + 1e-12
+    correlation = np.fft.irfft(spectrum, n)
+    max_lag = min(max_lag, n // 2 - 1)
+    # Lags -max_lag..max_lag, in order (negative lags wrap around to the end)
+    window = np.concatenate((correlation[-max_lag:], correlation[:max_lag + 1])) if max_lag else correlation[:1]
+    peak = int(np.argmax(window))
+    background = np.delete(window, slice(max(0, peak - 10), peak + 11)) # Ignore the peak's own lobe
+    spread = float(np.std(background)) if len(background) else 0.0
+    confidence = float((window[peak] - np.mean(background)) / spread) if spread > 0 else 0.0
+    return peak - max_lag, confidence
+
+def detect_audio_offset(video_path, audio_path, window_seconds=ALIGNMENT_WINDOW_SECONDS,
+                        max_offset_seconds=MAX_OFFSET_SECONDS, start=0.0, cancel_event=None):
+    """
+    Finds how far audio_path is shifted against the camera audio of video_path by
+    cross-correlating window_seconds of both (starting at `start` in the video).
+    Returns {"offset": seconds, "confidence": float, "reliable": bool}, or None if the
+    audio could not be read. A positive offset means the recording started after the
+    video and must be delayed; negative means its first -offset seconds must be cut.
+    """
+    # Read enough of both files to cover the shared window at any offset in range
+    read_start = max(0.0, start - max_offset_seconds)
+    read_duration = window_seconds + 2 * max_offset_seconds
+    camera = read_pcm(video_path, read_start, read_duration, cancel_event=cancel_event)
+    if camera is None:
+        return None
+    recording = read_pcm(audio_path, read_start, read_duration, cancel_event=cancel_event)
+    if recording is None:
+        return None
+    if len(camera) < ANALYSIS_SAMPLE_RATE or len(recording) < ANALYSIS_SAMPLE_RATE:
+        print("Not enough audio to detect an offset (need at least one second in both files).")
+        return None
+    # Remove DC so silence correlates with nothing
+    camera = camera - np.mean(camera)
+    recording = recording - np.mean(recording)
+    lag, confidence = _cross_correlation_lag(camera, recording, int(max_offset_seconds * ANALYSIS_SAMPLE_RATE))
+    return {
+        "offset": round(lag / ANALYSIS_SAMPLE_RATE, 3),
+        "confidence": round(confidence, 1),
+        "reliable": confidence >= MIN_ALIGNMENT_CONFIDENCE,
+    }
+
+# --- Translation segment detection ---
+VAD_FRAME_SECONDS = 0.05       # Energy is measured over 50 ms frames
+NOISE_FLOOR_PERCENTILE = 10    # A track's quietest frames define its noise floor
+SPEECH_MARGIN_DB = 12.0        # Frames this far above the noise floor count as speech...
+SILENCE_DBFS = -60.0           # ...unless they are quieter than this in absolute terms
+SPEECH_HANGOVER_SECONDS = 0.3  # Speech stays "on" this long after the level drops (bridges gaps between words)
+MIN_SEGMENT_GAP_SECONDS = 1.5  # Segments closer together than this are joined
+MIN_SEGMENT_SECONDS = 2.0      # Shorter segments are dropped
+
+def frame_levels(path, frame_seconds=VAD_FRAME_SECONDS, cancel_event=None):
+    """
+    RMS level (dBFS) of every frame_seconds frame of path, computed block by block while
+    the audio streams in. Returns a numpy array, or None if reading failed or was cancelled.
+    """
+    frame_length = int(ANALYSIS_SAMPLE_RATE * frame_seconds)
+    mean_squares = []
+    carry = np.empty(0, dtype=np.int16) # Samples of an incomplete frame at the end of a block
+    try:
+        for block in iter_pcm_blocks(path, cancel_event=cancel_event):
+            if len(carry):
+                block = np.concatenate((carry, block))
+            usable = len(block) - len(block) % frame_length
+            frames = block[:usable].reshape(-1, frame_length).astype(np.float32) / 32768.0
+            mean_squares.append(np.einsum('ij,ij->i', frames, frames) / frame_length)
+            carry = block[usable:]
+    except RuntimeError as e:
+        print(e)
+        return None
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    if not mean_squares:
+        return np.empty(0, dtype=np.float32)
+    return 10 * np.log10(np.concatenate(mean_squares) + 1e-10)
+
+def speech_activity(levels, frame_seconds=VAD_FRAME_SECONDS):
+    """Boolean speech/no-speech per frame, from the frame levels of one track."""
+    if not len(levels):
+        return np.zeros(0, dtype=bool)
+    threshold = max(np.percentile(levels, NOISE_FLOOR_PERCENTILE) + SPEECH_MARGIN_DB, SILENCE_DBFS)
+    active = levels > threshold
+    hangover = int(round(SPEECH_HANGOVER_SECONDS / frame_seconds))
+    if hangover:
+        # A frame is active if any of the previous `hangover` frames was
+        active = np.convolve(active, np.ones(hangover + 1, dtype=np.int32))[:len(active)] > 0
+    return active
+
+def _pad(mask, length):
+    return np.concatenate((mask, np.zeros(length - len(mask), dtype=bool))) if len(mask) < length else mask
+
+def _runs(mask):
+    """(start, end) frame index pairs of every run of True in mask."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return list(zip(edges[::2], edges[1::2]))
+
+def detect_translation_segments(hebrew_audio_path, translation_audio_paths, audio_offset=0.0, cancel_event=None):
+    """
+    Proposes the translation-only segments: stretches where a translator speaks and
+    the Hebrew speaker is silent. Each track's speech is found from its frame energy
+    relative to its own noise floor; nearby stretches are joined and short ones dropped.
+    audio_offset (see detect_audio_offset) moves the result onto the video's timeline.
+    Returns [(start_sec, end_sec), ...], or None if a track could not be read.
+    """
+    hebrew_levels = frame_levels(hebrew_audio_path, cancel_event=cancel_event)
+    if hebrew_levels is None:
+        return None
+    translation_activity = []
+    for path in translation_audio_paths:
+        levels = frame_levels(path, cancel_event=cancel_event)
+        if levels is None:
+            return None
+        translation_activity.append(speech_activity(levels))
+    if not translation_activity:
+        return []
+
+    length = max(len(hebrew_levels), *(len(activity) for activity in translation_activity))
+    hebrew_active = _pad(speech_activity(hebrew_levels), length)
+    translator_active = np.logical_or.reduce([_pad(activity, length) for activity in translation_activity])
+    candidates = translator_active & ~hebrew_active
+
+    segments = []
+    for start, end in _runs(candidates):
+        start, end = float(start * VAD_FRAME_SECONDS), float(end * VAD_FRAME_SECONDS)
+        if segments and start - segments[-1][1] < MIN_SEGMENT_GAP_SECONDS:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    result = []
+    for start, end in segments:
+        start, end = max(0.0, start + audio_offset), end + audio_offset
+        if end - start >= MIN_SEGMENT_SECONDS:
+            result.append((round(start, 2), round(end, 2)))
+    return result
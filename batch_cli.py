@@ -0,0 +1,238 @@
+# batch_cli.py
+"""
+Headless batch runner: processes (and optionally uploads) many services from a
+manifest file, without the GUI.
+
+    python batch_cli.py services.json --upload --concurrency 2 --report results.json
+
+The manifest is either JSON (a list of services, or {"defaults": {...}, "services": [...]})
+or CSV with one service per row. Fields per service:
+    video, audio_he (required), audio_ru, audio_en, segments ("60-300, 450-600",
+    [[60, 300], ...] or "auto" to detect them), audio_offset (seconds, or "auto" to
+    detect it), meeting_type, date, location, name, and optional
+    title_he/desc_he/title_ru/desc_ru/title_en/desc_en template overrides.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from service_pipeline import process_service, LANGUAGES, CACHED, UPLOADED, AUTO_SEGMENTS
+from service_templates import DEFAULT_TEMPLATES
+from job_scheduler import DONE, default_worker_count
+from ffmpeg_processor import DUCKING_FADE_SECONDS, ENCODER_PROFILES, DEFAULT_ENCODER_PROFILE
+from segments import SegmentSet
+from render_cache import DEFAULT_MAX_CACHE_BYTES
+from youtube_uploader import DEFAULT_CHUNK_SIZE
+from upload_manager import UploadManager, DEFAULT_CONCURRENT_UPLOADS
+import metrics
+
+DEFAULT_SERVICE_CONCURRENCY = 2
+
+_print_lock = threading.Lock()
+
+def _log_for(name):
+    def log(message):
+        with _print_lock:
+            for line in str(message).strip("\n").splitlines() or [""]:
+                print(f"[{name}] {line}", flush=True)
+    return log
+
+def load_manifest(path):
+    """Reads a JSON or CSV manifest into a list of service dicts."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return [{key: value for key, value in row.items() if value not in (None, "")} for row in csv.DictReader(f)]
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        return manifest
+    defaults = manifest.get("defaults", {})
+    return [dict(defaults, **service) for service in manifest.get("services", [])]
+
+def _parse_segments(value):
+    if not value:
+        return []
+    if isinstance(value, str) and value.strip().lower() == AUTO_SEGMENTS:
+        return AUTO_SEGMENTS
+    if isinstance(value, str):
+        return SegmentSet.parse(value, strict=True).as_list()
+    return SegmentSet(value).as_list()
+
+def build_service_data(service, options, index):
+    """Turns one manifest entry into the data dict process_service expects."""
+    video_path = service.get("video")
+    if not video_path or not os.path.isfile(video_path):
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+    he_audio_path = service.get("audio_he")
+    if not he_audio_path or not os.path.isfile(he_audio_path):
+        raise FileNotFoundError(f"Hebrew audio file not found: {he_audio_path}")
+    for key in ("audio_ru", "audio_en"):
+        if service.get(key) and not os.path.isfile(service[key]):
+            raise FileNotFoundError(f"{key} file not found: {service[key]}")
+
+    meeting_type = service.get("meeting_type", "Sermon")
+    if meeting_type not in DEFAULT_TEMPLATES:
+        raise ValueError(f"Unknown meeting type '{meeting_type}'. Expected one of: {', '.join(DEFAULT_TEMPLATES)}")
+    name = service.get("name") or f"{index:03d}-{os.path.splitext(os.path.basename(video_path))[0]}"
+
+    data = {
+        "name": name,
+        "video_path": video_path,
+        "he_audio_path": he_audio_path,
+        "ru_audio_path": service.get("audio_ru", ""),
+        "en_audio_path": service.get("audio_en", ""),
+        "date_val": service.get("date", datetime.date.today().strftime("%Y-%m-%d")),
+        "location_val": service.get("location", ""),
+        "segments_data": _parse_segments(service.get("segments")),
+        "meeting_type": meeting_type,
+        # Every service gets its own folder: output names only carry the minute and meeting type
+        "output_dir": os.path.join(options.output_dir, name),
+        "max_workers": options.render_workers,
+        "single_pass": options.single_pass,
+        "chunksize": options.chunk_size_mb * 1024 * 1024,
+        "use_render_cache": not options.no_cache,
+        "render_cache_bytes": options.cache_size_gb * 1024 ** 3,
+        "fade_duration": options.fade,
+        "audio_offset": service.get("audio_offset", 0.0),
+        "copy_audio": not options.no_audio_copy,
+        "encoder_profile": options.encoder_profile,
+        "multi_track": options.multi_track,
+        "resume": not options.no_resume,
+    }
+    for lang_key in LANGUAGES:
+        lang_code = lang_key.lower()
+        default_title, default_desc = DEFAULT_TEMPLATES[meeting_type][lang_key]
+        data[f"title_{lang_code}_template"] = service.get(f"title_{lang_code}", default_title)
+        data[f"desc_{lang_code}_template"] = service.get(f"desc_{lang_code}", default_desc)
+    return data
+
+def _service_status(languages, upload, cancelled):
+    if cancelled:
+        return "CANCELLED"
+    for result in languages.values():
+        if result["render"] not in (DONE, CACHED):
+            return "FAILED"
+        if upload and result["upload"] != UPLOADED:
+            return "FAILED"
+    return "OK" if languages else "FAILED"
+
+def run_service(service, index, options, upload_manager, cancel_event):
+    """Runs one service and returns its entry for the results report."""
+    entry = {"name": service.get("name"), "video": service.get("video"), "status": None,
+             "error": None, "languages": {}, "elapsed_seconds": None}
+    started = time.monotonic()
+    try:
+        data = build_service_data(service, options, index)
+        entry["name"] = data["name"]
+        log = _log_for(data["name"])
+        log(f"Starting ({data['meeting_type']}, {data['date_val']})")
+        with metrics.span("service", kind="batch", service=data["name"]) as measured:
+            entry["languages"] = process_service(data, options.upload, None, cancel_event, log=log,
+                                                 upload_manager=upload_manager)
+            entry["status"] = _service_status(entry["languages"], options.upload, cancel_event.is_set())
+            measured.set_status({"OK": metrics.OK, "CANCELLED": metrics.CANCELLED}.get(entry["status"], metrics.ERROR))
+        log(f"Finished: {entry['status']}")
+    except (FileNotFoundError, ValueError) as e: # Bad manifest entry
+        entry["status"] = "FAILED"
+        entry["error"] = f"{type(e).__name__}: {e}"
+        _log_for(entry["name"] or f"service {index}")(f"ERROR: {e}")
+    except Exception as e:
+        entry["status"] = "FAILED"
+        entry["error"] = f"{type(e).__name__}: {e}"
+        _log_for(entry["name"] or f"service {index}")(f"ERROR: {e}\n{traceback.format_exc()}")
+    entry["elapsed_seconds"] = round(time.monotonic() - started, 1)
+    return entry
+
+def run_batch(services, options, cancel_event=None):
+    """Processes services with at most options.concurrency running at once. Returns the report dict."""
+    if cancel_event is None:
+        cancel_event = threading.Event()
+    upload_manager = None
+    if options.upload:
+        from youtube_uploader import get_authenticated_service
+        # One manager for the whole batch, so the bandwidth limit covers every service's uploads
+        upload_manager = UploadManager(get_authenticated_service(), options.parallel_uploads,
+                                       options.upload_limit_mbps * 1e6 / 8, _log_for("uploads"))
+
+    report = {"started": datetime.datetime.now().isoformat(timespec="seconds"), "services": []}
+    with ThreadPoolExecutor(max_workers=max(1, options.concurrency), thread_name_prefix="service") as executor:
+        futures = [executor.submit(run_service, service, index, options, upload_manager, cancel_event)
+                   for index, service in enumerate(services, start=1)]
+        try:
+            for future in futures:
+                while not future.done():
+                    # Short waits keep Ctrl+C responsive on the main thread
+                    time.sleep(0.2)
+                report["services"].append(future.result())
+        except KeyboardInterrupt:
+            print("Interrupted: cancelling running renders and uploads...", flush=True)
+            cancel_event.set()
+            for future in futures:
+                future.cancel()
+            report["services"] = [future.result() for future in futures if not future.cancelled()]
+    if upload_manager:
+        upload_manager.shutdown()
+    report["finished"] = datetime.datetime.now().isoformat(timespec="seconds")
+    report["summary"] = {
+        status: sum(1 for entry in report["services"] if entry["status"] == status)
+        for status in ("OK", "FAILED", "CANCELLED")
+    }
+    return report
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Process and upload many services without the GUI.")
+    parser.add_argument("manifest", help="JSON or CSV file listing the services")
+    parser.add_argument("--upload", action="store_true", help="Upload every rendered video to YouTube")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_SERVICE_CONCURRENCY,
+                        help=f"Services processed at the same time (default {DEFAULT_SERVICE_CONCURRENCY})")
+    parser.add_argument("--render-workers", type=int, default=default_worker_count(),
+                        help="Parallel language renders within one service")
+    parser.add_argument("--single-pass", action="store_true", help="Render all languages of a service in one ffmpeg run")
+    parser.add_argument("--parallel-uploads", type=int, default=DEFAULT_CONCURRENT_UPLOADS,
+                        help="Videos uploaded at the same time, across all services")
+    parser.add_argument("--upload-limit-mbps", type=float, default=0,
+                        help="Total upload bandwidth limit in Mbit/s (0 = unlimited)")
+    parser.add_argument("--multi-track", action="store_true",
+                        help="Write (and upload) one video per service with every language as a separate audio track")
+    parser.add_argument("--output-dir", default="output_videos", help="Base folder; each service gets a subfolder")
+    parser.add_argument("--report", default="batch_results.json", help="Where to write the JSON results report")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-render, ignoring the render cache")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Redo every stage, even those an earlier run of the same service finished (incl. uploads)")
+    parser.add_argument("--cache-size-gb", type=int, default=DEFAULT_MAX_CACHE_BYTES // 1024 ** 3)
+    parser.add_argument("--chunk-size-mb", type=int, default=DEFAULT_CHUNK_SIZE // (1024 * 1024))
+    parser.add_argument("--no-audio-copy", action="store_true",
+                        help="Always re-encode the Hebrew audio, even when it is already suitable AAC")
+    parser.add_argument("--encoder-profile", choices=list(ENCODER_PROFILES), default=DEFAULT_ENCODER_PROFILE,
+                        help="Audio encoder profile (profiles whose encoder ffmpeg lacks fall back to the default)")
+    parser.add_argument("--fade", type=float, default=DUCKING_FADE_SECONDS, help="Ducking fade in seconds")
+    parser.add_argument("--metrics-file", default=metrics.METRICS_FILE,
+                        help="Where to append timing metrics as JSON lines")
+    parser.add_argument("--metrics-prom", help="Also keep Prometheus text-format totals in this file")
+    return parser
+
+def main(argv=None):
+    options = build_arg_parser().parse_args(argv)
+    metrics.configure(options.metrics_file, options.metrics_prom)
+    services = load_manifest(options.manifest)
+    if not services:
+        print(f"No services found in {options.manifest}")
+        return 1
+    print(f"Processing {len(services)} service(s), {options.concurrency} at a time...", flush=True)
+    report = run_batch(services, options)
+    with open(options.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    summary = report["summary"]
+    print(f"Done: {summary['OK']} OK, {summary['FAILED']} failed, {summary['CANCELLED']} cancelled. "
+          f"Report written to {options.report}")
+    return 0 if summary["FAILED"] == 0 and summary["CANCELLED"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# encoder_benchmark.py
+"""
+Reports how fast each audio encoder profile (ffmpeg_processor.ENCODER_PROFILES) encodes
+on this machine, to help pick one in Settings or with batch_cli.py --encoder-profile.
+
+    python encoder_benchmark.py                  # 5-minute synthetic reference clip
+    python encoder_benchmark.py --clip rec.wav --duration 120
+
+Without --clip, a stereo reference clip (tones over pink noise, roughly the spectrum of
+a speech recording) is synthesized with ffmpeg's lavfi sources, so results are comparable
+between machines. Profiles whose encoder the installed ffmpeg lacks are listed as skipped.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from ffmpeg_processor import FFMPEG_PATH, ENCODER_PROFILES, available_encoder_profiles, audio_encode_args
+from media_probe import media_duration
+from path_util import run_captured
+
+REFERENCE_CLIP_SECONDS = 300
+REFERENCE_SAMPLE_RATE = 48000
+
+def make_reference_clip(path, duration=REFERENCE_CLIP_SECONDS):
+    """Writes a synthetic stereo WAV of `duration` seconds to path. Returns True on success."""
+    command = [FFMPEG_PATH, '-y', '-v', 'error',
+               '-f', 'lavfi', '-i', f"anoisesrc=color=pink:amplitude=0.2:duration={duration}:sample_rate={REFERENCE_SAMPLE_RATE}",
+               '-f', 'lavfi', '-i', f"sine=frequency=220:beep_factor=4:duration={duration}:sample_rate={REFERENCE_SAMPLE_RATE}",
+               '-filter_complex', "[0:a][1:a]amix=inputs=2,aformat=channel_layouts=stereo",
+               '-c:a', 'pcm_s16le', path]
+    result = run_captured(command)
+    if result.returncode != 0:
+        print(f"Could not create the reference clip: {result.stderr.strip()}")
+    return result.returncode == 0
+
+def benchmark_profile(clip_path, clip_duration, profile, output_path):
+    """
+    Encodes clip_path with one profile. Returns {"seconds", "speed", "kbps"} (speed as
+    x realtime, kbps of the encoded file), or None if ffmpeg failed.
+    """
+    command = [FFMPEG_PATH, '-y', '-v', 'error', '-i', clip_path, '-vn',
+               *audio_encode_args(profile), output_path]
+    started = time.perf_counter()
+    result = run_captured(command)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        print(f"  ffmpeg failed: {result.stderr.strip()}")
+        return None
+    return {
+        "seconds": elapsed,
+        "speed": clip_duration / elapsed if elapsed > 0 else 0.0,
+        "kbps": os.path.getsize(output_path) * 8 / 1000 / clip_duration,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the audio encoder profiles on a reference clip.")
+    parser.add_argument("--clip", help="Audio or video file to encode (default: a synthesized clip)")
+    parser.add_argument("--duration", type=int, default=REFERENCE_CLIP_SECONDS,
+                        help="Length of the synthesized clip in seconds")
+    parser.add_argument("--profile", action="append", choices=list(ENCODER_PROFILES),
+                        help="Only benchmark this profile (repeatable)")
+    options = parser.parse_args(argv)
+    if not FFMPEG_PATH:
+        print("FFmpeg executable not found.")
+        return 1
+
+    available = available_encoder_profiles()
+    with tempfile.TemporaryDirectory(prefix="encoder_benchmark_") as work_dir:
+        clip_path = options.clip
+        if not clip_path:
+            clip_path = os.path.join(work_dir, "reference.wav")
+            print(f"Synthesizing a {options.duration}s reference clip...", flush=True)
+            if not make_reference_clip(clip_path, options.duration):
+                return 1
+        clip_duration = media_duration(clip_path)
+        if not clip_duration:
+            print(f"Could not read the duration of {clip_path}")
+            return 1
+
+        print(f"\n{'Profile':<16}{'Speed':>10}{'Time':>9}{'Bitrate':>12}  Description")
+        for name in options.profile or ENCODER_PROFILES:
+            profile = ENCODER_PROFILES[name]
+            if name not in available:
+                print(f"{name:<16}{'skipped':>10}{'':>9}{'':>12}  {profile['label']} - ffmpeg has no {profile['codec']} encoder")
+                continue
+            result = benchmark_profile(clip_path, clip_duration, profile, os.path.join(work_dir, f"{name}.m4a"))
+            if result is None:
+                print(f"{name:<16}{'failed':>10}")
+                continue
+            print(f"{name:<16}{result['speed']:>9.0f}x{result['seconds']:>8.2f}s{result['kbps']:>7.0f} kb/s  {profile['label']}", flush=True)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
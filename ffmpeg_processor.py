@@ -1,8 +1,14 @@
 # ffmpeg_processor.py
 import subprocess
 import os
-import platform
-from path_util import find_ffmpeg
+import re
+import tempfile
+import threading
+import collections
+from path_util import find_ffmpeg, subprocess_kwargs, run_captured
+from segments import SegmentSet
+from media_probe import probe_media, media_duration
+import metrics
 
 FFMPEG_PATH = find_ffmpeg()
 
@@ -16,128 +22,619 @@ HEBREW_DUCKED_VOL = 0.15 # Hebrew volume when translation is primary
 HEBREW_PRIMARY_VOL = 1.0
 TRANSLATION_SHOUTS_VOL = 0.5 # Translation volume for shouts during Hebrew primary
 
-def _run_ffmpeg_command(command, output_path):
-    """A helper to run ffmpeg commands and handle errors."""
+# Volume changes at segment boundaries fade over this many seconds (in FADE_STEPS steps)
+# instead of jumping, to avoid clicks
+DUCKING_FADE_SECONDS = 0.5
+FADE_STEPS = 10
+
+# --- Output audio encoding ---
+# Encoder profiles. codec: ffmpeg encoder name. bitrate: target (CBR/ABR), or the rough
+# average of a vbr profile (used to decide whether input audio can be copied).
+# vbr: encoder VBR mode (libfdk_aac 1-5) instead of a fixed bitrate. channels: 1 for mono
+# speech, 2 for stereo, None to keep the input's layout. threads: encoder threads (None: ffmpeg default).
+ENCODER_PROFILES = {
+    "aac-192k": {"label": "AAC 192 kb/s (ffmpeg native)", "codec": "aac", "bitrate": "192k",
+                 "vbr": None, "channels": None, "threads": None},
+    "aac-128k-mono": {"label": "AAC 128 kb/s mono speech (ffmpeg native)", "codec": "aac", "bitrate": "128k",
+                      "vbr": None, "channels": 1, "threads": None},
+    "aac-96k-mono": {"label": "AAC 96 kb/s mono speech (ffmpeg native)", "codec": "aac", "bitrate": "96k",
+                     "vbr": None, "channels": 1, "threads": None},
+    "fdk-vbr4": {"label": "AAC VBR 4, ~128 kb/s stereo (libfdk_aac)", "codec": "libfdk_aac", "bitrate": "128k",
+                 "vbr": 4, "channels": 2, "threads": None},
+    "fdk-vbr3-mono": {"label": "AAC VBR 3, ~64 kb/s mono speech (libfdk_aac)", "codec": "libfdk_aac", "bitrate": "64k",
+                      "vbr": 3, "channels": 1, "threads": None},
+}
+DEFAULT_ENCODER_PROFILE = "aac-192k" # What every render used before profiles existed
+ENCODER_LINE_RE = re.compile(r"^\s*A[.A-Z]{5}\s+(\S+)") # Audio encoder lines of `ffmpeg -encoders`
+
+# Multi-track output: ISO 639-2 language tag and player-visible name of each audio track
+AUDIO_TRACK_LANGUAGES = {"HE": "heb", "RU": "rus", "EN": "eng"}
+AUDIO_TRACK_TITLES = {"HE": "Hebrew", "RU": "Russian", "EN": "English"}
+
+# Audio that already meets the target is stream-copied instead of re-encoded (plain Hebrew output only)
+COPYABLE_AUDIO_CODECS = ('aac',)
+COPYABLE_AUDIO_PROFILES = ('LC', None) # None: profile not reported
+COPYABLE_SAMPLE_RATES = (44100, 48000)
+COPY_BITRATE_TOLERANCE = 1.1 # Copy up to 10% above the profile's bitrate; anything bigger is re-encoded down
+
+# ffmpeg -benchmark report, e.g. "bench: utime=12.345s stime=0.678s rtime=20.000s" and "bench: maxrss=123456KiB"
+BENCH_TIMES_RE = re.compile(r"bench: utime=([\d.]+)s stime=([\d.]+)s")
+BENCH_MAXRSS_RE = re.compile(r"bench: maxrss=(\d+)")
+
+_ffmpeg_version = None
+_audio_encoders = None
+
+def get_ffmpeg_version():
+    """Returns the first line of `ffmpeg -version` (cached), or None if ffmpeg is unavailable."""
+    global _ffmpeg_version
+    if _ffmpeg_version is None and FFMPEG_PATH:
+        try:
+            result = run_captured([FFMPEG_PATH, '-version'])
+            _ffmpeg_version = result.stdout.splitlines()[0] if result.stdout else ""
+        except OSError as e:
+            print(f"Could not query ffmpeg version: {e}")
+    return _ffmpeg_version
+
+def available_audio_encoders():
+    """Names of the audio encoders the installed ffmpeg supports (cached), e.g. {'aac', 'libmp3lame', ...}."""
+    global _audio_encoders
+    if _audio_encoders is None and FFMPEG_PATH:
+        try:
+            result = run_captured([FFMPEG_PATH, '-hide_banner', '-encoders'])
+            _audio_encoders = {match.group(1) for match in map(ENCODER_LINE_RE.match, result.stdout.splitlines()) if match}
+        except OSError as e:
+            print(f"Could not query ffmpeg encoders: {e}")
+    return _audio_encoders or set()
+
+def available_encoder_profiles():
+    """The ENCODER_PROFILES whose encoder the installed ffmpeg has, in definition order."""
+    encoders = available_audio_encoders()
+    return {name: profile for name, profile in ENCODER_PROFILES.items() if profile["codec"] in encoders}
+
+def get_encoder_profile(name=None):
+    """The profile called name, falling back to DEFAULT_ENCODER_PROFILE if it is unknown or its encoder is missing."""
+    if name is None or name == DEFAULT_ENCODER_PROFILE:
+        return ENCODER_PROFILES[DEFAULT_ENCODER_PROFILE]
+    if name not in ENCODER_PROFILES:
+        print(f"Warning: Unknown encoder profile '{name}', using {DEFAULT_ENCODER_PROFILE}.")
+        return ENCODER_PROFILES[DEFAULT_ENCODER_PROFILE]
+    if FFMPEG_PATH and name not in available_encoder_profiles():
+        print(f"Warning: This ffmpeg has no {ENCODER_PROFILES[name]['codec']} encoder, using {DEFAULT_ENCODER_PROFILE}.")
+        return ENCODER_PROFILES[DEFAULT_ENCODER_PROFILE]
+    return ENCODER_PROFILES[name]
+
+def audio_encode_args(profile, stream=None):
+    """
+    ffmpeg output options that encode audio with an encoder profile: for every audio
+    stream of the output, or only for audio stream number `stream` (for multi-track files).
+    """
+    spec = 'a' if stream is None else f'a:{stream}'
+    args = [f'-c:{spec}', profile["codec"]]
+    if profile.get("vbr") is not None:
+        args += [f'-vbr:{spec}', str(profile["vbr"])]
+    else:
+        args += [f'-b:{spec}', profile["bitrate"]]
+    if profile.get("channels"):
+        args += [f'-ac:{spec}', str(profile["channels"])]
+    if profile.get("threads"):
+        args += [f'-threads:{spec}', str(profile["threads"])]
+    return args
+
+def hebrew_only_parameters(audio_offset=0.0, copy_audio=True, encoder_profile=None):
+    """The part of render_parameters that process_video_hebrew_only depends on (no mixing or ducking settings)."""
+    return {
+        "audio_offset": round(float(audio_offset or 0.0), 3),
+        "encoder": {key: value for key, value in get_encoder_profile(encoder_profile).items() if key != "label"},
+        "copy_audio": bool(copy_audio),
+        "ffmpeg_version": get_ffmpeg_version(),
+    }
+
+def render_parameters(fade_duration=None, audio_offset=0.0, copy_audio=True, encoder_profile=None):
+    """Everything besides the inputs and segments that changes what a render produces (used as a cache key)."""
+    if fade_duration is None:
+        fade_duration = DUCKING_FADE_SECONDS
+    return {
+        **hebrew_only_parameters(audio_offset, copy_audio, encoder_profile),
+        "translation_primary_vol": TRANSLATION_PRIMARY_VOL,
+        "hebrew_ducked_vol": HEBREW_DUCKED_VOL,
+        "hebrew_primary_vol": HEBREW_PRIMARY_VOL,
+        "translation_shouts_vol": TRANSLATION_SHOUTS_VOL,
+        "ducking": f"asendcmd-fade-{fade_duration}x{FADE_STEPS}",
+    }
+
+STDERR_TAIL_LINES = 200 # How much of ffmpeg's stderr to keep for error reports
+# Cancellation: how often to check the cancel event, and how long to wait for ffmpeg
+# to quit after 'q' and after terminate() before killing it
+CANCEL_POLL_INTERVAL = 0.2
+GRACEFUL_STOP_TIMEOUT = 0.5
+TERMINATE_TIMEOUT = 0.5
+DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+def _parse_speed(value):
+    """ffmpeg reports speed as e.g. '2.5x' (or 'N/A' at the start)."""
+    try: return float(value.strip().rstrip('x'))
+    except ValueError: return None
+
+def _read_stderr(stream, tail, duration_holder):
+    """Drains ffmpeg's stderr so it never blocks, keeping the last lines and the input duration."""
+    for line in stream:
+        tail.append(line.rstrip())
+        if duration_holder[0] is None:
+            match = DURATION_RE.search(line)
+            if match: # First "Duration:" line belongs to input #0, the video
+                hours, minutes, seconds = match.groups()
+                duration_holder[0] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def _read_progress(stream, progress_callback, duration_holder):
+    """Parses `-progress` key=value blocks and reports one progress dict per block."""
+    block = {}
+    for line in stream:
+        key, _, value = line.strip().partition('=')
+        if not key:
+            continue
+        block[key] = value
+        if key != 'progress': # 'progress=continue|end' closes a block
+            continue
+        # out_time_ms is (despite the name) in microseconds, same as out_time_us
+        out_time_us = block.get('out_time_us') or block.get('out_time_ms')
+        try: out_time = max(0.0, int(out_time_us) / 1_000_000)
+        except (TypeError, ValueError): out_time = 0.0
+        try: total_size = int(block.get('total_size', 0))
+        except ValueError: total_size = 0
+        speed = _parse_speed(block.get('speed', ''))
+        duration = duration_holder[0]
+        percent = eta = None
+        if duration:
+            percent = min(100.0, out_time / duration * 100) # Not forced to 100 on 'end': a cancelled run ends early
+            if speed:
+                eta = max(0.0, (duration - out_time) / speed)
+        progress_callback({
+            "percent": percent,
+            "speed": speed,         # x realtime
+            "eta": eta,             # seconds
+            "out_time": out_time,   # seconds of output written so far
+            "total_size": total_size,
+            "done": value == 'end',
+        })
+        block = {}
+
+def _stop_ffmpeg(process):
+    """Asks ffmpeg to quit ('q' on stdin), then escalates to terminate and kill if it doesn't."""
+    try:
+        process.stdin.write('q')
+        process.stdin.flush()
+    except (OSError, ValueError):
+        pass # stdin already closed, ffmpeg is going away anyway
+    for stop, timeout in ((None, GRACEFUL_STOP_TIMEOUT), (process.terminate, TERMINATE_TIMEOUT), (process.kill, None)):
+        if stop:
+            stop()
+        try:
+            process.wait(timeout=timeout)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+def _watch_for_cancel(process, cancel_event, cancelled_holder):
+    """Stops ffmpeg as soon as cancel_event is set; exits when ffmpeg ends on its own."""
+    while process.poll() is None:
+        if cancel_event.wait(CANCEL_POLL_INTERVAL):
+            cancelled_holder[0] = True
+            _stop_ffmpeg(process)
+            return
+
+def _remove_partial_outputs(output_paths):
+    for path in output_paths:
+        try:
+            os.remove(path)
+            print(f"Removed partial output: {path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Warning: could not remove partial output {path}: {e}")
+
+def _input_paths(command):
+    return [command[i + 1] for i, arg in enumerate(command[:-1]) if arg == '-i']
+
+def _record_ffmpeg_metrics(measured, command, output_paths, stderr_tail):
+    """Adds ffmpeg's own CPU report (-benchmark) and the bytes read and written to a metrics span."""
+    for line in stderr_tail:
+        match = BENCH_TIMES_RE.search(line)
+        if match:
+            measured.add(child_cpu_seconds=float(match.group(1)) + float(match.group(2)))
+        match = BENCH_MAXRSS_RE.search(line)
+        if match:
+            measured.set(ffmpeg_max_rss_kb=int(match.group(1)))
+    measured.add(bytes_read=sum(os.path.getsize(path) for path in _input_paths(command) if os.path.isfile(path)),
+                 bytes_written=sum(os.path.getsize(path) for path in output_paths if os.path.isfile(path)))
+
+def _run_ffmpeg_command(command, output_path, progress_callback=None, duration=None, cancel_event=None):
+    """
+    A helper to run ffmpeg commands and handle errors.
+    output_path: the output file, or a list of them when one command writes several.
+    progress_callback(progress_dict) is called about twice a second with percent, speed (x realtime),
+    ETA, output time and output size. duration (seconds) is used for percent/ETA; if omitted it is
+    read from ffmpeg's own report of the first input.
+    If cancel_event is set while ffmpeg runs, ffmpeg is stopped and its partial outputs are deleted.
+    """
+    output_paths = [output_path] if isinstance(output_path, str) else list(output_path)
     if not FFMPEG_PATH:
         print("FATAL: FFmpeg executable not found. Cannot process video.")
         return False
         
-    # Add the discovered ffmpeg path to the command
-    command.insert(0, FFMPEG_PATH)
+    # Add the discovered ffmpeg path to the command, with machine-readable progress on stdout
+    # and its CPU time and peak memory (-benchmark) at the end of stderr
+    command[0:0] = [FFMPEG_PATH, '-progress', 'pipe:1', '-nostats', '-benchmark']
+    version = (get_ffmpeg_version() or "").split()
+    ffmpeg_version = version[2] if len(version) > 2 else None # "ffmpeg version 7.0.2 Copyright ..." -> "7.0.2"
+    with metrics.span("ffmpeg", outputs=len(output_paths), ffmpeg_version=ffmpeg_version) as measured:
+        succeeded, stderr_tail = _run_ffmpeg_process(command, output_paths, progress_callback, duration, cancel_event)
+        _record_ffmpeg_metrics(measured, command, output_paths, stderr_tail)
+        if not succeeded:
+            measured.set_status(metrics.CANCELLED if cancel_event and cancel_event.is_set() else metrics.ERROR)
+    return succeeded
+
+def _run_ffmpeg_process(command, output_paths, progress_callback, duration, cancel_event):
+    """Runs a complete ffmpeg command line for _run_ffmpeg_command. Returns (succeeded, last stderr lines)."""
+    output_path = ", ".join(output_paths) # For messages
     
     print(f"Running FFmpeg: {' '.join(command)}")
+    # Set up subprocess arguments for cross-platform compatibility
+    kwargs = subprocess_kwargs(
+        stdin=subprocess.PIPE, # Lets us ask ffmpeg to quit gracefully with 'q'
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors='replace'
+    )
+
+    try:
+        process = subprocess.Popen(command, **kwargs)
+    except OSError as e:
+        print(f"Error starting FFmpeg for {output_path}: {e}")
+        return False, []
+
+    stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+    duration_holder = [duration]
+    stderr_thread = threading.Thread(target=_read_stderr, args=(process.stderr, stderr_tail, duration_holder), daemon=True)
+    stderr_thread.start()
+    cancelled_holder = [False]
+    if cancel_event:
+        threading.Thread(target=_watch_for_cancel, args=(process, cancel_event, cancelled_holder), daemon=True).start()
     try:
-        # Set up subprocess arguments for cross-platform compatibility
-        kwargs = {
-            'check': True,
-            'capture_output': True,
-            'text': True
-        }
-        if platform.system() == "Windows":
-            # This flag prevents a console window from popping up on Windows
-            kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
-            
-        subprocess.run(command, **kwargs)
+        _read_progress(process.stdout, progress_callback or (lambda progress: None), duration_holder)
+    except Exception:
+        process.kill() # Don't leave ffmpeg blocked on a pipe nobody reads
+        raise
+    finally:
+        return_code = process.wait()
+    stderr_thread.join()
+
+    if cancelled_holder[0]:
+        print(f"FFmpeg cancelled by user: {output_path}")
+        _remove_partial_outputs(output_paths)
+        return False, stderr_tail
+    if return_code == 0:
         print(f"Successfully created: {output_path}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error processing {output_path}:")
-        print(f"STDERR: {e.stderr}") # stderr is usually more informative for ffmpeg
+        return True, stderr_tail
+    print(f"Error processing {output_path}:")
+    print("STDERR: " + "\n".join(stderr_tail)) # stderr is usually more informative for ffmpeg
+    return False, stderr_tail
+
+def _audio_input_args(audio_path, audio_offset):
+    """-i arguments for a separately recorded audio file; a negative offset skips its first -offset seconds."""
+    if audio_offset and audio_offset < 0:
+        return ['-ss', f"{-audio_offset:.3f}", '-i', audio_path]
+    return ['-i', audio_path]
+
+def _delay_filter(audio_offset):
+    """adelay filter that moves audio later by a positive offset (None if there is nothing to delay)."""
+    if audio_offset and audio_offset > 0:
+        return f"adelay=delays={round(audio_offset * 1000)}:all=1"
+    return None
+
+def _bitrate_bps(bitrate):
+    """'192k' -> 192000"""
+    bitrate = str(bitrate).strip().lower()
+    return int(float(bitrate[:-1]) * 1000) if bitrate.endswith('k') else int(bitrate)
+
+def can_copy_audio(audio_path, profile=None):
+    """
+    True if the first audio stream of audio_path can go into the MP4 as-is: AAC-LC at a
+    standard sample rate, no more than the profile's bitrate, and with the profile's channel
+    count (if it sets one). Re-encoding such a track would only cost time (and quality).
+    """
+    profile = profile or get_encoder_profile()
+    info = probe_media(audio_path)
+    audio = info["audio"] if info else None
+    if not audio:
         return False
+    bit_rate = audio["bit_rate"] or info["bit_rate"]
+    return (audio["codec"] in COPYABLE_AUDIO_CODECS
+            and audio.get("profile") in COPYABLE_AUDIO_PROFILES
+            and audio["sample_rate"] in COPYABLE_SAMPLE_RATES
+            and profile.get("channels") in (None, audio["channels"])
+            and bool(bit_rate) and bit_rate <= _bitrate_bps(profile["bitrate"]) * COPY_BITRATE_TOLERANCE)
 
-def process_video_hebrew_only(video_path, hebrew_audio_path, output_path):
-    """Creates a video with only the Hebrew audio track."""
-    command = [
-        '-y',
-        '-i', video_path,
-        '-i', hebrew_audio_path,
+def _audio_sample_rate(audio_path):
+    info = probe_media(audio_path)
+    return info["audio"]["sample_rate"] if info and info["audio"] else None
+
+def _prepared_audio_label(input_label, audio_path, audio_offset, target_rate, filter_complex_parts, output_label):
+    """
+    Label of input_label ready for mixing: resampled to target_rate (only if its probed rate
+    differs) and shifted onto the video timeline. Adds the needed chain to filter_complex_parts.
+    """
+    chain = []
+    sample_rate = _audio_sample_rate(audio_path)
+    if target_rate and sample_rate and sample_rate != target_rate:
+        chain.append(f"aresample={target_rate}")
+    delay_filter = _delay_filter(audio_offset)
+    if delay_filter:
+        chain.append(delay_filter)
+    if not chain:
+        return input_label
+    filter_complex_parts.append(f"[{input_label}]{','.join(chain)}[{output_label}]")
+    return output_label
+
+def process_video_hebrew_only(video_path, hebrew_audio_path, output_path, progress_callback=None, cancel_event=None,
+                              audio_offset=0.0, copy_audio=True, encoder_profile=None):
+    """
+    Creates a video with only the Hebrew audio track.
+    audio_offset: seconds the audio recording is shifted against the video (see audio_analysis.detect_audio_offset)
+    copy_audio: stream-copy the Hebrew audio when can_copy_audio allows it, making this a plain remux
+    encoder_profile: name of an ENCODER_PROFILES entry (default DEFAULT_ENCODER_PROFILE)
+    """
+    profile = get_encoder_profile(encoder_profile)
+    copy = copy_audio and can_copy_audio(hebrew_audio_path, profile)
+    command = ['-y', '-i', video_path]
+    if copy and audio_offset and audio_offset > 0:
+        command += ['-itsoffset', f"{audio_offset:.3f}"] # Copied audio can't go through adelay; shift its timestamps
+    command += [
+        *_audio_input_args(hebrew_audio_path, audio_offset),
         '-c:v', 'copy',
         '-map', '0:v:0',
         '-map', '1:a:0',
-        '-c:a', 'aac',
-        '-b:a', '192k',
-        output_path
     ]
-    return _run_ffmpeg_command(command, output_path)
+    if copy:
+        print(f"Hebrew audio is already suitable AAC, copying it without re-encoding: {hebrew_audio_path}")
+        command += ['-c:a', 'copy']
+    else:
+        delay_filter = _delay_filter(audio_offset)
+        if delay_filter:
+            command += ['-af', delay_filter]
+        command += audio_encode_args(profile)
+    command.append(output_path)
+    return _run_ffmpeg_command(command, output_path, progress_callback, media_duration(video_path), cancel_event)
 
-def process_video_with_translation(video_path, hebrew_audio_path, translation_audio_path,
-                                   output_path, translation_only_segments):
+def _ramp_commands(target, start_time, duration, from_vol, to_vol):
+    """Volume commands stepping linearly from from_vol to to_vol over duration seconds."""
+    if duration <= 0:
+        return [f"{start_time:.3f} {target} volume {to_vol:.4f}"]
+    commands = []
+    for step in range(1, FADE_STEPS + 1):
+        fraction = step / FADE_STEPS
+        at = start_time + duration * (fraction - 1.0 / FADE_STEPS) # First step right at start_time
+        commands.append(f"{at:.3f} {target} volume {from_vol + (to_vol - from_vol) * fraction:.4f}")
+    return commands
+
+def _write_ducking_script(target, translation_only_segments, inside_vol, outside_vol, fade_duration):
     """
-    Processes video with mixed Hebrew and translation audio.
-    translation_only_segments: list of tuples [(start_sec, end_sec), ...]
+    Compiles the segments (merged and sorted by SegmentSet) into an asendcmd script that switches the
+    volume of filter `target` at each segment boundary, with a short linear fade.
+    Returns the script path, or None when there is nothing to switch.
     """
-    filter_complex_parts = []
+    commands = []
+    for start, end in SegmentSet(translation_only_segments):
+        fade = min(fade_duration, (end - start) / 2) # Fades stay inside the segment
+        commands += _ramp_commands(target, start, fade, outside_vol, inside_vol)
+        commands += _ramp_commands(target, end - fade, fade, inside_vol, outside_vol)
+    if not commands:
+        return None
+    with tempfile.NamedTemporaryFile('w', suffix='.cmd', prefix='ducking-', delete=False) as script:
+        script.write(";\n".join(commands) + ";\n")
+    return script.name
 
-    # Build the volume filter expressions based on segments
-    # Hebrew volume: ducked during translation_only_segments, primary otherwise
-    hebrew_vol_expr_conditions = "if("
-    conditions_heb = []
-    for start, end in translation_only_segments:
-        conditions_heb.append(f"between(t,{start},{end})")
-    if conditions_heb:
-        hebrew_vol_expr_conditions += "+".join(conditions_heb) # any 'between' is true -> sum > 0
-        hebrew_vol_expr_conditions += f",{HEBREW_DUCKED_VOL},{HEBREW_PRIMARY_VOL})"
-    else: # No translation_only_segments, Hebrew is always primary
-        # Condition '0' is false, so it will take the 'else' value (HEBREW_PRIMARY_VOL)
-        hebrew_vol_expr_conditions += f"0,{HEBREW_DUCKED_VOL},{HEBREW_PRIMARY_VOL})"
-    
-    # Corrected FFmpeg volume filter syntax: volume='EXPRESSION':eval=frame
-    hebrew_volume_filter = f"volume='{hebrew_vol_expr_conditions}':eval=frame"
-    filter_complex_parts.append(f"[1:a]{hebrew_volume_filter}[a_heb_vol]")
+def _escape_filter_path(path):
+    """Quotes a file path for use as a filter option inside -filter_complex (handles C:\\ and ')."""
+    path = path.replace('\\', '/').replace(':', '\\:')
+    return "'" + path.replace("'", "'\\''") + "'"
+
+def _envelope_volume_filter(name, translation_only_segments, inside_vol, outside_vol, fade_duration, script_files):
+    """
+    A volume filter that sits at outside_vol and is switched to inside_vol during the
+    segments by precomputed asendcmd commands, so ffmpeg does no per-frame expression work.
+    Script files created here are appended to script_files for the caller to delete.
+    """
+    target = f"volume@{name}"
+    script_path = _write_ducking_script(target, translation_only_segments, inside_vol, outside_vol, fade_duration)
+    if not script_path:
+        return f"volume={outside_vol}"
+    script_files.append(script_path)
+    return f"asendcmd=f={_escape_filter_path(script_path)},{target}={outside_vol}"
 
+def _remove_script_files(script_files):
+    for path in script_files:
+        try: os.remove(path)
+        except OSError: pass
 
+def _mix_filter_parts(hebrew_label, translation_label, output_label, translation_only_segments, script_files,
+                      suffix="", fade_duration=None):
+    """Filter chains that duck/boost one Hebrew + translation pair and mix them into output_label."""
+    if fade_duration is None:
+        fade_duration = DUCKING_FADE_SECONDS
+    # Hebrew volume: ducked during translation_only_segments, primary otherwise
+    hebrew_volume_filter = _envelope_volume_filter(f"heb{suffix}", translation_only_segments, HEBREW_DUCKED_VOL,
+                                                   HEBREW_PRIMARY_VOL, fade_duration, script_files)
     # Translation volume: primary during translation_only_segments, shouts volume otherwise
-    translation_vol_expr_conditions = "if("
-    conditions_trans = []
-    for start, end in translation_only_segments:
-        conditions_trans.append(f"between(t,{start},{end})")
-    if conditions_trans:
-        translation_vol_expr_conditions += "+".join(conditions_trans)
-        translation_vol_expr_conditions += f",{TRANSLATION_PRIMARY_VOL},{TRANSLATION_SHOUTS_VOL})"
-    else: # No translation_only_segments, translation is always at shouts volume
-        # Condition '0' is false, so it will take the 'else' value (TRANSLATION_SHOUTS_VOL)
-        translation_vol_expr_conditions += f"0,{TRANSLATION_PRIMARY_VOL},{TRANSLATION_SHOUTS_VOL})"
-
-    # Corrected FFmpeg volume filter syntax: volume='EXPRESSION':eval=frame
-    translation_volume_filter = f"volume='{translation_vol_expr_conditions}':eval=frame"
-    filter_complex_parts.append(f"[2:a]{translation_volume_filter}[a_trans_vol]")
-
-    # Mix the two adjusted audio streams
-    # dropout_transition: helps avoid clicks when one stream volume goes to 0
-    filter_complex_parts.append(f"[a_heb_vol][a_trans_vol]amix=inputs=2:duration=longest:dropout_transition=0.5[a_mixed]")
+    translation_volume_filter = _envelope_volume_filter(f"trans{suffix}", translation_only_segments, TRANSLATION_PRIMARY_VOL,
+                                                        TRANSLATION_SHOUTS_VOL, fade_duration, script_files)
+    return [
+        f"[{hebrew_label}]{hebrew_volume_filter}[a_heb_vol{suffix}]",
+        f"[{translation_label}]{translation_volume_filter}[a_trans_vol{suffix}]",
+        # Mix the two adjusted audio streams
+        # dropout_transition: helps avoid clicks when one stream volume goes to 0
+        f"[a_heb_vol{suffix}][a_trans_vol{suffix}]amix=inputs=2:duration=longest:dropout_transition=0.5[{output_label}]",
+    ]
 
+def process_video_with_translation(video_path, hebrew_audio_path, translation_audio_path,
+                                   output_path, translation_only_segments, progress_callback=None, cancel_event=None,
+                                   fade_duration=None, audio_offset=0.0, encoder_profile=None):
+    """
+    Processes video with mixed Hebrew and translation audio.
+    translation_only_segments: list of tuples [(start_sec, end_sec), ...] on the video's timeline
+    fade_duration: seconds of fade at every ducking transition (default DUCKING_FADE_SECONDS)
+    audio_offset: seconds the audio recordings are shifted against the video; Hebrew and
+                  translation come from the same sound desk, so both are shifted together
+    encoder_profile: name of an ENCODER_PROFILES entry (default DEFAULT_ENCODER_PROFILE)
+    """
+    script_files = []
+    filter_complex_parts = []
+    # The mix runs at the Hebrew sample rate; the translation is resampled only if it differs
+    hebrew_rate = _audio_sample_rate(hebrew_audio_path)
+    hebrew_label = _prepared_audio_label("1:a", hebrew_audio_path, audio_offset, None, filter_complex_parts, "heb_aligned")
+    translation_label = _prepared_audio_label("2:a", translation_audio_path, audio_offset, hebrew_rate,
+                                              filter_complex_parts, "trans_aligned")
+    filter_complex_parts += _mix_filter_parts(hebrew_label, translation_label, "a_mixed", translation_only_segments,
+                                              script_files, fade_duration=fade_duration)
     filter_complex_str = ";".join(filter_complex_parts)
 
     command = [
         '-y',
         '-i', video_path,
-        '-i', hebrew_audio_path,
-        '-i', translation_audio_path,
+        *_audio_input_args(hebrew_audio_path, audio_offset),
+        *_audio_input_args(translation_audio_path, audio_offset),
         '-filter_complex', filter_complex_str,
         '-map', '0:v:0',
         '-map', '[a_mixed]',
         '-c:v', 'copy',
-        '-c:a', 'aac',
-        '-b:a', '192k',
+        *audio_encode_args(get_encoder_profile(encoder_profile)),
         output_path
     ]
 
     print(f"Running FFmpeg for mixed audio: {' '.join(command)}")
-    return _run_ffmpeg_command(command, output_path)
+    try:
+        return _run_ffmpeg_command(command, output_path, progress_callback, media_duration(video_path), cancel_event)
+    finally:
+        _remove_script_files(script_files)
+
+def _translation_mix_graph(hebrew_audio_path, translations, translation_keys, translation_only_segments,
+                           audio_offset, fade_duration, script_files):
+    """
+    Audio inputs and filter graph shared by the multi-output renders. The video is input 0
+    (added by the caller), Hebrew is input 1 and the translations follow in translation_keys
+    order. Hebrew is decoded once and split into one mix per translation; each mix is
+    available as the [a_mixed_<key>] label.
+    """
+    missing = [key for key in translation_keys if not translations.get(key)]
+    if missing:
+        raise ValueError(f"No translation audio given for output(s): {', '.join(missing)}")
+    args = _audio_input_args(hebrew_audio_path, audio_offset)
+    for key in translation_keys:
+        args += _audio_input_args(translations[key], audio_offset)
+    if not translation_keys:
+        return args
+
+    filter_complex_parts = []
+    # Decode Hebrew once and hand a copy to every translation branch
+    hebrew_rate = _audio_sample_rate(hebrew_audio_path) # Mixes run at the Hebrew rate
+    hebrew_label = _prepared_audio_label("1:a", hebrew_audio_path, audio_offset, None, filter_complex_parts, "heb_aligned")
+    split_labels = "".join(f"[heb_{key}]" for key in translation_keys)
+    filter_complex_parts.append(f"[{hebrew_label}]asplit={len(translation_keys)}{split_labels}")
+    for input_index, key in enumerate(translation_keys, start=2):
+        translation_label = _prepared_audio_label(f"{input_index}:a", translations[key], audio_offset, hebrew_rate,
+                                                  filter_complex_parts, f"trans_aligned_{key}")
+        filter_complex_parts += _mix_filter_parts(f"heb_{key}", translation_label, f"a_mixed_{key}",
+                                                  translation_only_segments, script_files, suffix=f"_{key}",
+                                                  fade_duration=fade_duration)
+    return args + ['-filter_complex', ";".join(filter_complex_parts)]
+
+def process_all_languages(video_path, hebrew_audio_path, translations, translation_only_segments, outputs,
+                          progress_callback=None, cancel_event=None, fade_duration=None, audio_offset=0.0,
+                          copy_audio=True, encoder_profile=None):
+    """
+    Renders every language from a single ffmpeg invocation, so the source video is read
+    and demuxed once and the Hebrew audio is decoded once for all mixed outputs.
+    translations: dict {lang_key: translation_audio_path}, e.g. {"RU": ..., "EN": ...}
+    outputs: dict {lang_key: output_path}. "HE" (optional) gets the plain Hebrew track,
+             every other key must have a matching entry in translations.
+    translation_only_segments: list of tuples [(start_sec, end_sec), ...]
+    fade_duration: seconds of fade at every ducking transition (default DUCKING_FADE_SECONDS)
+    audio_offset: seconds all audio recordings are shifted against the video
+    copy_audio: stream-copy the plain Hebrew track when can_copy_audio allows it (and no delay is needed)
+    encoder_profile: name of an ENCODER_PROFILES entry (default DEFAULT_ENCODER_PROFILE)
+    """
+    translation_keys = [key for key in outputs if key != "HE"]
+    script_files = []
+    command = ['-y', '-i', video_path, *_translation_mix_graph(hebrew_audio_path, translations, translation_keys,
+                                                                translation_only_segments, audio_offset, fade_duration,
+                                                                script_files)]
+
+    # The Hebrew input also feeds the mixes, so it can't be shifted with -itsoffset: copy only without a delay
+    profile = get_encoder_profile(encoder_profile)
+    copy_hebrew = ("HE" in outputs and copy_audio and not _delay_filter(audio_offset)
+                   and can_copy_audio(hebrew_audio_path, profile))
+    for key, output_path in outputs.items():
+        audio_map = '1:a:0' if key == "HE" else f"[a_mixed_{key}]"
+        command += [
+            '-map', '0:v:0',
+            '-map', audio_map,
+            '-c:v', 'copy',
+        ]
+        if key == "HE" and copy_hebrew:
+            command += ['-c:a', 'copy', output_path]
+            continue
+        if key == "HE" and _delay_filter(audio_offset):
+            command += ['-af', _delay_filter(audio_offset)] # Plain Hebrew bypasses filter_complex
+        command += [*audio_encode_args(profile), output_path]
+
+    print(f"Running FFmpeg for all languages: {' '.join(command)}")
+    try:
+        return _run_ffmpeg_command(command, list(outputs.values()), progress_callback, media_duration(video_path),
+                                   cancel_event)
+    finally:
+        _remove_script_files(script_files)
+
+def process_video_multitrack(video_path, hebrew_audio_path, translations, translation_only_segments, output_path,
+                             progress_callback=None, cancel_event=None, fade_duration=None, audio_offset=0.0,
+                             copy_audio=True, encoder_profile=None):
+    """
+    Writes one MP4 holding the copied video once, the Hebrew track, and one mixed track per
+    translation, each tagged with its language (AUDIO_TRACK_LANGUAGES). Hebrew is the default
+    track. About a third of the bytes of separate per-language files, e.g. for archive copies.
+    translations: dict {lang_key: translation_audio_path}, e.g. {"RU": ..., "EN": ...}
+    Other arguments as for process_all_languages.
+    """
+    translation_keys = list(translations)
+    script_files = []
+    command = ['-y', '-i', video_path, *_translation_mix_graph(hebrew_audio_path, translations, translation_keys,
+                                                                translation_only_segments, audio_offset, fade_duration,
+                                                                script_files)]
+    command += ['-map', '0:v:0', '-map', '1:a:0']
+    for key in translation_keys:
+        command += ['-map', f"[a_mixed_{key}]"]
+    command += ['-c:v', 'copy']
+
+    profile = get_encoder_profile(encoder_profile)
+    if copy_audio and not _delay_filter(audio_offset) and can_copy_audio(hebrew_audio_path, profile):
+        command += ['-c:a:0', 'copy']
+    else:
+        if _delay_filter(audio_offset):
+            command += ['-filter:a:0', _delay_filter(audio_offset)] # Plain Hebrew bypasses filter_complex
+        command += audio_encode_args(profile, stream=0)
+    for stream, key in enumerate(["HE", *translation_keys]):
+        if stream > 0:
+            command += audio_encode_args(profile, stream=stream)
+        command += [f'-metadata:s:a:{stream}', f"language={AUDIO_TRACK_LANGUAGES.get(key, 'und')}",
+                    f'-metadata:s:a:{stream}', f"title={AUDIO_TRACK_TITLES.get(key, key)}",
+                    f'-disposition:a:{stream}', 'default' if stream == 0 else '0']
+    command.append(output_path)
+
+    print(f"Running FFmpeg for multi-track output: {' '.join(command)}")
+    try:
+        return _run_ffmpeg_command(command, output_path, progress_callback, media_duration(video_path), cancel_event)
+    finally:
+        _remove_script_files(script_files)
 
 def parse_segments_string(segments_str):
-    """Parses a string like "60-300, 450-600" into [(60,300), (450,600)]"""
-    segments = []
-    if not segments_str.strip():
-        return segments
-    parts = segments_str.split(',')
-    for part in parts:
-        try:
-            start, end = map(float, part.strip().split('-'))
-            if start < 0 or end < 0 or start >= end:
-                raise ValueError("Invalid segment format or order.")
-            segments.append((start, end))
-        except ValueError as e:
-            print(f"Warning: Could not parse segment '{part}'. Skipping. Error: {e}")
-            # Optionally, raise an error or show in UI
-    return segments
\ No newline at end of file
+    """Parses a string like "60-300, 450-600" (or "1:00-5:00") into [(60,300), (450,600)], merged and sorted"""
+    return SegmentSet.parse(segments_str).as_list()
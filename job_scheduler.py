@@ -0,0 +1,84 @@
+# job_scheduler.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Every output copies the video stream (-c:v copy) and only re-encodes the audio,
+# so each ffmpeg job is mostly bound by disk reads, not CPU. Running more jobs than
+# the disk can feed just makes them fight over the same source file.
+MAX_DISK_BOUND_WORKERS = 3
+
+# Job states, reported through the status callback
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+DONE = "DONE"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+
+def default_worker_count():
+    """One worker per core, capped by MAX_DISK_BOUND_WORKERS."""
+    return max(1, min(os.cpu_count() or 1, MAX_DISK_BOUND_WORKERS))
+
+class Job:
+    """A single unit of work (e.g. one language render) run by run_jobs."""
+    def __init__(self, name, func, *args, **kwargs):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = PENDING
+        self.result = None
+        self.error = None
+
+    def __repr__(self):
+        return f"Job({self.name!r}, status={self.status})"
+
+def _run_single_job(job, cancel_event, status_callback, status_lock):
+    def set_status(status):
+        with status_lock:
+            job.status = status
+        if status_callback:
+            status_callback(job)
+
+    if cancel_event and cancel_event.is_set():
+        set_status(CANCELLED)
+        return job
+
+    set_status(RUNNING)
+    try:
+        job.result = job.func(*job.args, **job.kwargs)
+    except Exception as e:
+        job.error = e
+        set_status(FAILED)
+        return job
+
+    if cancel_event and cancel_event.is_set() and not job.result:
+        set_status(CANCELLED)
+    elif job.result:
+        set_status(DONE)
+    else: # Processing functions return False on failure
+        set_status(FAILED)
+    return job
+
+def run_jobs(jobs, max_workers=None, cancel_event: threading.Event = None, status_callback=None):
+    """
+    Runs jobs side by side on a pool of worker threads and waits for all of them.
+    status_callback(job) is called from the worker threads on every status change.
+    Jobs not yet started when cancel_event is set are marked CANCELLED.
+    Returns the jobs in the order they were given.
+    """
+    if not jobs:
+        return []
+    if not max_workers or max_workers < 1:
+        max_workers = default_worker_count()
+    max_workers = min(max_workers, len(jobs))
+
+    status_lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job") as executor:
+        futures = [
+            executor.submit(_run_single_job, job, cancel_event, status_callback, status_lock)
+            for job in jobs
+        ]
+        for future in futures:
+            future.result()
+    return jobs
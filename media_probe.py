@@ -0,0 +1,193 @@
+# media_probe.py
+# What is inside a media file (duration, codecs, sample rate, channels, bitrate), from
+# ffprobe's JSON output. Results are cached on disk by path + size + mtime, so probing
+# a file again (e.g. when it is re-selected in the GUI) is instant.
+import os
+import json
+import subprocess
+import threading
+from path_util import find_ffprobe, run_captured, data_path, load_json_file, save_json_file
+import metrics
+
+FFPROBE_PATH = find_ffprobe()
+PROBE_CACHE_FILE = data_path('probe_cache.json')
+MAX_CACHED_PROBES = 500 # Oldest entries are dropped beyond this
+PROBE_TIMEOUT_SECONDS = 30
+
+# Input validation
+AUDIO_SHORTER_TOLERANCE_SECONDS = 5.0 # Audio this much shorter than the video gets a warning
+ERROR = "ERROR"
+WARNING = "WARNING"
+
+_lock = threading.Lock()
+_memory_cache = {}
+
+def _cache_key(path):
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+def _number(value, cast=float):
+    try: return cast(value)
+    except (TypeError, ValueError): return None
+
+def _frame_rate(value):
+    """ffprobe reports frame rates as fractions, e.g. "30000/1001"."""
+    numerator, _, denominator = str(value or "").partition('/')
+    numerator, denominator = _number(numerator), _number(denominator or 1)
+    return round(numerator / denominator, 3) if numerator and denominator else None
+
+def _summarize(probe):
+    """Reduces ffprobe's JSON to the fields the app uses."""
+    streams = probe.get("streams", [])
+    # Cover art in audio files shows up as a one-frame "video" stream
+    video_streams = [s for s in streams if s.get("codec_type") == "video"
+                     and not s.get("disposition", {}).get("attached_pic")]
+    audio_streams = [s for s in streams if s.get("codec_type") == "audio"]
+    format_info = probe.get("format", {})
+    info = {
+        "duration": _number(format_info.get("duration")),
+        "format": format_info.get("format_name"),
+        "bit_rate": _number(format_info.get("bit_rate"), int),
+        "video_streams": len(video_streams),
+        "audio_streams": len(audio_streams),
+        "video": None,
+        "audio": None,
+    }
+    if video_streams:
+        stream = video_streams[0]
+        info["video"] = {
+            "codec": stream.get("codec_name"),
+            "width": stream.get("width"),
+            "height": stream.get("height"),
+            "frame_rate": _frame_rate(stream.get("avg_frame_rate") or stream.get("r_frame_rate")),
+            "bit_rate": _number(stream.get("bit_rate"), int),
+            "duration": _number(stream.get("duration")),
+        }
+    if audio_streams:
+        stream = audio_streams[0]
+        info["audio"] = {
+            "codec": stream.get("codec_name"),
+            "profile": stream.get("profile"),
+            "sample_rate": _number(stream.get("sample_rate"), int),
+            "channels": stream.get("channels"),
+            "channel_layout": stream.get("channel_layout"),
+            "bit_rate": _number(stream.get("bit_rate"), int),
+            "duration": _number(stream.get("duration")),
+        }
+    return info
+
+def _run_ffprobe(path):
+    command = [FFPROBE_PATH, '-v', 'error', '-show_format', '-show_streams', '-of', 'json', path]
+    with metrics.span("ffprobe", file=os.path.basename(path)) as measured:
+        try:
+            result = run_captured(command, timeout=PROBE_TIMEOUT_SECONDS)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            measured.set_status(metrics.ERROR)
+            print(f"Could not probe {path}: {e}")
+            return None
+        if result.returncode != 0:
+            measured.set_status(metrics.ERROR)
+    if result.returncode != 0:
+        print(f"Could not probe {path}: {result.stderr.strip()}")
+        return None
+    try:
+        return json.loads(result.stdout)
+    except ValueError as e:
+        print(f"Could not read ffprobe output for {path}: {e}")
+        return None
+
+def probe_media(path):
+    """
+    Returns a summary of path: duration (seconds), format, bit_rate, the number of video and
+    audio streams, and details of the first "video" (codec, width, height, frame_rate, ...) and
+    "audio" stream (codec, sample_rate, channels, bit_rate, ...), each None if absent.
+    Returns None if the file is missing, ffprobe is not available, or the file is not media.
+    """
+    if not path or not os.path.isfile(path) or not FFPROBE_PATH:
+        return None
+    key = _cache_key(path)
+    with _lock:
+        if key in _memory_cache:
+            return _memory_cache[key]
+        cached = load_json_file(PROBE_CACHE_FILE, default={}).get(key)
+    if cached is not None:
+        _memory_cache[key] = cached
+        return cached
+
+    probe = _run_ffprobe(path)
+    if probe is None:
+        return None # Not cached: the file may still be being written
+    info = _summarize(probe)
+    with _lock:
+        _memory_cache[key] = info
+        cache = load_json_file(PROBE_CACHE_FILE, default={})
+        # Forget older probes of the same path (the file changed since)
+        prefix = key.rsplit('|', 2)[0] + '|'
+        cache = {k: v for k, v in cache.items() if not k.startswith(prefix)}
+        cache[key] = info
+        while len(cache) > MAX_CACHED_PROBES:
+            del cache[next(iter(cache))] # Insertion order: oldest first
+        save_json_file(PROBE_CACHE_FILE, cache)
+    return info
+
+def media_duration(path):
+    """Duration in seconds from probe_media, or None."""
+    info = probe_media(path)
+    return info["duration"] if info else None
+
+def describe(info):
+    """One-line human summary of a probe_media result."""
+    if not info:
+        return "unknown format"
+    parts = []
+    if info["duration"]:
+        minutes, seconds = divmod(int(info["duration"]), 60)
+        parts.append(f"{minutes // 60}:{minutes % 60:02d}:{seconds:02d}")
+    if info["video"]:
+        video = info["video"]
+        parts.append(f"{video['codec']} {video['width']}x{video['height']}"
+                     + (f" @ {video['frame_rate']:g} fps" if video['frame_rate'] else ""))
+    if info["audio"]:
+        audio = info["audio"]
+        parts.append(f"{audio['codec']} {audio['sample_rate']} Hz {audio['channels']} ch"
+                     + (f" {audio['bit_rate'] // 1000} kb/s" if audio['bit_rate'] else ""))
+    return ", ".join(parts)
+
+def validate_inputs(video_path, audio_paths):
+    """
+    Checks the inputs of one render before ffmpeg runs.
+    audio_paths: {label: path}, e.g. {"HE": ..., "RU": ...}; empty paths are skipped.
+    Returns a list of (ERROR or WARNING, message). ERRORs would make the render fail.
+    Only missing files are reported when ffprobe is missing.
+    """
+    problems = []
+    if video_path and not os.path.isfile(video_path):
+        problems.append((ERROR, f"The video file does not exist: {video_path}"))
+    for label, audio_path in audio_paths.items():
+        if audio_path and not os.path.isfile(audio_path):
+            problems.append((ERROR, f"The {label} audio file does not exist: {audio_path}"))
+    if not FFPROBE_PATH:
+        return problems
+    video_info = probe_media(video_path)
+    if video_info is None:
+        if video_path and os.path.isfile(video_path):
+            problems.append((ERROR, f"The video file could not be read as media: {video_path}"))
+    elif not video_info["video"]:
+        problems.append((ERROR, f"The video file has no video stream: {video_path}"))
+    video_duration = video_info["duration"] if video_info else None
+    for label, audio_path in audio_paths.items():
+        if not audio_path:
+            continue
+        audio_info = probe_media(audio_path)
+        if audio_info is None:
+            if os.path.isfile(audio_path):
+                problems.append((ERROR, f"The {label} audio file could not be read as media: {audio_path}"))
+            continue
+        if not audio_info["audio"]:
+            problems.append((ERROR, f"The {label} audio file has no audio stream: {audio_path}"))
+            continue
+        audio_duration = audio_info["audio"]["duration"] or audio_info["duration"]
+        if video_duration and audio_duration and audio_duration < video_duration - AUDIO_SHORTER_TOLERANCE_SECONDS:
+            problems.append((WARNING, f"The {label} audio ({audio_duration:.0f}s) is shorter than the video "
+                                      f"({video_duration:.0f}s); the end of the video will be silent."))
+    return problems
@@ -0,0 +1,208 @@
+# metrics.py
+# Timing instrumentation: where the time of a service goes (probing, each language's render,
+# each upload, time spent queued). Work is wrapped in spans:
+#
+#     with metrics.span("render", lang="HE") as s:
+#         ...
+#         s.add(bytes_written=size)
+#
+# Every finished span is appended as one JSON line to METRICS_FILE, and, when a Prometheus
+# text file is configured, totals per span are rewritten there (e.g. for node_exporter's
+# textfile collector), so runs can be compared across machines and ffmpeg versions.
+import os
+import json
+import time
+import socket
+import datetime
+import threading
+from path_util import data_path
+
+METRICS_FILE = data_path(os.path.join('logs', 'metrics.jsonl'))
+METRICS_MAX_BYTES = 5 * 1024 * 1024 # Like app.log: older metrics move to metrics.jsonl.1 ... .N
+METRICS_BACKUP_COUNT = 3
+PROMETHEUS_PREFIX = "uploader"
+# Only these labels go to Prometheus (paths and titles would make a series per file)
+PROMETHEUS_LABELS = ("lang", "kind", "status")
+INHERITED_LABELS = ("lang", "kind") # Nested spans take these over from the enclosing span
+COUNTERS = ("bytes_read", "bytes_written", "bytes_uploaded")
+
+OK = "ok"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+_lock = threading.Lock()
+_thread_state = threading.local()
+_config = {"jsonl_path": METRICS_FILE, "prometheus_path": None, "enabled": True}
+_totals = {} # (span name, prometheus labels) -> aggregated values, for the Prometheus file
+_host = socket.gethostname()
+
+def configure(jsonl_path=None, prometheus_path=None, enabled=None):
+    """Changes where metrics go. jsonl_path=None keeps the current file; prometheus_path enables the text file."""
+    with _lock:
+        if jsonl_path is not None:
+            _config["jsonl_path"] = jsonl_path
+        if prometheus_path is not None:
+            _config["prometheus_path"] = prometheus_path
+        if enabled is not None:
+            _config["enabled"] = enabled
+
+class Span:
+    """
+    Measures one piece of work: wall time, CPU time of this thread (plus child CPU reported
+    with add(child_cpu_seconds=...)), byte counters and the resulting throughput.
+    The status is ERROR if the block raises; call set_status() for other outcomes.
+    """
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.status = OK
+        self.values = {counter: 0 for counter in COUNTERS}
+        self.values["child_cpu_seconds"] = 0.0
+        self.parent = None
+
+    def add(self, **amounts):
+        """Adds to counters, e.g. add(bytes_uploaded=chunk_size) or add(child_cpu_seconds=1.5)."""
+        for key, amount in amounts.items():
+            if amount:
+                self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, **values):
+        """Sets extra fields (e.g. peak memory) or labels recorded with the span."""
+        self.labels.update(values)
+
+    def set_status(self, status):
+        self.status = status
+
+    def __enter__(self):
+        stack = _thread_state.__dict__.setdefault("stack", [])
+        inherited = dict(getattr(_thread_state, "labels", {}))
+        if stack:
+            self.parent = stack[-1].name
+            inherited.update({key: value for key, value in stack[-1].labels.items() if key in INHERITED_LABELS})
+        self.labels = {**inherited, **self.labels}
+        stack.append(self)
+        self._started_at = time.time()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        _thread_state.stack.remove(self)
+        if exc_type is not None:
+            self.status = ERROR
+        _record(self, wall, cpu)
+        return False
+
+def span(name, **labels):
+    """Context manager measuring the enclosed work as a Span called name."""
+    return Span(name, **labels)
+
+class labels:
+    """Context manager adding labels to every span opened inside it on this thread, e.g. labels(lang="RU")."""
+    def __init__(self, **values):
+        self.values = values
+
+    def __enter__(self):
+        self._previous = getattr(_thread_state, "labels", {})
+        _thread_state.labels = {**self._previous, **self.values}
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _thread_state.labels = self._previous
+        return False
+
+def current_span():
+    """The innermost span open on this thread, or None."""
+    stack = getattr(_thread_state, "stack", None)
+    return stack[-1] if stack else None
+
+def record(name, seconds, status=OK, **labels):
+    """Records work that was measured elsewhere (e.g. time spent waiting in a queue) as a span."""
+    item = Span(name, **{**getattr(_thread_state, "labels", {}), **labels})
+    item.status = status
+    item._started_at = time.time() - seconds
+    _record(item, seconds, 0.0)
+
+def _record(item, wall, cpu):
+    if not _config["enabled"]:
+        return
+    moved = item.values["bytes_uploaded"] or item.values["bytes_written"] or item.values["bytes_read"]
+    entry = {
+        "time": datetime.datetime.fromtimestamp(item._started_at).isoformat(timespec="milliseconds"),
+        "span": item.name,
+        "parent": item.parent,
+        "status": item.status,
+        "host": _host,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        **{key: (round(value, 4) if isinstance(value, float) else value) for key, value in item.values.items()},
+        "throughput_bytes_per_second": round(moved / wall) if moved and wall > 0 else None,
+        **item.labels,
+    }
+    with _lock:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(_config["jsonl_path"])), exist_ok=True)
+            _rotate_if_full(_config["jsonl_path"])
+            with open(_config["jsonl_path"], "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Could not write metrics: {e}")
+        if _config["prometheus_path"]:
+            _add_to_totals(entry)
+            _write_prometheus(_config["prometheus_path"])
+
+def _rotate_if_full(path):
+    """Shifts path to path.1 (and path.1 to path.2, ...) once it reaches METRICS_MAX_BYTES."""
+    if not os.path.isfile(path) or os.path.getsize(path) < METRICS_MAX_BYTES:
+        return
+    for index in range(METRICS_BACKUP_COUNT - 1, 0, -1):
+        if os.path.exists(f"{path}.{index}"):
+            os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+    os.replace(path, f"{path}.1")
+
+def _add_to_totals(entry):
+    labels = tuple((label, str(entry[label])) for label in PROMETHEUS_LABELS if entry.get(label) is not None)
+    totals = _totals.setdefault((entry["span"], labels), {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                          "child_cpu_seconds": 0.0, **{c: 0 for c in COUNTERS}})
+    totals["count"] += 1
+    for key in ("wall_seconds", "cpu_seconds", "child_cpu_seconds", *COUNTERS):
+        totals[key] += entry.get(key) or 0
+    totals["last_throughput"] = entry["throughput_bytes_per_second"] or 0
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_value(value):
+    """Exact text for a sample: integers as written, floats at full precision (no %g rounding)."""
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _write_prometheus(path):
+    """Rewrites the Prometheus text-format file with the totals so far (atomically)."""
+    metrics = [
+        ("span_count_total", "counter", "Finished spans", "count"),
+        ("span_wall_seconds_total", "counter", "Wall-clock time spent in spans", "wall_seconds"),
+        ("span_cpu_seconds_total", "counter", "CPU time of the app's own threads in spans", "cpu_seconds"),
+        ("span_child_cpu_seconds_total", "counter", "CPU time of child processes (ffmpeg) in spans", "child_cpu_seconds"),
+        ("span_bytes_read_total", "counter", "Bytes read in spans", "bytes_read"),
+        ("span_bytes_written_total", "counter", "Bytes written in spans", "bytes_written"),
+        ("span_bytes_uploaded_total", "counter", "Bytes uploaded in spans", "bytes_uploaded"),
+        ("span_last_throughput_bytes_per_second", "gauge", "Throughput of the most recent span", "last_throughput"),
+    ]
+    lines = []
+    for metric, kind, help_text, key in metrics:
+        name = f"{PROMETHEUS_PREFIX}_{metric}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (span_name, labels), totals in sorted(_totals.items()):
+            label_text = ",".join(f'{label}="{_escape_label(value)}"' for label, value in (("span", span_name), *labels))
+            lines.append(f"{name}{{{label_text}}} {_format_value(totals.get(key, 0))}")
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write Prometheus metrics to {path}: {e}")
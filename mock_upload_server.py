@@ -0,0 +1,169 @@
+# mock_upload_server.py
+"""
+A local stand-in for the YouTube resumable upload endpoint, for exercising
+upload_video without touching a real channel.
+
+    python mock_upload_server.py --port 8089 --fail-every 3
+
+build_mock_service() returns a service object whose videos().insert() talks to
+the mock server, so it can be passed to upload_video like the real one.
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Just enough of the YouTube discovery document for videos().insert() with media upload
+MOCK_DISCOVERY_DOC = {
+    "kind": "discovery#restDescription",
+    "discoveryVersion": "v1",
+    "id": "youtube:v3",
+    "name": "youtube",
+    "version": "v3",
+    "rootUrl": "",  # Filled in by build_mock_service
+    "servicePath": "youtube/v3/",
+    "batchPath": "batch/youtube/v3",
+    "protocol": "rest",
+    "parameters": {},
+    "schemas": {"Video": {"id": "Video", "type": "object", "properties": {"id": {"type": "string"}}}},
+    "resources": {
+        "videos": {
+            "methods": {
+                "insert": {
+                    "id": "youtube.videos.insert",
+                    "path": "videos",
+                    "httpMethod": "POST",
+                    "parameters": {"part": {"type": "string", "location": "query", "repeated": True, "required": True}},
+                    "parameterOrder": ["part"],
+                    "request": {"$ref": "Video"},
+                    "response": {"$ref": "Video"},
+                    "supportsMediaUpload": True,
+                    "mediaUpload": {
+                        "accept": ["video/*", "application/octet-stream"],
+                        "protocols": {
+                            "simple": {"multipart": True, "path": "/upload/youtube/v3/videos"},
+                            "resumable": {"multipart": True, "path": "/resumable/upload/youtube/v3/videos"},
+                        },
+                    },
+                }
+            }
+        }
+    },
+}
+
+CONTENT_RANGE_RE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+class MockUploadServer(ThreadingHTTPServer):
+    """Keeps the state of every resumable session in memory (bytes received only, not the data)."""
+    daemon_threads = True
+
+    def __init__(self, address, fail_every=0):
+        super().__init__(address, _MockUploadHandler)
+        self.fail_every = fail_every # Answer every Nth chunk with a 503 (0 = never)
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self._session_ids = itertools.count(1)
+        self._chunk_counter = itertools.count(1)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+class _MockUploadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass # Keep the console quiet; uploads log their own progress
+
+    def _reply(self, code, headers=None, body=b""):
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_POST(self):
+        # Session start: POST /upload/youtube/v3/videos?uploadType=resumable
+        self._read_body() # Metadata, not needed
+        server = self.server
+        with server.lock:
+            session_id = str(next(server._session_ids))
+            server.sessions[session_id] = {
+                "received": 0,
+                "total": int(self.headers.get("X-Upload-Content-Length") or 0) or None,
+                "done": False,
+            }
+        self._reply(200, {"Location": f"{server.base_url}/upload/session/{session_id}"})
+
+    def do_PUT(self):
+        server = self.server
+        session_id = self.path.rsplit("/", 1)[-1]
+        data = self._read_body()
+        with server.lock:
+            session = server.sessions.get(session_id)
+        if session is None:
+            self._reply(404)
+            return
+
+        match = CONTENT_RANGE_RE.match(self.headers.get("Content-Range", ""))
+        if not match:
+            self._reply(400)
+            return
+        start, end, total = match.groups()
+        if total != "*":
+            session["total"] = int(total)
+
+        if start is not None: # A chunk, not a status query
+            if server.fail_every and next(server._chunk_counter) % server.fail_every == 0:
+                self._reply(503)
+                return
+            start, end = int(start), int(end)
+            if start > session["received"] or end - start + 1 != len(data):
+                self._reply(400)
+                return
+            session["received"] = max(session["received"], end + 1)
+
+        if session["total"] is not None and session["received"] >= session["total"]:
+            session["done"] = True
+            body = json.dumps({"kind": "youtube#video", "id": f"mock-{session_id}"}).encode()
+            self._reply(200, {"Content-Type": "application/json"}, body)
+        elif session["received"]:
+            self._reply(308, {"Range": f"bytes=0-{session['received'] - 1}"})
+        else:
+            self._reply(308)
+
+def start_mock_server(host="127.0.0.1", port=0, fail_every=0):
+    """Starts a MockUploadServer on a background thread. port=0 picks a free port."""
+    server = MockUploadServer((host, port), fail_every=fail_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def build_mock_service(base_url):
+    """Returns a YouTube-like service object whose uploads go to the mock server at base_url."""
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.http import build_http # Treats 308 as "resume incomplete", not a redirect
+
+    doc = dict(MOCK_DISCOVERY_DOC, rootUrl=base_url.rstrip("/") + "/")
+    return build_from_document(doc, http=build_http())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the YouTube resumable upload endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth chunk with HTTP 503")
+    args = parser.parse_args()
+
+    mock = MockUploadServer((args.host, args.port), fail_every=args.fail_every)
+    print(f"Mock upload server listening on {mock.base_url}")
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,62 @@
+# output_manifest.py
+# Persistent index of rendered outputs, keyed by source video + meeting type + language.
+# "Upload Existing Videos" uses it to find the files of an earlier render directly,
+# instead of guessing timestamped file names, and it survives app restarts.
+import os
+import json
+import time
+import hashlib
+import threading
+from path_util import data_path, load_json_file, save_json_file, file_fingerprint
+
+MANIFEST_FILE = data_path('output_manifest.json')
+
+_lock = threading.Lock()
+_source_id_cache = {} # (path, size, mtime) -> source id, to avoid re-reading the video
+
+def source_id(video_path):
+    """Stable identity of a source video (content based, so renaming or moving it is fine)."""
+    stat = os.stat(video_path)
+    cache_key = (os.path.abspath(video_path), stat.st_size, int(stat.st_mtime))
+    if cache_key not in _source_id_cache:
+        fingerprint = file_fingerprint(video_path)
+        fingerprint.pop("mtime") # Copies of the same recording keep their identity
+        encoded = json.dumps(fingerprint, sort_keys=True).encode('utf-8')
+        _source_id_cache[cache_key] = hashlib.sha1(encoded).hexdigest()
+    return _source_id_cache[cache_key]
+
+def output_key(video_path, meeting_type, lang_key):
+    """Identifies one output of a service: the source video (by content), meeting type and language."""
+    return f"{source_id(video_path)}|{meeting_type}|{lang_key}"
+
+def record_output(video_path, meeting_type, lang_key, output_path, render_key=None, duration=None):
+    """Records a finished render of video_path for the given meeting type and language."""
+    output_path = os.path.abspath(output_path)
+    entry = {
+        "path": output_path,
+        "source_video": os.path.abspath(video_path),
+        "size": os.path.getsize(output_path),
+        "duration": duration,
+        "checksum": file_fingerprint(output_path)["partial_hash"],
+        "render_key": render_key,
+        "created": time.time(),
+    }
+    key = output_key(video_path, meeting_type, lang_key)
+    with _lock:
+        manifest = load_json_file(MANIFEST_FILE, default={})
+        manifest[key] = entry
+        save_json_file(MANIFEST_FILE, manifest)
+
+def find_output(video_path, meeting_type, lang_key):
+    """
+    Returns the manifest entry for the rendered output, or None if there is none or
+    the file was deleted/replaced since it was recorded.
+    """
+    if not video_path or not os.path.isfile(video_path):
+        return None
+    key = output_key(video_path, meeting_type, lang_key)
+    with _lock:
+        entry = load_json_file(MANIFEST_FILE, default={}).get(key)
+    if not entry or not os.path.isfile(entry["path"]) or os.path.getsize(entry["path"]) != entry["size"]:
+        return None
+    return entry
@@ -1,6 +1,10 @@
 import sys
 import os
+import json
 import shutil
+import hashlib
+import platform
+import subprocess
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -8,28 +12,94 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
-def find_ffmpeg():
+def data_path(relative_path):
+    """
+    Get absolute path for files the app writes and must keep between runs (journals, caches).
+    Unlike resource_path, this never points into PyInstaller's temporary _MEIPASS folder:
+    a frozen app keeps its data next to the executable.
+    """
+    if getattr(sys, 'frozen', False):
+        return os.path.join(os.path.dirname(sys.executable), relative_path)
+    return os.path.join(os.path.abspath("."), relative_path)
+
+def load_json_file(path, default=None):
+    """Reads a JSON file, returning default if it is missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_json_file(path, data):
+    """Writes JSON atomically (temp file + rename), so a crash never leaves a half-written file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def file_fingerprint(path, sample_size=1024 * 1024):
+    """
+    Cheap identity for large media files: size + mtime + a hash of the first and last
+    sample_size bytes. Reading two small samples is enough to notice a replaced file
+    without hashing gigabytes.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if stat.st_size > sample_size:
+            f.seek(max(sample_size, stat.st_size - sample_size))
+            digest.update(f.read(sample_size))
+    return {
+        "size": stat.st_size,
+        "mtime": int(stat.st_mtime),
+        "partial_hash": digest.hexdigest(),
+    }
+
+def _find_executable(name):
     """
-    Finds the ffmpeg executable.
-    
+    Finds a bundled tool such as ffmpeg.
+
     Priority Order:
-    1. Check for a bundled ffmpeg (in the same directory as the executable).
+    1. Check for a bundled copy (in the same directory as the executable).
     2. Check the system's PATH environment variable.
-    
-    Returns the full path to ffmpeg if found, otherwise None.
+
+    Returns the full path if found, otherwise None.
     """
     # Determine the executable name based on the OS
-    ffmpeg_filename = "ffmpeg.exe" if sys.platform == "win32" else "ffmpeg"
-    
+    filename = f"{name}.exe" if sys.platform == "win32" else name
+
     # 1. Check for a bundled version first
-    bundled_path = resource_path(ffmpeg_filename)
+    bundled_path = resource_path(filename)
     if os.path.exists(bundled_path):
         return bundled_path
-        
+
     # 2. If not bundled, check the system PATH
-    system_path = shutil.which(ffmpeg_filename)
+    system_path = shutil.which(filename)
     if system_path:
         return system_path
-        
+
     # 3. If not found anywhere, return None
-    return None
\ No newline at end of file
+    return None
+
+def find_ffmpeg():
+    """Finds the ffmpeg executable (bundled first, then PATH). Returns its full path, or None."""
+    return _find_executable("ffmpeg")
+
+def find_ffprobe():
+    """Finds the ffprobe executable that ships with ffmpeg (bundled first, then PATH). Returns its full path, or None."""
+    return _find_executable("ffprobe")
+
+def subprocess_kwargs(**kwargs):
+    """kwargs for subprocess.run/Popen, plus the flag that keeps a console window from popping up on Windows."""
+    if platform.system() == "Windows":
+        kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+    return kwargs
+
+def run_captured(command, **kwargs):
+    """Runs command without a console window and returns the CompletedProcess with its output as text."""
+    return subprocess.run(command, **subprocess_kwargs(capture_output=True, text=True, errors='replace', **kwargs))
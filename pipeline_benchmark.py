@@ -0,0 +1,280 @@
+# pipeline_benchmark.py
+"""
+Times the processing pipeline on synthesized media, so speed-up work can be measured and
+compared between commits:
+
+    python pipeline_benchmark.py --duration 600 --output before.json
+    python pipeline_benchmark.py --duration 600 --output after.json --compare before.json
+
+The inputs (a testsrc2 video with camera audio, and Hebrew and translation recordings of
+tones over pink noise) are generated with ffmpeg's lavfi sources, so no real recordings are
+needed and every run sees the same media. The cases are process_video_hebrew_only,
+process_video_with_translation with 0, 10 and 100 translation-only segments, and
+upload_video against the local mock endpoint (mock_upload_server.py).
+
+Each case reports the median wall time over --repeat runs, speed (x realtime), ffmpeg's CPU
+time and peak RSS (from its -benchmark report), and the bytes read, written or uploaded.
+Pass --media-dir to keep the synthesized media and reuse it in later runs.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import metrics
+from ffmpeg_processor import (
+    FFMPEG_PATH,
+    get_ffmpeg_version,
+    process_video_hebrew_only,
+    process_video_with_translation,
+)
+from encoder_benchmark import make_reference_clip
+from media_probe import media_duration
+from path_util import run_captured
+from mock_upload_server import start_mock_server, build_mock_service
+from youtube_uploader import upload_video, DEFAULT_CHUNK_SIZE
+
+try:
+    import resource # Unix only
+except ImportError:
+    resource = None
+
+DEFAULT_DURATION = 300
+DEFAULT_SEGMENT_COUNTS = (0, 10, 100)
+VIDEO_SIZE = "1280x720"
+VIDEO_RATE = 30
+UPLOAD_CASE = "upload"
+
+def make_test_video(path, duration):
+    """Writes a testsrc2 video with a sine tone as camera audio. Returns True on success."""
+    sources = ['-f', 'lavfi', '-i', f"testsrc2=size={VIDEO_SIZE}:rate={VIDEO_RATE}:duration={duration}",
+               '-f', 'lavfi', '-i', f"sine=frequency=440:duration={duration}:sample_rate=48000"]
+    audio = ['-c:a', 'aac', '-b:a', '128k', '-shortest']
+    for video_codec in (['-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '28', '-g', str(VIDEO_RATE * 2),
+                         '-pix_fmt', 'yuv420p'],
+                        ['-c:v', 'mpeg4', '-q:v', '5']): # For ffmpeg builds without libx264
+        result = run_captured([FFMPEG_PATH, '-y', '-v', 'error', *sources, *video_codec, *audio, path])
+        if result.returncode == 0:
+            return True
+    print(f"Could not create the test video: {result.stderr.strip()}")
+    return False
+
+def prepare_media(media_dir, duration):
+    """Synthesizes (or reuses) the video, Hebrew and translation inputs. Returns their paths, or None."""
+    paths = {
+        "video": os.path.join(media_dir, f"bench_video_{duration}s.mp4"),
+        "hebrew": os.path.join(media_dir, f"bench_hebrew_{duration}s.wav"),
+        "translation": os.path.join(media_dir, f"bench_translation_{duration}s.wav"),
+    }
+    makers = {"video": make_test_video, "hebrew": make_reference_clip, "translation": make_reference_clip}
+    for name, path in paths.items():
+        if os.path.isfile(path):
+            continue
+        print(f"Synthesizing {duration}s {name} input...", flush=True)
+        if not makers[name](path, duration):
+            return None
+    return paths
+
+def evenly_spaced_segments(count, duration):
+    """count translation-only segments spread over duration, each half of its share of the time."""
+    if not count:
+        return []
+    slot = duration / count
+    return [(round(i * slot + slot / 4, 3), round(i * slot + slot * 3 / 4, 3)) for i in range(count)]
+
+def _read_spans(metrics_path, offset):
+    """Metrics spans appended to metrics_path after byte offset."""
+    if not os.path.isfile(metrics_path):
+        return []
+    with open(metrics_path, encoding="utf-8") as f:
+        f.seek(offset)
+        return [json.loads(line) for line in f if line.strip()]
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+def run_case(run, metrics_path):
+    """
+    Calls run() (True on success) and collects what it did from the metrics spans it wrote.
+    Its printed output is only shown if it fails. Returns {"ok", "wall_seconds", "child_cpu_seconds",
+    "ffmpeg_max_rss_kb", "bytes_read", "bytes_written", "bytes_uploaded"}.
+    """
+    offset = _file_size(metrics_path)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        started = time.perf_counter()
+        ok = bool(run())
+        wall = time.perf_counter() - started
+    if not ok:
+        print("\n" + output.getvalue())
+    spans = _read_spans(metrics_path, offset)
+    ffmpeg_spans = [span for span in spans if span["span"] == "ffmpeg"]
+    return {
+        "ok": ok,
+        "wall_seconds": wall,
+        "child_cpu_seconds": sum(span.get("child_cpu_seconds") or 0 for span in ffmpeg_spans),
+        "ffmpeg_max_rss_kb": max((span.get("ffmpeg_max_rss_kb") or 0 for span in ffmpeg_spans), default=None),
+        **{counter: sum(span.get(counter) or 0 for span in spans if span["span"] in ("ffmpeg", "upload"))
+           for counter in metrics.COUNTERS},
+    }
+
+def summarize(runs, media_seconds):
+    """Median of the repeated runs of one case, with speed as x realtime."""
+    ok_runs = [run for run in runs if run["ok"]]
+    if not ok_runs:
+        return {"ok": False, "runs": len(runs)}
+    wall = statistics.median(run["wall_seconds"] for run in ok_runs)
+    summary = {"ok": len(ok_runs) == len(runs), "runs": len(runs), "wall_seconds": round(wall, 3),
+               "wall_seconds_all": [round(run["wall_seconds"], 3) for run in runs],
+               "speed_x_realtime": round(media_seconds / wall, 2) if wall > 0 else None}
+    for key in ("child_cpu_seconds", "bytes_read", "bytes_written", "bytes_uploaded"):
+        summary[key] = round(statistics.median(run[key] for run in ok_runs), 3)
+    rss = [run["ffmpeg_max_rss_kb"] for run in ok_runs if run["ffmpeg_max_rss_kb"]]
+    summary["ffmpeg_max_rss_kb"] = max(rss) if rss else None
+    if summary["bytes_uploaded"] and wall > 0:
+        summary["upload_mbit_per_second"] = round(summary["bytes_uploaded"] * 8 / 1e6 / wall, 1)
+    return summary
+
+def _process_peak_rss_kb():
+    """Peak RSS of this Python process in KiB (uploads run in it), or None where unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # Bytes on macOS, KiB elsewhere
+
+def _git_commit():
+    try:
+        result = run_captured(['git', '-C', os.path.dirname(os.path.abspath(__file__)), 'describe', '--always', '--dirty'])
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+def benchmark(paths, media_seconds, options, work_dir):
+    """Runs every selected case options.repeat times. Returns {case: summary}."""
+    metrics_path = os.path.join(work_dir, "metrics.jsonl")
+    metrics.configure(jsonl_path=metrics_path)
+    cases = {"hebrew_only": lambda output: process_video_hebrew_only(
+        paths["video"], paths["hebrew"], output, copy_audio=not options.no_audio_copy,
+        encoder_profile=options.encoder_profile)}
+    for count in options.segments:
+        segments = evenly_spaced_segments(count, media_seconds)
+        cases[f"translation_{count}_segments"] = lambda output, segments=segments: process_video_with_translation(
+            paths["video"], paths["hebrew"], paths["translation"], output, segments,
+            encoder_profile=options.encoder_profile)
+
+    results = {}
+    upload_source = None
+    for name, process in cases.items():
+        output = os.path.join(work_dir, f"{name}.mp4")
+        print(f"{name}: ", end="", flush=True)
+        runs = []
+        for _ in range(options.repeat):
+            if os.path.exists(output):
+                os.remove(output)
+            runs.append(run_case(lambda: process(output), metrics_path))
+            print("." if runs[-1]["ok"] else "x", end="", flush=True)
+        results[name] = summarize(runs, media_seconds)
+        print()
+        if results[name]["ok"] and upload_source is None:
+            upload_source = output
+
+    if not options.no_upload and upload_source:
+        server = start_mock_server()
+        service = build_mock_service(server.base_url)
+        chunksize = options.chunk_size_mb * 1024 * 1024
+        print(f"{UPLOAD_CASE}: ", end="", flush=True)
+        runs = []
+        for index in range(options.repeat):
+            runs.append(run_case(lambda: isinstance(upload_video(
+                service, upload_source, f"Benchmark {index}", "", chunksize=chunksize, resume_session=False), dict),
+                metrics_path))
+            print("." if runs[-1]["ok"] else "x", end="", flush=True)
+        server.shutdown()
+        results[UPLOAD_CASE] = summarize(runs, media_seconds)
+        print()
+    return results
+
+def print_results(report, baseline=None):
+    """Prints the results table; with a baseline report, also each case's change in wall time."""
+    print(f"\n{'Case':<28}{'Wall':>9}{'Speed':>9}{'ffmpeg CPU':>12}{'ffmpeg RSS':>12}{'Read':>10}{'Written':>10}"
+          + ("   vs baseline" if baseline else ""))
+    for name, result in report["results"].items():
+        if not result.get("wall_seconds"):
+            print(f"{name:<28}{'failed':>9}")
+            continue
+        rss = f"{result['ffmpeg_max_rss_kb'] / 1024:.0f} MiB" if result["ffmpeg_max_rss_kb"] else "-"
+        written = result["bytes_uploaded"] or result["bytes_written"]
+        line = (f"{name:<28}{result['wall_seconds']:>8.2f}s{result['speed_x_realtime']:>8.1f}x"
+                f"{result['child_cpu_seconds']:>11.2f}s{rss:>12}{result['bytes_read'] / 1e6:>7.1f} MB{written / 1e6:>7.1f} MB")
+        previous = (baseline or {}).get("results", {}).get(name, {})
+        if previous.get("wall_seconds"):
+            change = (result["wall_seconds"] - previous["wall_seconds"]) / previous["wall_seconds"] * 100
+            line += f"   {change:+.1f}% ({previous['wall_seconds']:.2f}s)"
+        print(line)
+    if report["results"].get(UPLOAD_CASE, {}).get("upload_mbit_per_second"):
+        print(f"Upload to the mock endpoint: {report['results'][UPLOAD_CASE]['upload_mbit_per_second']} Mbit/s")
+    if report["process_max_rss_kb"]:
+        print(f"Peak RSS of this process: {report['process_max_rss_kb'] / 1024:.0f} MiB")
+    if baseline:
+        print(f"Baseline: {baseline.get('commit')} ({baseline.get('started')}), "
+              f"{baseline.get('media_seconds')}s media, {baseline.get('ffmpeg_version')}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark rendering and uploading on synthesized media.")
+    parser.add_argument("--duration", type=int, default=DEFAULT_DURATION, help="Length of the test media in seconds")
+    parser.add_argument("--segments", type=int, nargs="+", default=list(DEFAULT_SEGMENT_COUNTS),
+                        help="Translation-only segment counts to time (default: 0 10 100)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the median is reported")
+    parser.add_argument("--media-dir", help="Keep the synthesized media here and reuse it in later runs")
+    parser.add_argument("--no-upload", action="store_true", help="Skip the upload case")
+    parser.add_argument("--chunk-size-mb", type=int, default=DEFAULT_CHUNK_SIZE // (1024 * 1024))
+    parser.add_argument("--no-audio-copy", action="store_true", help="Always re-encode the Hebrew audio")
+    parser.add_argument("--encoder-profile", help="Audio encoder profile (see encoder_benchmark.py)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    options = parser.parse_args(argv)
+    if not FFMPEG_PATH:
+        print("FFmpeg executable not found.")
+        return 1
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix="pipeline_benchmark_") as work_dir:
+        media_dir = options.media_dir or work_dir
+        os.makedirs(media_dir, exist_ok=True)
+        paths = prepare_media(media_dir, options.duration)
+        if not paths:
+            return 1
+        media_seconds = media_duration(paths["video"]) or options.duration
+        report = {
+            "started": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "ffmpeg_version": (get_ffmpeg_version() or "").split(" Copyright")[0],
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "media_seconds": media_seconds,
+            "repeat": options.repeat,
+            "results": benchmark(paths, media_seconds, options, work_dir),
+            "process_max_rss_kb": _process_peak_rss_kb(),
+        }
+    print_results(report, baseline)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {options.output}")
+    return 0 if all(result["ok"] for result in report["results"].values()) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+# render_cache.py
+# Content-addressed cache of rendered outputs. A render is identified by a hash of
+# everything that affects its bytes: the input files, the segment list, the mixing
+# parameters and the ffmpeg version. If nothing changed, the earlier output is reused
+# instead of running ffmpeg again.
+import os
+import json
+import time
+import hashlib
+import threading
+from path_util import data_path, load_json_file, save_json_file, file_fingerprint
+from segments import SegmentSet
+
+CACHE_INDEX_FILE = data_path('render_cache.json')
+DEFAULT_MAX_CACHE_BYTES = 100 * 1024 ** 3 # 100 GB of rendered videos
+
+_lock = threading.Lock() # Render jobs finish on different threads
+
+def render_key(kind, input_paths, segments=None, params=None):
+    """
+    Hash identifying one render.
+    kind: e.g. "hebrew_only" or "translation"
+    input_paths: every media file the render reads, in order
+    params: anything else that changes the output (mixing volumes, codec, ffmpeg version...)
+    """
+    key_data = {
+        "kind": kind,
+        "inputs": [file_fingerprint(path) for path in input_paths],
+        "segments": SegmentSet(segments or []).key(), # Equivalent segment lists share a key
+        "params": params or {},
+    }
+    encoded = json.dumps(key_data, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def _load_index():
+    return load_json_file(CACHE_INDEX_FILE, default={})
+
+def lookup(key):
+    """Returns the path of a cached render for key, or None. Marks the entry as recently used."""
+    with _lock:
+        index = _load_index()
+        entry = index.get(key)
+        if not entry:
+            return None
+        path = entry["path"]
+        if not os.path.isfile(path) or file_fingerprint(path) != entry.get("fingerprint"):
+            # Deleted or overwritten behind our back (also drops entries stored without a fingerprint)
+            del index[key]
+            save_json_file(CACHE_INDEX_FILE, index)
+            return None
+        entry["last_used"] = time.time()
+        save_json_file(CACHE_INDEX_FILE, index)
+        return path
+
+def store(key, path):
+    """Records a finished render under key."""
+    path = os.path.abspath(path)
+    with _lock:
+        index = _load_index()
+        # A new render may have overwritten a file cached under another key
+        for stale_key in [k for k, entry in index.items() if entry["path"] == path]:
+            del index[stale_key]
+        index[key] = {
+            "path": path,
+            "size": os.path.getsize(path),
+            "fingerprint": file_fingerprint(path), # Catches a same-size file written over the render
+            "last_used": time.time(),
+        }
+        save_json_file(CACHE_INDEX_FILE, index)
+
+def evict(max_bytes=DEFAULT_MAX_CACHE_BYTES, keep=()):
+    """
+    Deletes least recently used cached renders until the cache fits in max_bytes.
+    Paths in keep (e.g. outputs of the current run) are never deleted.
+    Returns the list of deleted paths.
+    """
+    keep = {os.path.abspath(path) for path in keep if path}
+    deleted = []
+    with _lock:
+        index = _load_index()
+        # Forget entries whose files are already gone
+        index = {key: entry for key, entry in index.items() if os.path.isfile(entry["path"])}
+        total = sum(entry["size"] for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]["last_used"]):
+            if total <= max_bytes:
+                break
+            if entry["path"] in keep:
+                continue
+            try:
+                os.remove(entry["path"])
+            except FileNotFoundError:
+                pass # Already gone
+            except OSError as e:
+                print(f"Warning: could not delete cached render {entry['path']}: {e}")
+                continue
+            total -= entry["size"]
+            deleted.append(entry["path"])
+            del index[key]
+        save_json_file(CACHE_INDEX_FILE, index)
+    return deleted
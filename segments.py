@@ -0,0 +1,191 @@
+# segments.py
+# Translation-only segments as a canonical interval set: sorted, with overlapping,
+# touching and duplicate segments merged. The same SegmentSet feeds the ducking filter,
+# the render-cache key and the segment list in the GUI, so equivalent inputs always
+# produce the same (minimal) ffmpeg commands and the same cache key.
+import math
+import numpy as np
+
+TIME_PRECISION = 3 # Segment times are kept to the millisecond
+
+def parse_time(value):
+    """
+    Seconds from a number or a string: "90", "90.5", "01:30" (MM:SS) or "1:02:03.250" (HH:MM:SS.mmm).
+    Raises ValueError for anything else, or a negative time.
+    """
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        parts = str(value).strip().split(':')
+        if len(parts) > 3 or any(not part.strip() for part in parts):
+            raise ValueError(f"Invalid time '{value}'. Use seconds or HH:MM:SS.mmm.")
+        seconds = 0.0
+        for index, part in enumerate(parts):
+            number = float(part)
+            if index > 0 and not 0 <= number < 60:
+                raise ValueError(f"Invalid time '{value}': minutes and seconds must be below 60.")
+            seconds = seconds * 60 + number
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError(f"Invalid time '{value}'. Times must be zero or positive.")
+    return round(seconds, TIME_PRECISION)
+
+def format_time(seconds):
+    """HH:MM:SS.mmm for seconds, e.g. 3723.25 -> "01:02:03.250"."""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    return f"{hours:02d}:{minutes:02d}:{milliseconds / 1000:06.3f}"
+
+def _canonical(starts, ends):
+    """Sorts intervals and merges overlapping/touching ones, all with array operations."""
+    starts = np.round(np.asarray(starts, dtype=np.float64), TIME_PRECISION)
+    ends = np.round(np.asarray(ends, dtype=np.float64), TIME_PRECISION)
+    keep = ends > starts # Empty or reversed intervals contribute nothing
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts):
+        return ()
+    order = np.lexsort((ends, starts))
+    starts, ends = starts[order], ends[order]
+    running_end = np.maximum.accumulate(ends)
+    # A new merged interval begins wherever a start lies beyond every end seen so far
+    new_group = np.concatenate(([True], starts[1:] > running_end[:-1]))
+    group_starts = np.flatnonzero(new_group)
+    merged_ends = np.maximum.reduceat(ends, group_starts)
+    return tuple(zip(starts[group_starts].tolist(), merged_ends.tolist()))
+
+class SegmentSet:
+    """
+    Immutable set of time intervals in seconds, always stored in canonical form.
+    SegmentSet([(5, 10), (0, 6), (10, 12), (20, 20)]) == SegmentSet([(0, 12)])
+    Segment times may be numbers or time strings (see parse_time).
+    """
+    __slots__ = ("_segments",)
+
+    def __init__(self, segments=()):
+        if isinstance(segments, SegmentSet):
+            self._segments = segments._segments
+            return
+        segments = list(segments)
+        try: # Fast path: plain numbers are validated as one array
+            bounds = np.asarray(segments, dtype=np.float64).reshape(-1, 2)
+        except (TypeError, ValueError): # Time strings
+            bounds = np.array([(parse_time(start), parse_time(end)) for start, end in segments], dtype=np.float64).reshape(-1, 2)
+        if not np.all(np.isfinite(bounds)) or np.any(bounds < 0):
+            raise ValueError("Segment times must be finite and zero or positive.")
+        self._segments = _canonical(bounds[:, 0], bounds[:, 1])
+
+    @classmethod
+    def parse(cls, text, strict=False, log=print):
+        """
+        Parses "60-300, 450-600" (times may also be HH:MM:SS.mmm, e.g. "1:00-5:00").
+        Bad parts raise ValueError when strict, otherwise they are skipped with a warning.
+        """
+        pairs = []
+        for part in (text or "").split(','):
+            if not part.strip():
+                continue
+            try:
+                bounds = part.split('-')
+                if len(bounds) != 2:
+                    raise ValueError("Expected start-end.")
+                start, end = parse_time(bounds[0]), parse_time(bounds[1])
+                if start >= end:
+                    raise ValueError("Start must be before end.")
+                pairs.append((start, end))
+            except ValueError as e:
+                if strict:
+                    raise ValueError(f"Could not parse segment '{part.strip()}': {e}") from e
+                log(f"Warning: Could not parse segment '{part}'. Skipping. Error: {e}")
+        return cls(pairs)
+
+    # --- Set operations ---
+    def union(self, other):
+        return SegmentSet(self._segments + SegmentSet(other)._segments)
+
+    def intersection(self, other):
+        other = SegmentSet(other)._segments
+        result = []
+        i = j = 0
+        while i < len(self._segments) and j < len(other):
+            start = max(self._segments[i][0], other[j][0])
+            end = min(self._segments[i][1], other[j][1])
+            if start < end:
+                result.append((start, end))
+            # Advance whichever interval finishes first
+            if self._segments[i][1] < other[j][1]:
+                i += 1
+            else:
+                j += 1
+        return SegmentSet(result)
+
+    def complement(self, start, end):
+        """The gaps between segments within [start, end]."""
+        bounds = np.array([start] + [time for segment in self._segments for time in segment] + [end], dtype=np.float64)
+        return SegmentSet(zip(np.maximum(bounds[0::2], start).tolist(), np.minimum(bounds[1::2], end).tolist()))
+
+    def subtract(self, other):
+        if not self._segments:
+            return self
+        return self.intersection(SegmentSet(other).complement(self.start, self.end))
+
+    def clip(self, start=0.0, end=math.inf):
+        """Only the parts of the segments inside [start, end]."""
+        clipped = SegmentSet()
+        clipped._segments = tuple((max(s, start), min(e, end)) for s, e in self._segments if min(e, end) > max(s, start))
+        return clipped
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = subtract
+
+    def validate(self, duration):
+        """Problems with the segments for media of the given length, as messages (empty if none)."""
+        problems = []
+        for start, end in self._segments:
+            if start >= duration:
+                problems.append(f"Segment {format_time(start)}-{format_time(end)} starts after the end of the media ({format_time(duration)}).")
+            elif end > duration:
+                problems.append(f"Segment {format_time(start)}-{format_time(end)} runs past the end of the media ({format_time(duration)}).")
+        return problems
+
+    # --- Access ---
+    @property
+    def start(self):
+        return self._segments[0][0] if self._segments else 0.0
+
+    @property
+    def end(self):
+        return self._segments[-1][1] if self._segments else 0.0
+
+    @property
+    def total_duration(self):
+        return sum(end - start for start, end in self._segments)
+
+    def as_list(self):
+        """[(start_sec, end_sec), ...], the form the rest of the app passes around."""
+        return list(self._segments)
+
+    def key(self):
+        """JSON-friendly canonical form, e.g. for cache keys."""
+        return [list(segment) for segment in self._segments]
+
+    def __iter__(self):
+        return iter(self._segments)
+
+    def __len__(self):
+        return len(self._segments)
+
+    def __bool__(self):
+        return bool(self._segments)
+
+    def __eq__(self, other):
+        return isinstance(other, SegmentSet) and self._segments == other._segments
+
+    def __hash__(self):
+        return hash(self._segments)
+
+    def __str__(self):
+        return ", ".join(f"{start:g}-{end:g}" for start, end in self._segments)
+
+    def __repr__(self):
+        return f"SegmentSet([{', '.join(f'({start:g}, {end:g})' for start, end in self._segments)}])"
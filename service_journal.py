@@ -0,0 +1,113 @@
+# service_journal.py
+# Persistent record of how far each service run got: probing (audio offset and
+# segments), then the render and the upload of every language, each with its state, output
+# path, checksum and YouTube video id. If the app dies halfway, the next run of the same
+# service skips the stages that finished and does only the remaining work, and a video that
+# was already uploaded is never uploaded a second time.
+import os
+import time
+import threading
+from path_util import data_path, load_json_file, save_json_file, file_fingerprint
+from job_scheduler import RUNNING, DONE, FAILED, CANCELLED
+import output_manifest
+
+JOURNAL_FILE = data_path('service_jobs.json')
+MAX_JOBS = 200 # Least recently updated jobs are dropped beyond this
+
+PROBE = "probe"
+
+_lock = threading.Lock() # Render callbacks and uploader threads update the journal at once
+
+def job_id(video_path, meeting_type, multi_track=False):
+    """Identity of a service run: the source video (by content), meeting type and output mode."""
+    return f"{output_manifest.source_id(video_path)}|{meeting_type}|{'multi' if multi_track else 'separate'}"
+
+def render_stage(lang_key):
+    return f"render:{lang_key}"
+
+def upload_stage(lang_key):
+    return f"upload:{lang_key}"
+
+def file_checksum(path):
+    """Checksum recorded for outputs (the partial hash of path_util.file_fingerprint), or None if missing."""
+    try:
+        return file_fingerprint(path)["partial_hash"]
+    except OSError:
+        return None
+
+def _load_journal():
+    return load_json_file(JOURNAL_FILE, default={})
+
+def get_stage(job, stage):
+    """The stored record of one stage ({"state", "updated", ...}), or None."""
+    with _lock:
+        return _load_journal().get(job, {}).get("stages", {}).get(stage)
+
+def update_stage(job, stage, state, **fields):
+    """Sets the state (and any fields, e.g. path=..., video_id=...) of one stage and saves at once."""
+    with _lock:
+        journal = _load_journal()
+        entry = journal.setdefault(job, {"created": time.time(), "stages": {}})
+        record = entry["stages"].setdefault(stage, {})
+        record.update(fields, state=state, updated=time.time())
+        entry["updated"] = record["updated"]
+        if len(journal) > MAX_JOBS:
+            for old_job in sorted(journal, key=lambda key: journal[key].get("updated", 0))[:len(journal) - MAX_JOBS]:
+                del journal[old_job]
+        save_json_file(JOURNAL_FILE, journal)
+
+def completed_probe(job, inputs_key):
+    """The stored probe results ({"duration", "audio_offset", "segments"}) if probing finished for the same inputs."""
+    record = get_stage(job, PROBE)
+    if record and record["state"] == DONE and record.get("inputs_key") == inputs_key:
+        return record
+    return None
+
+def completed_render(job, lang_key, render_key):
+    """
+    Path of the finished render of lang_key if it was made from the same inputs and settings
+    (render_key) and the file is still there unchanged; otherwise None.
+    """
+    record = get_stage(job, render_stage(lang_key))
+    if not record or record["state"] != DONE or record.get("render_key") != render_key:
+        return None
+    path = record.get("path")
+    if not path or not os.path.isfile(path) or file_checksum(path) != record.get("checksum"):
+        return None
+    return path
+
+def completed_upload(job, lang_key, path):
+    """YouTube video id if exactly this file (by checksum) was already uploaded for lang_key, else None."""
+    record = get_stage(job, upload_stage(lang_key))
+    if not record or record["state"] != DONE or not record.get("video_id"):
+        return None
+    if record.get("checksum") != file_checksum(path):
+        return None # A different render of this language; it has not been uploaded
+    return record["video_id"]
+
+def mark_running(job, stage, **fields):
+    update_stage(job, stage, RUNNING, **fields)
+
+def mark_render_done(job, lang_key, path, render_key):
+    update_stage(job, render_stage(lang_key), DONE, path=os.path.abspath(path), checksum=file_checksum(path),
+                 render_key=render_key)
+
+def mark_upload_done(job, lang_key, path, video_id):
+    update_stage(job, upload_stage(lang_key), DONE, path=os.path.abspath(path), checksum=file_checksum(path),
+                 video_id=video_id)
+
+def mark_failed(job, stage, cancelled=False):
+    update_stage(job, stage, CANCELLED if cancelled else FAILED)
+
+def interrupted_stages(job):
+    """Stages left RUNNING by a run that did not finish (e.g. the app crashed)."""
+    with _lock:
+        stages = _load_journal().get(job, {}).get("stages", {})
+    return [stage for stage, record in stages.items() if record["state"] == RUNNING]
+
+def forget_job(job):
+    """Drops everything recorded for job, so the next run starts from scratch."""
+    with _lock:
+        journal = _load_journal()
+        if journal.pop(job, None) is not None:
+            save_json_file(JOURNAL_FILE, journal)
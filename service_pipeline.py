@@ -0,0 +1,380 @@
+# service_pipeline.py
+# Render + upload pipeline for one service (a recording with its Hebrew and translation
+# audio), independent of the GUI so app.py and batch_cli.py run exactly the same steps.
+import queue
+import threading
+
+from youtube_uploader import DEFAULT_CHUNK_SIZE
+from upload_manager import UploadManager, DEFAULT_CONCURRENT_UPLOADS
+from ffmpeg_processor import (
+    process_video_hebrew_only,
+    process_video_with_translation,
+    process_all_languages,
+    process_video_multitrack,
+    render_parameters,
+    hebrew_only_parameters,
+    DUCKING_FADE_SECONDS
+)
+from job_scheduler import Job, run_jobs, default_worker_count, DONE, FAILED, CANCELLED
+from service_templates import create_custom_output_filename, format_with_placeholders
+from audio_analysis import detect_audio_offset, detect_translation_segments
+from segments import SegmentSet
+from media_probe import media_duration, validate_inputs, ERROR
+import render_cache
+import output_manifest
+import metrics
+import service_journal
+from render_cache import render_key, DEFAULT_MAX_CACHE_BYTES
+
+LANGUAGES = ("HE", "RU", "EN") # Processing order
+MULTI_TRACK = "MULTI" # Output key of the single multi-track video (data["multi_track"])
+# Language of each upload's main audio track, as YouTube expects it; the multi-track video defaults to Hebrew
+UPLOAD_AUDIO_LANGUAGES = {"HE": "he", "RU": "ru", "EN": "en", MULTI_TRACK: "he"}
+
+# Result states for a language's render and upload
+CACHED = "CACHED"
+UPLOADED = "UPLOADED"
+UPLOAD_FAILED = "UPLOAD_FAILED"
+UPLOAD_CANCELLED = "UPLOAD_CANCELLED"
+
+AUTO_OFFSET = "auto" # data["audio_offset"] value that asks for the offset to be detected
+AUTO_SEGMENTS = "auto" # data["segments_data"] value that asks for the segments to be detected
+
+def _record_upload(future, lang_key, title, log, results, service_job, path):
+    """Stores the outcome of one UploadManager upload in results and in the service journal."""
+    stage = service_journal.upload_stage(lang_key)
+    try:
+        result = future.result()
+    except Exception as e:
+        log(f"ERROR uploading {lang_key} video: {e}")
+        results[lang_key]["upload"] = UPLOAD_FAILED
+        service_journal.mark_failed(service_job, stage)
+        return
+    if result == "CANCELLED":
+        log(f"Upload of '{title}' cancelled.")
+        results[lang_key]["upload"] = UPLOAD_CANCELLED
+        service_journal.mark_failed(service_job, stage, cancelled=True)
+    elif result:
+        log(f"Uploaded '{title}' to YouTube.")
+        results[lang_key]["upload"] = UPLOADED
+        results[lang_key]["video_id"] = result.get("id")
+        service_journal.mark_upload_done(service_job, lang_key, path, result.get("id"))
+    else:
+        log(f"Failed to upload {lang_key} video or upload was interrupted.")
+        results[lang_key]["upload"] = UPLOAD_FAILED
+        service_journal.mark_failed(service_job, stage)
+
+def _measured(func, **labels):
+    """func wrapped in a "render" metrics span with labels; the span fails if func returns a falsy result."""
+    def run(*args, **kwargs):
+        with metrics.span("render", **labels) as measured:
+            result = func(*args, **kwargs)
+            if not result:
+                cancel_event = kwargs.get("cancel_event")
+                measured.set_status(metrics.CANCELLED if cancel_event and cancel_event.is_set() else metrics.ERROR)
+            return result
+    return run
+
+def _upload_worker(upload_queue, data, upload_manager, cancel_event, log, results, service_job):
+    """
+    Hands rendered videos to upload_manager as they arrive on upload_queue, until a None
+    sentinel is received, then waits for their uploads to finish.
+    """
+    date_val, location_val = data["date_val"], data["location_val"]
+    uploads = []
+    while True:
+        item = upload_queue.get()
+        if item is None:
+            break
+        lang_key, output_video = item
+        if cancel_event.is_set():
+            log(f"Cancelled before {lang_key} upload.")
+            results[lang_key]["upload"] = UPLOAD_CANCELLED
+            continue # Keep draining so the producer is never blocked
+        lang_code = "he" if lang_key == MULTI_TRACK else lang_key.lower() # Multi-track uses the Hebrew texts
+        title = format_with_placeholders(data[f"title_{lang_code}_template"], date_val, location_val, log)
+        desc = format_with_placeholders(data[f"desc_{lang_code}_template"], date_val, location_val, log)
+        log(f"\n--- Uploading {lang_key} video: {output_video} ---")
+        service_journal.mark_running(service_job, service_journal.upload_stage(lang_key), path=output_video)
+        future = upload_manager.submit(output_video, title, desc, cancel_event=cancel_event,
+                                       chunksize=data.get("chunksize", DEFAULT_CHUNK_SIZE),
+                                       default_audio_language=UPLOAD_AUDIO_LANGUAGES.get(lang_key),
+                                       labels={"lang": lang_key},
+                                       source_key=output_manifest.output_key(data["video_path"],
+                                                                             data.get("meeting_type", "Sermon"), lang_key))
+        uploads.append((future, lang_key, title, output_video))
+    for future, lang_key, title, output_video in uploads:
+        _record_upload(future, lang_key, title, log, results, service_job, output_video)
+
+def resolve_audio_offset(data, cancel_event=None, log=print):
+    """
+    Seconds to shift the audio recordings by: data["audio_offset"] as given, or detected by
+    cross-correlating the Hebrew audio with the camera audio when it is AUTO_OFFSET.
+    Falls back to 0 when detection fails or is not confident.
+    """
+    audio_offset = data.get("audio_offset") or 0.0
+    if audio_offset != AUTO_OFFSET:
+        return float(audio_offset)
+    log("Detecting audio offset against the camera audio...")
+    result = detect_audio_offset(data["video_path"], data["he_audio_path"], cancel_event=cancel_event)
+    if result is None:
+        log("WARNING: Could not detect the audio offset; assuming the audio starts with the video.")
+        return 0.0
+    if not result["reliable"]:
+        log(f"WARNING: No clear match between camera and Hebrew audio (best guess {result['offset']:+.3f}s, "
+            f"confidence {result['confidence']}); assuming the audio starts with the video.")
+        return 0.0
+    log(f"Detected audio offset: {result['offset']:+.3f}s (confidence {result['confidence']})")
+    return result["offset"]
+
+def resolve_segments(data, audio_offset=0.0, cancel_event=None, log=print):
+    """
+    The translation-only segments as a SegmentSet clipped to the video: data["segments_data"]
+    as given, or detected from the audio energy of the Hebrew and translation tracks when
+    it is AUTO_SEGMENTS.
+    """
+    if data["segments_data"] != AUTO_SEGMENTS:
+        segments = SegmentSet(data["segments_data"])
+    else:
+        translation_paths = [data[key] for key in ("ru_audio_path", "en_audio_path") if data.get(key)]
+        if not translation_paths:
+            return SegmentSet()
+        log("Detecting translation-only segments from the audio...")
+        detected = detect_translation_segments(data["he_audio_path"], translation_paths, audio_offset, cancel_event)
+        if detected is None:
+            log("WARNING: Could not detect segments; mixing without translation-only segments.")
+            return SegmentSet()
+        segments = SegmentSet(detected)
+        log(f"Detected {len(segments)} translation-only segment(s), {segments.total_duration / 60:.1f} minutes in total.")
+    duration = media_duration(data["video_path"]) if segments else None
+    if duration:
+        for problem in segments.validate(duration):
+            log(f"Warning: {problem} It will be clipped.")
+        segments = segments.clip(0, duration)
+    return segments
+
+def process_service(data, perform_upload=False, youtube_service=None, cancel_event: threading.Event = None,
+                    log=print, progress_callback_factory=None, on_output_ready=None, upload_manager=None):
+    """
+    Renders (and optionally uploads) every language of one service.
+    data: the same dict the GUI builds in _get_common_data (paths, templates, settings).
+    progress_callback_factory(lang_keys) -> ffmpeg progress callback for a render job, or None.
+    on_output_ready(lang_key, path, cached) is called as soon as each language's video exists.
+    upload_manager: an UploadManager to share (and its bandwidth limit) with other callers;
+    by default one is made from youtube_service, data["max_uploads"] and data["upload_rate_limit"].
+    With data["multi_track"], a single MULTI_TRACK video carrying every language's audio replaces
+    the per-language videos.
+    Progress is kept in service_journal: a rerun of the same service skips the probe, renders and
+    uploads that already finished, unless data["resume"] is False.
+    Returns {lang_key: {"render": status, "path": ..., "upload": status or None, "video_id": ...}}.
+    """
+    if cancel_event is None:
+        cancel_event = threading.Event()
+    video_path = data["video_path"]
+    he_audio_path = data["he_audio_path"]
+    meeting_type = data.get("meeting_type", "Sermon")
+    output_dir = data.get("output_dir", "output_videos")
+    results = {}
+
+    # 1. Work out the output file for every language
+    if cancel_event.is_set(): log("Cancelled before processing."); return results
+    multi_track = data.get("multi_track", False)
+    translations = {}
+    if data.get("ru_audio_path"): # Only if Russian audio is provided
+        translations["RU"] = data["ru_audio_path"]
+    if data.get("en_audio_path"): # Only if English audio is provided
+        translations["EN"] = data["en_audio_path"]
+    if multi_track:
+        output_paths = {MULTI_TRACK: create_custom_output_filename(meeting_type, "multi", output_dir, language_code="multi")}
+    else:
+        output_paths = {"HE": create_custom_output_filename(meeting_type, "he", output_dir, language_code="he")}
+        for lang_key in translations:
+            lang_code = lang_key.lower()
+            output_paths[lang_key] = create_custom_output_filename(meeting_type, lang_code, output_dir, language_code=lang_code)
+    for lang_key in output_paths:
+        results[lang_key] = {"render": None, "path": None, "upload": None, "video_id": None}
+
+    # Catch unusable (or missing) inputs now, before anything reads them, rather than after
+    # ffmpeg fails partway through
+    with metrics.span("probe") as measured:
+        problems = validate_inputs(video_path, {"HE": he_audio_path, **translations})
+        if not video_path or not he_audio_path:
+            problems.insert(0, (ERROR, "A video file and a Hebrew audio file are required."))
+        if any(level == ERROR for level, _ in problems):
+            measured.set_status(metrics.ERROR)
+    for level, message in problems:
+        log(f"{level}: {message}")
+    if any(level == ERROR for level, _ in problems):
+        for result in results.values():
+            result["render"] = FAILED
+        return results
+    video_duration = media_duration(video_path)
+
+    service_job = service_journal.job_id(video_path, meeting_type, multi_track)
+    if not data.get("resume", True):
+        service_journal.forget_job(service_job)
+    interrupted = service_journal.interrupted_stages(service_job)
+    if interrupted:
+        log(f"Resuming an interrupted run of this service (unfinished: {', '.join(interrupted)}).")
+
+    # 2. Line the separately recorded audio up with the video, and find the translation-only segments
+    inputs_key = render_key("inputs", [video_path, he_audio_path, *translations.values()],
+                            params={"languages": list(translations), "audio_offset": data.get("audio_offset") or 0.0,
+                                    "segments": data["segments_data"]})
+    probed = service_journal.completed_probe(service_job, inputs_key)
+    if probed:
+        log("Inputs unchanged since the last run; reusing its audio offset and segments.")
+        audio_offset, segments = probed["audio_offset"], SegmentSet(probed["segments"])
+    else:
+        service_journal.mark_running(service_job, service_journal.PROBE)
+        with metrics.span("align"):
+            audio_offset = resolve_audio_offset(data, cancel_event, log)
+        with metrics.span("segments"):
+            segments = resolve_segments(data, audio_offset, cancel_event, log)
+        if cancel_event.is_set():
+            service_journal.mark_failed(service_job, service_journal.PROBE, cancelled=True)
+            log("Cancelled before processing.")
+            return results
+        service_journal.update_stage(service_job, service_journal.PROBE, DONE, inputs_key=inputs_key,
+                                     duration=video_duration, audio_offset=audio_offset, segments=segments.as_list())
+
+    # 3. Reuse earlier renders of the exact same inputs and settings (from this service's
+    #    journal, or from the render cache)
+    use_cache = data.get("use_render_cache", True)
+    fade_duration = data.get("fade_duration", DUCKING_FADE_SECONDS)
+    copy_audio = data.get("copy_audio", True)
+    encoder_profile = data.get("encoder_profile")
+    render_params = render_parameters(fade_duration, audio_offset, copy_audio, encoder_profile)
+    render_keys = {}
+    if multi_track:
+        render_keys[MULTI_TRACK] = render_key("multi_track", [video_path, he_audio_path, *translations.values()], segments,
+                                              dict(render_params, tracks=["HE", *translations]))
+    else:
+        render_keys["HE"] = render_key("hebrew_only", [video_path, he_audio_path],
+                                      params=hebrew_only_parameters(audio_offset, copy_audio, encoder_profile))
+        for lang_key, translation_audio_path in translations.items():
+            render_keys[lang_key] = render_key("translation", [video_path, he_audio_path, translation_audio_path],
+                                               segments, render_params)
+    cache_keys = render_keys if use_cache else {}
+    cached_langs = []
+    for lang_key, key in render_keys.items():
+        cached_path = service_journal.completed_render(service_job, lang_key, key) or (use_cache and render_cache.lookup(key))
+        if cached_path:
+            output_paths[lang_key] = cached_path
+            cached_langs.append(lang_key)
+
+    # 4. Finished renders go onto an upload queue that a separate thread drains,
+    #    so uploading one language overlaps with rendering the next
+    upload_queue = queue.Queue()
+    uploader_thread = None
+    own_upload_manager = None
+    if perform_upload and (upload_manager or youtube_service):
+        if upload_manager is None:
+            upload_manager = own_upload_manager = UploadManager(
+                youtube_service, data.get("max_uploads", DEFAULT_CONCURRENT_UPLOADS), data.get("upload_rate_limit"), log)
+        uploader_thread = threading.Thread(target=_upload_worker, daemon=True,
+                                           args=(upload_queue, data, upload_manager, cancel_event, log, results, service_job))
+        uploader_thread.start()
+
+    def output_ready(lang_key, cached=False):
+        results[lang_key]["render"] = CACHED if cached else DONE
+        results[lang_key]["path"] = output_paths[lang_key]
+        output_manifest.record_output(video_path, meeting_type, lang_key, output_paths[lang_key], render_keys[lang_key],
+                                      video_duration)
+        service_journal.mark_render_done(service_job, lang_key, output_paths[lang_key], render_keys[lang_key])
+        if on_output_ready:
+            on_output_ready(lang_key, output_paths[lang_key], cached)
+        if not uploader_thread:
+            return
+        video_id = service_journal.completed_upload(service_job, lang_key, output_paths[lang_key])
+        if video_id:
+            log(f"{lang_key} video was already uploaded (video id {video_id}); not uploading it again.")
+            results[lang_key]["upload"] = UPLOADED
+            results[lang_key]["video_id"] = video_id
+        else:
+            upload_queue.put((lang_key, output_paths[lang_key]))
+
+    for lang_key in cached_langs:
+        log(f"{lang_key} video unchanged since last render, reusing: {output_paths[lang_key]}")
+        output_ready(lang_key, cached=True)
+
+    render_langs = [lang_key for lang_key in output_paths if lang_key not in cached_langs]
+
+    def job_langs(job):
+        return render_langs if job.name == "ALL" else [job.name]
+
+    def on_render_status(job):
+        if job.status == FAILED and job.error:
+            log(f"[{job.name}] Render FAILED: {job.error}")
+        else:
+            log(f"[{job.name}] Render {job.status}")
+        if job.status != DONE:
+            return
+        for lang_key in job_langs(job):
+            log(f"{lang_key} video created: {output_paths[lang_key]}")
+            if lang_key in cache_keys:
+                render_cache.store(cache_keys[lang_key], output_paths[lang_key])
+            output_ready(lang_key)
+
+    def progress_callback(lang_keys):
+        return progress_callback_factory(lang_keys) if progress_callback_factory else None
+
+    # 5. Render the remaining languages (side by side, or in a single ffmpeg pass)
+    max_workers = data.get("max_workers") or default_worker_count()
+    jobs = []
+    if render_langs and multi_track:
+        jobs.append(Job(MULTI_TRACK, _measured(process_video_multitrack, lang=MULTI_TRACK),
+                        video_path, he_audio_path, translations, segments,
+                        output_paths[MULTI_TRACK], progress_callback=progress_callback(["HE", *translations]),
+                        cancel_event=cancel_event, fade_duration=fade_duration, audio_offset=audio_offset,
+                        copy_audio=copy_audio, encoder_profile=encoder_profile))
+        log(f"\n--- Processing one video with {', '.join(['HE', *translations])} audio tracks ---")
+    elif render_langs and data.get("single_pass"):
+        # One ffmpeg process writes every language; all outputs share its status
+        render_outputs = {lang_key: output_paths[lang_key] for lang_key in render_langs}
+        jobs.append(Job("ALL", _measured(process_all_languages, lang="ALL"),
+                        video_path, he_audio_path, translations, segments, render_outputs,
+                        progress_callback=progress_callback(render_langs), cancel_event=cancel_event,
+                        fade_duration=fade_duration, audio_offset=audio_offset, copy_audio=copy_audio,
+                        encoder_profile=encoder_profile))
+        log(f"\n--- Processing {', '.join(render_langs)} videos in a single pass ---")
+    elif render_langs:
+        if "HE" in render_langs:
+            jobs.append(Job("HE", _measured(process_video_hebrew_only, lang="HE"),
+                            video_path, he_audio_path, output_paths["HE"],
+                            progress_callback=progress_callback(["HE"]), cancel_event=cancel_event,
+                            audio_offset=audio_offset, copy_audio=copy_audio, encoder_profile=encoder_profile))
+        for lang_key, translation_audio_path in translations.items():
+            if lang_key in render_langs:
+                jobs.append(Job(lang_key, _measured(process_video_with_translation, lang=lang_key),
+                                video_path, he_audio_path, translation_audio_path, output_paths[lang_key], segments,
+                                progress_callback=progress_callback([lang_key]),
+                                cancel_event=cancel_event, fade_duration=fade_duration,
+                                audio_offset=audio_offset, encoder_profile=encoder_profile))
+        log(f"\n--- Processing {', '.join(render_langs)} videos ({max_workers} parallel) ---")
+    for lang_key in render_langs:
+        service_journal.mark_running(service_job, service_journal.render_stage(lang_key), path=output_paths[lang_key])
+    try:
+        with metrics.span("render_stage", jobs=len(jobs)):
+            run_jobs(jobs, max_workers, cancel_event, on_render_status)
+    finally:
+        if uploader_thread:
+            upload_queue.put(None) # No more renders; let the uploader finish and exit
+            with metrics.span("upload_wait"): # Upload time not hidden behind rendering
+                uploader_thread.join()
+        if own_upload_manager:
+            own_upload_manager.shutdown()
+
+    if use_cache:
+        for deleted_path in render_cache.evict(data.get("render_cache_bytes", DEFAULT_MAX_CACHE_BYTES), keep=output_paths.values()):
+            log(f"Render cache full, deleted old render: {deleted_path}")
+
+    for job in jobs:
+        for lang_key in job_langs(job):
+            if results[lang_key]["render"] is None:
+                results[lang_key]["render"] = job.status
+                service_journal.mark_failed(service_job, service_journal.render_stage(lang_key),
+                                            cancelled=job.status == CANCELLED)
+        if job.status == FAILED:
+            log(f"Failed to process {job.name} video.")
+    return results
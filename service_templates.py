@@ -0,0 +1,41 @@
+# service_templates.py
+# Output naming and the default YouTube titles/descriptions, shared by the GUI and the batch runner.
+import os
+import datetime
+
+# Default templates for each meeting type and language: (title, description)
+DEFAULT_TEMPLATES = {
+    "Sermon": {
+        "HE": ("שיעור - {date}", "הקלטת השיעור מתאריך {date} ב{location}.\nצפייה מהנה!"),
+        "RU": ("Проповедь ({date}) - Перевод на русский", "Запись проповеди от {date}, место: {location}.\nПеревод на русский язык."),
+        "EN": ("Sermon ({date}) - English Translation", "Sermon recording from {date} at {location}.\nEnglish translation.")
+    },
+    "Worship meeting": {
+        "HE": ("אסיפת הלל - {date}", "הקלטת אסיפת הלל מתאריך {date} ב{location}.\nצפייה מהנה!"),
+        "RU": ("Прославление ({date}) - Перевод на русский", "Запись прославления от {date}, место: {location}.\nПеревод на русский язык."),
+        "EN": ("Worship Meeting ({date}) - English Translation", "Worship meeting recording from {date} at {location}.\nEnglish translation.")
+    },
+    "Prayer meeting": {
+        "HE": ("אסיפת תפילה - {date}", "הקלטת אסיפת תפילה מתאריך {date} ב{location}.\nצפייה מהנה!"),
+        "RU": ("Молитвенное собрание ({date}) - Перевод на русский", "Запись молитвенного собрания от {date}, место: {location}.\nПеревод на русский язык."),
+        "EN": ("Prayer Meeting ({date}) - English Translation", "Prayer meeting recording from {date} at {location}.\nEnglish translation.")
+    }
+}
+
+def create_custom_output_filename(meeting_type, lang_suffix, output_dir="output_videos", language_code=None):
+    # Use current local time as per user system (2025-06-09T07:33:03+03:00)
+    now = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M")
+    mt = meeting_type.replace(" ", "_").lower() # file-safe
+    if language_code is None:
+        language_code = lang_suffix
+    filename = f"{now}-{mt}--{language_code}.mp4"
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True) # Parallel runs may race to create it
+    return os.path.join(output_dir, filename)
+
+def format_with_placeholders(template_string, date_val, location_val, log=print):
+    """Fills {date} and {location}; unknown placeholders are left as-is with a warning."""
+    try: return template_string.format(date=date_val, location=location_val)
+    except KeyError as e:
+        log(f"Warning: Placeholder {e} in '{template_string[:50]}...'")
+        return template_string
@@ -0,0 +1,80 @@
+# upload_journal.py
+# Remembers the resumable session of every unfinished upload on disk, so an upload
+# interrupted by a crash or app restart can continue where it stopped instead of
+# starting again from byte 0.
+import os
+import threading
+import time
+from path_util import data_path, load_json_file, save_json_file, file_fingerprint
+
+JOURNAL_FILE = data_path('upload_sessions.json')
+
+# YouTube keeps an unfinished resumable session for about a week; older entries are useless
+SESSION_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+_lock = threading.Lock() # Several uploader threads may update the journal at once
+
+def _journal_key(file_path):
+    return os.path.normcase(os.path.abspath(file_path))
+
+def _load_journal():
+    return load_json_file(JOURNAL_FILE, default={})
+
+def get_session(file_path):
+    """
+    Returns the saved session for file_path ({"session_uri", "offset", "title", ...}),
+    or None if there is none, it is too old, or the file changed since it was saved.
+    """
+    key = _journal_key(file_path)
+    with _lock:
+        journal = _load_journal()
+        entry = journal.get(key)
+        if not entry:
+            return None
+        too_old = time.time() - entry.get("updated", 0) > SESSION_MAX_AGE_SECONDS
+        if too_old or entry.get("fingerprint") != file_fingerprint(file_path):
+            # Stale entry; the session cannot be reused for this file
+            del journal[key]
+            save_json_file(JOURNAL_FILE, journal)
+            return None
+        return entry
+
+def save_session(file_path, session_uri, offset, title, fingerprint=None, source_key=None):
+    """
+    Records (or updates) the resumable session and acknowledged byte offset for file_path.
+    source_key: output_manifest.output_key of the service output the file is, so the upload
+    can later be found again for that video, meeting type and language.
+    """
+    key = _journal_key(file_path)
+    with _lock:
+        journal = _load_journal()
+        entry = journal.get(key)
+        if not entry or entry.get("session_uri") != session_uri:
+            entry = {
+                "session_uri": session_uri,
+                "title": title,
+                "fingerprint": fingerprint or file_fingerprint(file_path),
+                "source": source_key,
+            }
+        entry["offset"] = offset
+        entry["updated"] = time.time()
+        journal[key] = entry
+        save_json_file(JOURNAL_FILE, journal)
+
+def clear_session(file_path):
+    """Forgets the session for file_path (upload finished or session no longer valid)."""
+    key = _journal_key(file_path)
+    with _lock:
+        journal = _load_journal()
+        if journal.pop(key, None) is not None:
+            save_json_file(JOURNAL_FILE, journal)
+
+def pending_uploads(source_key=None):
+    """
+    Paths of files that have an unfinished upload session and still exist on disk; with
+    source_key, only those saved for that output (see save_session).
+    """
+    with _lock:
+        journal = _load_journal()
+    return [entry_path for entry_path, entry in journal.items()
+            if os.path.isfile(entry_path) and (source_key is None or entry.get("source") == source_key)]
@@ -0,0 +1,186 @@
+# upload_manager.py
+# Runs several YouTube uploads at once under one shared bandwidth limit. A single upload
+# rarely fills a fast link, but on a shared link (e.g. next to a livestream) the total
+# has to stay below a cap that can be changed while uploads are running.
+import time
+import itertools
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from youtube_uploader import upload_video, service_for_thread
+
+DEFAULT_CONCURRENT_UPLOADS = 2
+THROUGHPUT_WINDOW_SECONDS = 10.0 # Throughput is averaged over this much recent progress
+THROUGHPUT_LOG_SECONDS = 15.0    # How often the aggregate throughput is logged while uploads run
+MAX_WAIT_SLICE_SECONDS = 0.25    # Waiting for tokens re-checks the rate and cancellation this often
+
+def format_rate(bytes_per_second):
+    """Human-readable rate in Mbit/s, e.g. "12.5 Mbit/s"."""
+    return f"{bytes_per_second * 8 / 1e6:.1f} Mbit/s"
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting bytes per second across every caller.
+    A rate of None or 0 means unlimited. Requests larger than the bucket (one upload chunk
+    is often several MB) are let through as soon as the bucket is not in debt and then
+    drive it negative, so the long-run rate still matches the limit.
+    """
+    def __init__(self, rate=None, burst_seconds=1.0):
+        self._lock = threading.Lock()
+        self._rate = rate or None
+        self._burst_seconds = burst_seconds
+        self._tokens = self._capacity()
+        self._updated = time.monotonic()
+
+    def _capacity(self):
+        return (self._rate or 0) * self._burst_seconds
+
+    def _refill(self, now):
+        if self._rate:
+            self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def set_rate(self, rate):
+        """Changes the limit (bytes per second, None or 0 for unlimited); waiting callers pick it up at once."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._rate = rate or None
+            self._tokens = min(self._tokens, self._capacity())
+
+    def acquire(self, amount, cancel_event=None):
+        """Blocks until amount bytes may be sent. Returns False if cancel_event was set while waiting."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if not self._rate:
+                    return True
+                if self._tokens >= 0:
+                    self._tokens -= amount
+                    return True
+                wait = min(-self._tokens / self._rate, MAX_WAIT_SLICE_SECONDS)
+            if cancel_event:
+                if cancel_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+class _FileProgress:
+    """Bytes sent over time for one upload, for throughput over the last THROUGHPUT_WINDOW_SECONDS."""
+    def __init__(self, title):
+        self.title = title
+        self.sent = 0
+        self.total = None
+        self.started = time.monotonic()
+        self.samples = collections.deque([(self.started, 0)])
+
+    def update(self, sent, total):
+        now = time.monotonic()
+        self.sent, self.total = sent, total
+        self.samples.append((now, sent))
+        while len(self.samples) > 2 and now - self.samples[1][0] > THROUGHPUT_WINDOW_SECONDS:
+            self.samples.popleft()
+
+    def rate(self):
+        (first_time, first_sent), (last_time, last_sent) = self.samples[0], self.samples[-1]
+        if time.monotonic() - last_time > THROUGHPUT_WINDOW_SECONDS:
+            return 0.0 # Stalled (or waiting out a retry)
+        return (last_sent - first_sent) / (last_time - first_time) if last_time > first_time else 0.0
+
+class UploadManager:
+    """
+    Uploads files with upload_video, max_concurrent at a time, all sharing one TokenBucket.
+    Each upload thread uses its own copy of the service (see youtube_uploader.service_for_thread).
+    """
+    def __init__(self, service, max_concurrent=DEFAULT_CONCURRENT_UPLOADS, rate_limit=None, log=print):
+        self.service = service
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.bucket = TokenBucket(rate_limit)
+        self.log = log
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="upload")
+        self._lock = threading.Lock()
+        self._active = {} # upload number -> _FileProgress (the same file may be uploading twice)
+        self._upload_numbers = itertools.count()
+        self._reporter = None
+
+    def set_rate_limit(self, bytes_per_second):
+        """Changes the shared limit (None or 0 for unlimited), also for uploads already running."""
+        self.bucket.set_rate(bytes_per_second)
+
+    def submit(self, file_path, title, description, cancel_event=None, progress_callback=None, labels=None,
+               **upload_kwargs):
+        """
+        Queues an upload and returns a Future with upload_video's result (the response,
+        "CANCELLED" or None). Raises from the Future if upload_video raises.
+        labels (e.g. {"lang": "RU"}) are attached to the upload's metrics.
+        """
+        return self._executor.submit(self._upload, file_path, title, description, cancel_event,
+                                     progress_callback, labels or {}, time.monotonic(), upload_kwargs)
+
+    def _upload(self, file_path, title, description, cancel_event, progress_callback, labels, submitted,
+                upload_kwargs):
+        metrics.record("upload_queue_wait", time.monotonic() - submitted, **labels)
+        progress = _FileProgress(title)
+        with self._lock:
+            upload_number = next(self._upload_numbers)
+            self._active[upload_number] = progress
+            self._start_reporter()
+
+        def on_progress(sent, total):
+            progress.update(sent, total)
+            if progress_callback:
+                progress_callback(sent, total)
+
+        try:
+            with metrics.labels(**labels):
+                result = upload_video(service_for_thread(self.service), file_path, title, description,
+                                      cancel_event=cancel_event, progress_callback=on_progress,
+                                      rate_limiter=self.bucket, **upload_kwargs)
+        finally:
+            with self._lock:
+                self._active.pop(upload_number, None)
+        if isinstance(result, dict):
+            elapsed = time.monotonic() - progress.started
+            if elapsed > 0 and progress.total:
+                self.log(f"Uploaded '{title}' at {format_rate(progress.total / elapsed)} on average.")
+        return result
+
+    def throughput(self):
+        """{"total": bytes/s, "files": [{"title", "sent", "total", "rate"}, ...]} for the running uploads."""
+        with self._lock:
+            files = [{"title": p.title, "sent": p.sent, "total": p.total, "rate": p.rate()} for p in self._active.values()]
+        return {"total": sum(f["rate"] for f in files), "files": files}
+
+    def throughput_report(self):
+        """One-line summary of throughput(), or "" when nothing is uploading."""
+        stats = self.throughput()
+        if not stats["files"]:
+            return ""
+        limit = f" (limit {format_rate(self.bucket.rate)})" if self.bucket.rate else ""
+        parts = [f"'{f['title']}' {format_rate(f['rate'])}"
+                 + (f" {100 * f['sent'] / f['total']:.0f}%" if f["total"] else "") for f in stats["files"]]
+        return f"Uploading at {format_rate(stats['total'])}{limit}: " + ", ".join(parts)
+
+    def _start_reporter(self):
+        # Called with self._lock held
+        if self._reporter and self._reporter.is_alive():
+            return
+        self._reporter = threading.Thread(target=self._report_loop, daemon=True)
+        self._reporter.start()
+
+    def _report_loop(self):
+        while True:
+            time.sleep(THROUGHPUT_LOG_SECONDS)
+            report = self.throughput_report()
+            if not report:
+                return
+            self.log(report)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
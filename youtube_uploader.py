@@ -1,12 +1,25 @@
 # youtube_uploader.py
 import os
+import json
+import time
+import datetime
+import random
+import http.client
 import pickle # Using pickle for simplicity, consider more secure storage for production
-from google_auth_oauthlib.flow import InstalledAppFlow
+import httplib2
+from google_auth_oauthlib.flow import InstalledAppFlow, WSGITimeoutError
+import google.auth.credentials
+from google.auth.exceptions import RefreshError, TransportError
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.discovery import build_from_document, DISCOVERY_URI
+from googleapiclient import discovery_cache
+from googleapiclient.http import MediaFileUpload, build_http
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.errors import HttpError
 import threading # For cancel_event
-from path_util import resource_path
+from path_util import resource_path, data_path, load_json_file, save_json_file
+import upload_journal
+import metrics
 
 # If modifying these SCOPES, delete the file token.pickle.
 SCOPES = ['https://www.googleapis.com/auth/youtube.upload']
@@ -14,46 +27,220 @@ API_SERVICE_NAME = 'youtube'
 API_VERSION = 'v3'
 CLIENT_SECRETS_FILE = resource_path('client_secret.json')
 TOKEN_FILE = resource_path('token.json')
+DISCOVERY_CACHE_FILE = data_path('youtube_discovery.json')
+CREDENTIAL_REFRESH_MARGIN_SECONDS = 5 * 60 # Refresh the access token this long before it expires
+OAUTH_TIMEOUT_SECONDS = 300 # How long the browser login may take
 
-def get_authenticated_service():
-    """Logs in the user or loads existing credentials and returns a YouTube service object."""
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        with open(TOKEN_FILE, 'rb') as token:
-            creds = pickle.load(token)
+# --- Resumable upload tuning ---
+# Resumable upload chunks must be a multiple of 256 KB.
+CHUNK_SIZE_UNIT = 256 * 1024
+DEFAULT_CHUNK_SIZE = 32 * CHUNK_SIZE_UNIT # 8 MB per request
+MAX_RETRIES = 10 # Consecutive failed attempts before giving up on an upload
+MAX_BACKOFF_SECONDS = 64
+# Transient failures worth retrying; the upload continues from the last byte the server acknowledged
+RETRIABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRIABLE_EXCEPTIONS = (httplib2.HttpLib2Error, http.client.HTTPException, OSError)
+
+_credentials = None
+_credentials_lock = threading.RLock()
+_discovery_doc = None
+_thread_state = threading.local()
+
+def _save_credentials(creds):
+    with open(TOKEN_FILE, 'wb') as token:
+        pickle.dump(creds, token)
+
+def _discovery_document():
+    """
+    The YouTube API discovery document as a JSON string: from memory, the local cache file,
+    the copy bundled with googleapiclient, or (only if neither exists) the network.
+    Cached on disk, so the client builds quickly and offline, even where the bundled copy
+    is missing (as in PyInstaller builds that leave out googleapiclient's data files).
+    """
+    global _discovery_doc
+    if _discovery_doc is None:
+        document = load_json_file(DISCOVERY_CACHE_FILE)
+        if not document:
+            document = discovery_cache.get_static_doc(API_SERVICE_NAME, API_VERSION)
+            if not document:
+                uri = DISCOVERY_URI.format(api=API_SERVICE_NAME, apiVersion=API_VERSION)
+                response, content = build_http().request(uri)
+                if response.status != 200:
+                    raise HttpError(response, content, uri=uri)
+                document = content.decode('utf-8')
+            document = json.loads(document)
+            save_json_file(DISCOVERY_CACHE_FILE, document)
+        _discovery_doc = json.dumps(document)
+    return _discovery_doc
+
+def _credentials_expiring(creds, margin_seconds=CREDENTIAL_REFRESH_MARGIN_SECONDS):
+    if not creds.expiry:
+        return False
+    # google-auth keeps expiry as a naive UTC datetime
+    remaining = creds.expiry - datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return remaining.total_seconds() < margin_seconds
+
+def refresh_credentials_if_needed(creds, margin_seconds=CREDENTIAL_REFRESH_MARGIN_SECONDS):
+    """
+    Refreshes creds if they expire within margin_seconds (so a chunk never goes out with a
+    token that lapses mid-request) and saves them. Safe to call from several upload threads:
+    they share one credentials object, and only the first one refreshes it.
+    Returns False if a refresh was needed but failed.
+    """
+    if not creds or not getattr(creds, 'refresh_token', None) or not _credentials_expiring(creds, margin_seconds):
+        return True
+    with _credentials_lock:
+        if not _credentials_expiring(creds, margin_seconds): # Another thread just refreshed
+            return True
+        try:
+            creds.refresh(Request())
+        except Exception as e:
+            print(f"Error refreshing token: {e}")
+            return False
+        _save_credentials(creds)
+    return True
+
+def _load_saved_credentials():
+    """
+    The session's or saved credentials, refreshed if needed; None if there are none or they
+    were revoked or expired (token.json is then deleted). Raises ConnectionError if Google
+    can't be reached to refresh them; token.json is kept for the next attempt.
+    """
+    with _credentials_lock:
+        creds = _credentials
+        if creds is None and os.path.exists(TOKEN_FILE):
+            with open(TOKEN_FILE, 'rb') as token:
+                creds = pickle.load(token)
+        if creds and creds.valid and not _credentials_expiring(creds):
+            return creds
+        if not creds or not creds.refresh_token:
+            return None
+        try:
+            creds.refresh(Request())
+        except TransportError as e: # Offline or Google unreachable; the login itself is still good
+            raise ConnectionError(f"Could not reach Google to refresh the YouTube login: {e}") from e
+        except RefreshError as e:
+            print(f"Error refreshing token: {e}")
+            # The login was revoked or expired; force re-authentication
+            if os.path.exists(TOKEN_FILE):
+                os.remove(TOKEN_FILE)
+            return None
+        _save_credentials(creds)
+        return creds
+
+def get_credentials(interactive=True, timeout_seconds=OAUTH_TIMEOUT_SECONDS, cancel_event=None):
+    """
+    Loads the saved credentials (refreshing them if needed) or, if interactive, runs the OAuth
+    flow in the browser, waiting at most timeout_seconds for the user. The result is kept for
+    the session, so reconnecting does not read token.json again.
+    Returns None if not interactive and there are no usable saved credentials. Raises
+    TimeoutError if the browser login times out, InterruptedError if cancel_event was set
+    meanwhile (the login is then discarded), and ConnectionError if the saved login can't be
+    refreshed because Google is unreachable.
+    """
+    global _credentials
+    creds = _load_saved_credentials()
+    if not creds:
+        if not interactive:
+            return None
+        if not os.path.exists(CLIENT_SECRETS_FILE):
+            raise FileNotFoundError(
+                f"'{CLIENT_SECRETS_FILE}' not found. "
+                "Please download it from Google Cloud Console and place it here."
+            )
+        flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES)
+        # Run local server for auth, will open browser. Runs without the lock held, so a
+        # login abandoned by the user never blocks later attempts.
+        try:
+            creds = flow.run_local_server(port=0, timeout_seconds=timeout_seconds)
+        except WSGITimeoutError as e:
+            raise TimeoutError(f"No response from the browser login within {timeout_seconds} seconds.") from e
+        if cancel_event and cancel_event.is_set():
+            raise InterruptedError("YouTube login cancelled.")
+        _save_credentials(creds)
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-            except Exception as e:
-                print(f"Error refreshing token: {e}")
-                # If refresh fails, force re-authentication
-                if os.path.exists(TOKEN_FILE):
-                    os.remove(TOKEN_FILE)
-                creds = None # Ensure re-authentication path is taken
-        
-        if not creds: # Either no token file or refresh failed
-            if not os.path.exists(CLIENT_SECRETS_FILE):
-                raise FileNotFoundError(
-                    f"'{CLIENT_SECRETS_FILE}' not found. "
-                    "Please download it from Google Cloud Console and place it here."
-                )
-            flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES)
-            # Run local server for auth, will open browser
-            creds = flow.run_local_server(port=0) 
-        
-        with open(TOKEN_FILE, 'wb') as token:
-            pickle.dump(creds, token)
-    
     if not creds:
         raise Exception("Failed to obtain YouTube API credentials.")
+    with _credentials_lock:
+        _credentials = creds
+    return creds
+
+def get_authenticated_service(interactive=True, timeout_seconds=OAUTH_TIMEOUT_SECONDS, cancel_event=None):
+    """
+    Returns a YouTube service object for the logged-in user (see get_credentials), built from
+    the cached discovery document, or None if not interactive and there is no saved login.
+    Use it from one thread; other threads get their own copy from service_for_thread.
+    """
+    creds = get_credentials(interactive, timeout_seconds, cancel_event)
+    if creds is None:
+        return None
+    return build_from_document(_discovery_document(), http=AuthorizedHttp(creds, http=build_http()))
 
-    return build(API_SERVICE_NAME, API_VERSION, credentials=creds)
+def service_for_thread(service):
+    """
+    A copy of service for the calling thread, with its own HTTP transport (httplib2 is not
+    thread-safe) and the same credentials. Kept per thread, so the thread's uploads reuse
+    one connection.
+    """
+    services = _thread_state.__dict__.setdefault('services', {})
+    entry = services.get(id(service))
+    if entry is None or entry[0] is not service:
+        entry = (service, build_from_document(service._rootDesc, http=new_http_for(service)))
+        services[id(service)] = entry
+    return entry[1]
+
+def new_http_for(service):
+    """
+    A fresh HTTP connection carrying the same credentials as service, for uploading from
+    another thread (httplib2 connections must not be shared between threads).
+    """
+    if not isinstance(service._http, AuthorizedHttp): # e.g. the mock service
+        return build_http()
+    return AuthorizedHttp(service._http.credentials, http=build_http())
+
+def _next_chunk_bytes(request, media):
+    """Size of the chunk next_chunk is about to send."""
+    if media.chunksize() == -1:
+        return max(0, media.size() - request.resumable_progress)
+    return min(media.chunksize(), max(0, media.size() - request.resumable_progress))
+
+def _query_upload_offset(request, http=None):
+    """Sends the status query of a resumed session, the same one next_chunk would send.
+
+    Afterwards request.resumable_progress holds the offset YouTube has. Returns the
+    response body if the upload had already finished, otherwise None.
+    """
+    headers = {"Content-Range": f"bytes */{request.resumable.size()}", "content-length": "0"}
+    resp, content = (http or request.http).request(request.resumable_uri, "PUT", headers=headers)
+    _, body = request._process_response(resp, content)
+    return body
+
+def _normalize_chunksize(chunksize):
+    """Rounds chunksize up to a multiple of 256 KB. -1 keeps the single-request upload."""
+    if chunksize is None or chunksize == -1:
+        return -1
+    units = max(1, -(-int(chunksize) // CHUNK_SIZE_UNIT))
+    return units * CHUNK_SIZE_UNIT
 
 def upload_video(service, file_path, title, description, category_id="22",
-                 privacy_status="private", tags=None, cancel_event: threading.Event = None): # Added cancel_event
-    """Uploads a video to YouTube. Checks for cancellation."""
+                 privacy_status="private", tags=None, cancel_event: threading.Event = None, # Added cancel_event
+                 chunksize=DEFAULT_CHUNK_SIZE, max_retries=MAX_RETRIES, http=None, progress_callback=None,
+                 resume_session=True, default_audio_language=None, rate_limiter=None, source_key=None):
+    """
+    Uploads a video to YouTube in resumable chunks. Checks for cancellation between chunks.
+    Transient errors (5xx/429/connection errors) are retried with exponential backoff and the
+    upload resumes from the last byte the server acknowledged.
+    http: optional httplib2.Http-like object used for the chunk requests (e.g. for a mock server).
+    progress_callback(bytes_uploaded, total_bytes) is called after every chunk.
+    resume_session: keep the session in upload_journal so an interrupted upload of the same
+    file (even after an app restart) continues from where it stopped.
+    default_audio_language: BCP-47 code of the video's main audio track (e.g. "he"); set it
+    for multi-track files so YouTube labels the default track correctly.
+    rate_limiter: optional upload_manager.TokenBucket; each chunk waits for its bytes before
+    it is sent, so smaller chunks give a smoother rate.
+    source_key: output_manifest.output_key of the service output being uploaded; saved with
+    the resumable session so Upload Existing only resumes it for the same video.
+    """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Video file not found: {file_path}")
 
@@ -70,7 +257,10 @@ def upload_video(service, file_path, title, description, category_id="22",
         }
     }
 
-    media = MediaFileUpload(file_path, chunksize=-1, resumable=True)
+    if default_audio_language:
+        body['snippet']['defaultAudioLanguage'] = default_audio_language
+
+    media = MediaFileUpload(file_path, chunksize=_normalize_chunksize(chunksize), resumable=True)
 
     print(f"Uploading '{title}' to YouTube...")
     request = service.videos().insert(
@@ -79,27 +269,106 @@ def upload_video(service, file_path, title, description, category_id="22",
         media_body=media
     )
 
-    response = None
-    upload_status_code = "SUCCESS" # Default status
+    resumed = False
+    if resume_session:
+        saved = upload_journal.get_session(file_path)
+        if saved:
+            # Reuse the saved session; being "in error state" makes the next chunk
+            # start with a status query, which tells us the byte offset YouTube has.
+            request.resumable_uri = saved["session_uri"]
+            request._in_error_state = True
+            resumed = True
+            print(f"Resuming interrupted upload of '{title}' (about {saved['offset']} bytes already sent)...")
 
-    while response is None:
-        if cancel_event and cancel_event.is_set():
-            print(f"Upload of '{title}' cancelled by user.")
-            # For resumable uploads, stopping here is usually enough.
-            # The incomplete upload might remain in YouTube Studio drafts.
-            upload_status_code = "CANCELLED"
-            break # Exit the loop
+    # Refreshed ahead of expiry between chunks, instead of failing a chunk halfway through a long upload
+    credentials = getattr(http or request.http, 'credentials', None)
+    if not isinstance(credentials, google.auth.credentials.Credentials):
+        credentials = None
+    sent = None if resumed else request.resumable_progress # Known once YouTube reports the resumed offset
+    with metrics.span("upload", file=os.path.basename(file_path), size=media.size()) as measured:
+        response = None
+        upload_status_code = "SUCCESS" # Default status
+        retry = 0
+
+        while response is None:
+            if cancel_event and cancel_event.is_set():
+                print(f"Upload of '{title}' cancelled by user.")
+                # For resumable uploads, stopping here is usually enough.
+                # The incomplete upload might remain in YouTube Studio drafts.
+                upload_status_code = "CANCELLED"
+                break # Exit the loop
+
+            if rate_limiter and not rate_limiter.acquire(_next_chunk_bytes(request, media), cancel_event):
+                continue # Cancelled while waiting for bandwidth; handled at the top of the loop
+
+            if credentials and not refresh_credentials_if_needed(credentials):
+                print(f"Could not refresh the YouTube login during upload of '{title}'.")
+                upload_status_code = "ERROR"
+                break
+
+            error = None
+            try:
+                if sent is None:
+                    # Bytes the interrupted run already sent don't count towards this upload
+                    response = _query_upload_offset(request, http)
+                    sent = request.resumable_progress
+                    if response:
+                        continue # Finished before the interruption was noticed
+                status, response = request.next_chunk(http=http)
+                if status:
+                    print(f"Uploaded {int(status.progress() * 100)}% for '{title}'")
+                    measured.add(bytes_uploaded=status.resumable_progress - sent)
+                    sent = status.resumable_progress
+                    if progress_callback:
+                        progress_callback(status.resumable_progress, status.total_size)
+                    if resume_session and request.resumable_uri:
+                        upload_journal.save_session(file_path, request.resumable_uri, status.resumable_progress, title,
+                                                    source_key=source_key)
+                retry = 0
+            except HttpError as e:
+                if resumed and e.resp.status in (404, 410):
+                    # The saved session expired on YouTube's side; start a fresh one
+                    print(f"Saved upload session for '{title}' is no longer valid. Starting over.")
+                    upload_journal.clear_session(file_path)
+                    request.resumable_uri = None
+                    request.resumable_progress = 0
+                    request._in_error_state = False
+                    resumed = False
+                    sent = 0
+                    continue
+                if e.resp.status in RETRIABLE_STATUS_CODES:
+                    error = f"HTTP {e.resp.status}"
+                else:
+                    print(f"An error occurred during upload of '{title}': {e}")
+                    upload_status_code = "ERROR"
+                    break # Exit the loop
+            except RETRIABLE_EXCEPTIONS as e:
+                error = f"{type(e).__name__}: {e}"
+            except Exception as e:
+                print(f"An error occurred during upload of '{title}': {e}")
+                upload_status_code = "ERROR"
+                break # Exit the loop
+
+            if error:
+                retry += 1
+                if retry > max_retries:
+                    print(f"Giving up on '{title}' after {max_retries} retries. Last error: {error}")
+                    upload_status_code = "ERROR"
+                    break
+                sleep_seconds = random.random() * min(MAX_BACKOFF_SECONDS, 2 ** retry)
+                print(f"Retriable error uploading '{title}' ({error}). Retry {retry}/{max_retries} in {sleep_seconds:.1f}s...")
+                if cancel_event:
+                    cancel_event.wait(sleep_seconds) # Wakes up early on cancel
+                else:
+                    time.sleep(sleep_seconds)
+        if response and upload_status_code == "SUCCESS":
+            measured.add(bytes_uploaded=media.size() - sent) # The last chunk reports no progress
+        else:
+            measured.set_status(metrics.CANCELLED if upload_status_code == "CANCELLED" else metrics.ERROR)
 
-        try:
-            status, response = request.next_chunk()
-            if status:
-                print(f"Uploaded {int(status.progress() * 100)}% for '{title}'")
-        except Exception as e:
-            print(f"An error occurred during upload of '{title}': {e}")
-            upload_status_code = "ERROR"
-            break # Exit the loop
-    
     if upload_status_code == "SUCCESS" and response:
+        if resume_session:
+            upload_journal.clear_session(file_path)
         print(f"Upload complete for '{title}'. Video ID: {response.get('id')}")
         return response # Return the full response object
     elif upload_status_code == "CANCELLED":